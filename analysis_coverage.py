@@ -2,32 +2,201 @@
 # -*- coding: utf-8 -*-
 
 from process_cfg_tools import *
+from cfg_compiler import CompiledCfg
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import gzip
+import json
 from sys import argv, exit
-import my_parser
-from ast_tree import GeneratorAstTree
-from ast_to_cfg import AstToCfgConverter
-
-
-def all_affectations(values_test, graph, verbose):
+from program_cache import load_program
+from dataflow import get_def_use
+from interval_analysis import get_interval_analysis
+
+# number of test values processed together in batch mode, or sent to a process in parallel mode
+SIZE_CHUNK = 10000
+# when coverage stops as soon as every criterion is covered, criteria are checked every CHECK_INTERVAL tests
+CHECK_INTERVAL = 1000
+# version of the format of the files written by save_coverage_state (files without version are version 1: their
+# def-use coverage can not be converted to the du-pairs and du-paths of version 2)
+STATE_FORMAT_VERSION = 2
+
+
+class CoverageState(object):
+    """
+    Everything the coverage criteria need to know about a set of processed tests.
+    A state is built by adding the trace of each test, and two states built on the same program
+    (for example on two shards of a file of tests) can be merged.
+    """
+    def __init__(self, graph, k=4):
+        """
+        :param graph: a CFG graph
+        :param k: length of the prefixes of paths recorded for the all k paths criterion
+        """
+        self.k = k
+        self.graph_hash = get_graph_hash(graph)
+        self.nb_tests = 0
+        # {node: number of visits, all tests included}
+        self.visits = {}
+        # set of couples (decision node, following node) that were taken
+        self.decisions = set()
+        # set of (decision node, index of condition, evaluated boolean)
+        self.conditions = set()
+        # set of prefixes (tuples) of length k of the paths
+        self.k_paths = set()
+        # {first node of a while loop: smallest positive number of visits in a single test}
+        self.loops = {}
+        # set of couples (definition node, variable, utilization node) taken by a test
+        self.du_pairs = set()
+        # set of du-paths (variable, tuple of steps) taken by a test
+        self.du_paths = set()
+
+        graph = get_indexed_cfg(graph)
+        self._decision_nodes = set(graph.decision_nodes)
+        self._loop_nodes = [graph.successors[node][0] for node in graph.nodes_by_type['while']]
+        self._def_use = get_def_use(graph)
+
+    def add_trace(self, path, info_cond):
+        """
+        :param path: steps the program went through for a test
+        :param info_cond: dic {node: list(evaluated conditions)} for this test
+        """
+        self.nb_tests += 1
+        counts = {}
+        for index, step in enumerate(path):
+            counts[step] = counts.get(step, 0) + 1
+            if step in self._decision_nodes and index + 1 < len(path):
+                self.decisions.add((step, path[index + 1]))
+
+        for step, count in counts.items():
+            self.visits[step] = self.visits.get(step, 0) + count
+        for step in self._loop_nodes:
+            count = counts.get(step, 0)
+            if count > 0 and (step not in self.loops or count < self.loops[step]):
+                self.loops[step] = count
+
+        for node, list_results in info_cond.items():
+            for index, result in enumerate(list_results):
+                self.conditions.add((node, index, result))
+
+        self.k_paths.add(tuple(path[:self.k]))
+
+        du_pairs, du_paths = self._def_use.get_covered(path)
+        self.du_pairs |= du_pairs
+        self.du_paths |= du_paths
+
+    def merge(self, other):
+        """
+        Add to this state the tests recorded in an other state (built on the same program)
+        :param other: a CoverageState
+        :return: self
+        """
+        if other.k != self.k:
+            raise ValueError("Can not merge coverage states recorded for different k")
+        if other.graph_hash != self.graph_hash:
+            raise ValueError("Can not merge coverage states recorded on different programs")
+        self.nb_tests += other.nb_tests
+        for step, count in other.visits.items():
+            self.visits[step] = self.visits.get(step, 0) + count
+        self.decisions |= other.decisions
+        self.conditions |= other.conditions
+        self.k_paths |= other.k_paths
+        for step, count in other.loops.items():
+            if step not in self.loops or count < self.loops[step]:
+                self.loops[step] = count
+        self.du_pairs |= other.du_pairs
+        self.du_paths |= other.du_paths
+        return self
+
+
+def save_coverage_state(state, path):
+    """
+    Write a coverage state to a file (gzipped json), so that it can be extended later with new tests
+    :param state: a CoverageState
+    :param path: path of the file
+    """
+    data = {
+        'version': STATE_FORMAT_VERSION,
+        'graph_hash': state.graph_hash,
+        'k': state.k,
+        'nb_tests': state.nb_tests,
+        'visits': sorted(state.visits.items()),
+        'decisions': sorted(state.decisions),
+        'conditions': sorted(state.conditions),
+        'k_paths': sorted(state.k_paths),
+        'loops': sorted(state.loops.items()),
+        'du_pairs': sorted(state.du_pairs),
+        'du_paths': sorted(state.du_paths)
+    }
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+
+
+def load_coverage_state(path, graph):
+    """
+    Read a coverage state written by save_coverage_state
+    :param path: path of the file
+    :param graph: the CFG graph the state was recorded on
+    :return: a CoverageState
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        data = json.load(file)
+
+    version = data.get('version', 1)
+    if version != STATE_FORMAT_VERSION:
+        raise ValueError("Coverage state " + path + " has format version " + str(version) + ", expected " +
+                         str(STATE_FORMAT_VERSION) + ": the tests have to be analysed again")
+    state = CoverageState(graph, data['k'])
+    if data['graph_hash'] != state.graph_hash:
+        raise ValueError("Coverage state " + path + " was recorded on an other program")
+    state.nb_tests = data['nb_tests']
+    state.visits = {step: count for step, count in data['visits']}
+    state.decisions = {tuple(decision) for decision in data['decisions']}
+    state.conditions = {tuple(condition) for condition in data['conditions']}
+    state.k_paths = {tuple(path_prefix) for path_prefix in data['k_paths']}
+    state.loops = {step: count for step, count in data['loops']}
+    state.du_pairs = {tuple(pair) for pair in data['du_pairs']}
+    state.du_paths = {(variable, tuple(du_path)) for variable, du_path in data['du_paths']}
+    return state
+
+
+def remaining_objective(objective, visits):
+    """
+    Remove from a list of nodes to visit the nodes that were visited (a node present n times in the
+    list must be visited n times)
+    :param objective: list of nodes [1, 3, 3]
+    :param visits: dic {node: number of visits}
+    :return: list of nodes that are still to visit
+    """
+    used = {}
+    remaining = []
+    for step in objective:
+        if used.get(step, 0) < visits.get(step, 0):
+            used[step] = used.get(step, 0) + 1
+        else:
+            remaining.append(step)
+    return remaining
+
+
+def all_affectations(state, graph, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all affectations")
 
-    objective = []
-    for key, value in graph.items():
-        if value[0] == "assign":
-            objective.append(key)
+    graph = get_indexed_cfg(graph)
+    intervals = get_interval_analysis(graph)
+    objective = list(graph.nodes_by_type['assign'])
+    # nodes that no test can reach (see interval_analysis) are reported, but not required
+    infeasible = [node for node in objective if not intervals.is_reachable_node(node)]
+    objective = [node for node in objective if intervals.is_reachable_node(node)]
 
     objective_copy = objective.copy()
 
     if verbose:
         print("We want the following nodes to be visited: " + str(objective))
+        if len(infeasible) != 0:
+            print("Nodes " + str(infeasible) + " are infeasible (no test can reach them).")
 
-    for value in values_test:
-        path, var = process_value_test(graph, value)
-        for step in path:
-            if step in objective:
-                objective.remove(step)
+    objective = remaining_objective(objective, state.visits)
     
     if len(objective) == 0:
         if verbose:
@@ -43,28 +212,35 @@ def all_affectations(values_test, graph, verbose):
         return False
 
 
-def all_decisions(values_test, graph, verbose):
+def all_decisions(state, graph, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all decisions")
 
+    graph = get_indexed_cfg(graph)
+    intervals = get_interval_analysis(graph)
     objective = []
-    for key, value in graph.items():
-        if value[0] == "if" or value[0] == "while":
-            objective.append(key)
-            for following_nodes in value[-1]:
+    # decisions that no test can take (see interval_analysis) are reported, but not required
+    infeasible = []
+    for key in graph.decision_nodes:
+        if not intervals.is_reachable_node(key):
+            infeasible.append(key)
+            continue
+        objective.append(key)
+        for following_nodes in graph.successors[key]:
+            if intervals.is_feasible_edge(key, following_nodes):
                 objective.append(following_nodes)
+            else:
+                infeasible.append((key, following_nodes))
 
     objective_copy = objective.copy()
 
     if verbose:
         print("We want the following nodes to be visited: " + str(objective))
+        if len(infeasible) != 0:
+            print("Decisions " + str(infeasible) + " are infeasible (no test can take them).")
 
-    for value in values_test:
-        path, var = process_value_test(graph, value)
-        for step in path:
-            if step in objective:
-                objective.remove(step)
+    objective = remaining_objective(objective, state.visits)
     
     if len(objective) == 0:
         if verbose:
@@ -80,21 +256,21 @@ def all_decisions(values_test, graph, verbose):
         return False
 
 
-def all_k_paths(values_test, graph, k, verbose):
+def all_k_paths(state, graph, k, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all k paths for k = " + str(k))
 
-    target_paths = get_all_k_paths_brute(graph, k)
-    copy_to_conclusion = target_paths.copy()
-
+    graph = get_indexed_cfg(graph)
     if verbose:
-        print("We want the following paths to be taken: " + str(target_paths))
+        print("We want the following paths to be taken: " + str(get_all_k_paths(graph, k)))
 
-    for value in values_test:
-        path, var = process_value_test(graph, value)
-        if path[:k] in target_paths:
-            target_paths.remove(path[:k])
+    if k > state.k:
+        raise ValueError("Paths were recorded for k = " + str(state.k) + " only")
+    # taken paths are put in a prefix tree: paths that were not taken are found without enumerating the others
+    taken_paths = PathTrie(path[:k] for path in state.k_paths)
+    nb_targets = count_k_paths(graph, k)
+    target_paths = list(taken_paths.iter_uncovered(graph, k))
 
     if len(target_paths) == 0:
         if verbose:
@@ -105,45 +281,34 @@ def all_k_paths(values_test, graph, k, verbose):
         if verbose:
             print("All k paths for k = " + str(k) + " fails:")
             print("Paths " + str(target_paths) + " were never taken entirely.")
-            coverage = round((len(copy_to_conclusion) - len(target_paths)) / len(copy_to_conclusion), 4) * 100
+            coverage = round((nb_targets - len(target_paths)) / nb_targets, 4) * 100
             print("Coverage: " + str(coverage) + " %.")
         return False
 
 
-def all_i_loops(values_test, graph, k, verbose):
+def all_i_loops(state, graph, k, verbose):
     # interpretation: every loop must be visited at must i times.
     # todo if time allows it: redefine to check for inner loops that are visited multiple time
     if verbose:
         print("\n ------")
         print("Criterion: all i loops")
 
-    objective = []
-    for key, value in graph.items():
-        if value[0] == "while":
-            objective.append(value[-1][0])
+    graph = get_indexed_cfg(graph)
+    intervals = get_interval_analysis(graph)
+    objective = [graph.successors[key][0] for key in graph.nodes_by_type['while']]
+    # loops that no test can enter (see interval_analysis) are reported, but not required
+    infeasible = [node for node in objective if not intervals.is_reachable_node(node)]
+    objective = [node for node in objective if intervals.is_reachable_node(node)]
 
     objective_copy = objective.copy()
 
     if verbose:
         print("We want the following nodes " + str(objective) + " to be visited. (At must " + str(k) + " times.)")
+        if len(infeasible) != 0:
+            print("Nodes " + str(infeasible) + " are infeasible (no test can reach them).")
 
-    count_dic = {obj: 0 for obj in objective}
-    results = {str(data): count_dic.copy() for data in values_test}
-
-    for data in values_test:
-        # make a string copy of data in order to retrieve in result the count dictionary corresponding
-        # (value dictionary dic is modified while data is processed
-        str_data = str(data)
-        path, var = process_value_test(graph, data)
-        for step in path:
-            if step in objective:
-                results[str_data][step] += 1
-
-    for result in results.values():
-        for obj, value_result in result.items():
-            if k >= value_result > 0:
-                if obj in objective:
-                    objective.remove(obj)
+    # loops are counted test by test: the state keeps the smallest number of visits in a test
+    objective = [obj for obj in objective if not k >= state.loops.get(obj, 0) > 0]
 
     if len(objective) == 0:
         if verbose:
@@ -159,218 +324,104 @@ def all_i_loops(values_test, graph, k, verbose):
         return False
 
 
-def all_definitions(values_test, graph, verbose):
+def all_definitions(state, graph, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all definitions")
 
     # interpretation : for every variable, for every definition,
-    # there is a path from the affection to its utilization.
-
-    # first : we get all step corresponding to definition, and all steps corresponding to utilization
-    # for each variable
-    variables_prog = get_all_var(graph)
-    steps_per_var = {variable: get_definition_for_variable(graph, variable) for variable in variables_prog}
-
-    # there could be variable that are never defined. In this case, we remove them from list of variable
-    # of interest.
-    variables_prog = [key for key, value in steps_per_var.items() if len(value) != 0]
-
-    for variable in variables_prog:
-        steps_per_var[variable] += get_utilization_for_variable(graph, variable)
-        steps_per_var[variable] = list(set(steps_per_var[variable]))  # remove duplicates
+    # there is a path from the affection to one of its utilization.
 
-    result = {variable: False for variable in variables_prog}
+    # definitions (node, variable) which reach at least one utilization (see dataflow)
+    def_use = get_def_use(graph)
+    objective = [definition for definition, uses in def_use.def_use.items() if len(uses) != 0]
 
     if verbose:
-        print("for following variables, we want the corresponding path to be taken: ")
-        print(steps_per_var)
+        print("for following definitions (step, variable), we want a utilization to be reached: ")
+        print(objective)
 
-    # for each variable, if for a data test a variable is assigned, then this variable must be used.
-    for value in values_test:
-        for var in variables_prog:
-            values_to_process = value.copy()  # we process a copy
-            # of the value dic so that the value of dic is not be modified
-            step_to_follow = steps_per_var[var]
-            path, result_vars = process_value_test(graph, values_to_process)
-            for step in path:
-                if step in step_to_follow:
-                    step_to_follow.remove(step)
-            if len(step_to_follow) == 0:
-                result[var] = True
-
-    if all(valid for valid in result.values()):
+    # a definition is covered when a test went from the definition to one of its utilization
+    covered = {(definition, variable) for definition, variable, use in state.du_pairs}
+    non_valid = [definition for definition in objective if definition not in covered]
+
+    if len(non_valid) == 0:
         if verbose:
             print("TDef: OK")
             print("Coverage: 100 %")
         return True
     else:
         if verbose:
-            non_valid_variables = [key for key, valid in result.items() if not valid]
-            coverage = round(len(result) - len(non_valid_variables) / len(result), 4) * 100
+            coverage = round((len(objective) - len(non_valid)) / len(objective), 4) * 100
             print("TDef: fails")
-            print("Variables " + str(non_valid_variables) + " were not used.")
+            print("Definitions " + str(non_valid) + " were not used.")
             print("Coverage: " + str(coverage) + "%")
         return False
 
 
-def all_utilization(values_test, graph, verbose):
+def all_utilization(state, graph, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all utilization")
-    # interpretation: for each variable, after all definition, the path that leads to the utilization
-    # following the definition is taken (difference with former criteria: that the path leading to its execution)
-    variables_prog = get_all_var(graph)
-
-    # first: get each definition
-    dic_var_def = {variable: get_definition_for_variable(graph, variable) for variable in variables_prog}
-
-    # second: get all utilization accessible from each definition
-    targets_paths = {}
-    count_path = 0
-    for var in variables_prog:
-        for step_definition in dic_var_def[var]:
-            targets_paths[count_path] = [step_definition]
-            reachable_graph = get_accessible_graph(graph, step_definition)
-            steps_utilization = get_utilization_for_variable(reachable_graph, var)
-            targets_paths[count_path] += steps_utilization
-            count_path += 1
-    # clean target path (we want only couple def - utilization)
-    key_to_remove = []
-    for key, value in targets_paths.items():
-        if len(value) == 1:
-            key_to_remove.append(key)
-    for key in key_to_remove:
-        targets_paths.pop(key)
-
-    # third : process value test and record the resulting path
-    result_paths = []
-    for data in values_test:
-        path, var = process_value_test(graph, data)
-        result_paths.append(path)
-
-    # fourth: validate targets path that have been taken
-    validated = []
-    for target_path in targets_paths.values():
-        for path_result in result_paths:
-            if is_sub_path_in_path(target_path, path_result):
-                validated.append(target_path)
-
-    # fifth: test results
-    targets_paths_list = [path for path in targets_paths.values()]
-    if set(map(tuple, validated)) == set(map(tuple, targets_paths_list)):
+    # interpretation: for each variable, for each definition, every utilization reached by the definition
+    # is executed after it, without redefinition of the variable between them.
+    target_couples = get_def_use(graph).get_du_pairs()
+
+    if verbose:
+        print("We want the following couples (definition, variable, utilization) to be taken: " +
+              str(target_couples))
+
+    not_validated = [couple for couple in target_couples if couple not in state.du_pairs]
+
+    # test results
+    if len(not_validated) == 0:
         if verbose:
             print("TU: Ok")
             print("Coverage: 100 %")
         return True
     else:
         if verbose:
-            not_validated = [path for path in targets_paths.values() if path not in validated]
-            len_not_validated = len(set(map(tuple, not_validated)))
-
-            len_target = len(set(map(tuple, targets_paths_list)))
-            coverage = round((len_target - len_not_validated) / len_target, 4) * 100
+            coverage = round((len(target_couples) - len(not_validated)) / len(target_couples), 4) * 100
             print("TU: fails")
-            print("Following paths were never taken: " + str(list(set(map(tuple, not_validated)))))
+            print("Following couples were never taken: " + str(not_validated))
             print("Coverage: " + str(coverage) + "%")
         return False
 
 
-def all_du_path(values_test, graph, verbose):
+def all_du_path(state, graph, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all du-paths")
     # interpretation: for each variable, for each couple definition-utilization, all simple path
     # without redefinition of variable are executed one time
+    # (at most LIMIT_DU_PATHS paths per couple, see dataflow)
+    target_paths = get_def_use(graph).get_all_du_paths()
 
-    # first: for all variable, find all definition
-    variables_prog = get_all_var(graph)
-    dic_var_def = {variable: get_definition_for_variable(graph, variable) for variable in variables_prog}
-
-    # second: for all variable, for all its definition, find the first utilization
-    # (without definition in the step), and build a list of couples (start-end) that must be reached.
-    couple_of_interest = []
-    for variable in variables_prog:
-        for step_definition in dic_var_def[variable]:
-            reachable_graph = get_accessible_graph(graph, step_definition)
-            # print(reachable_graph)
-            steps_redefine = get_definition_for_variable(reachable_graph, variable)
-            steps_utilization = get_utilization_for_variable(reachable_graph, variable)
-
-            # If step_redefine is empty or if first element of utilization is
-            # smaller than first element of utilization then we add the couple.
-            # In any other case we do not add the couple to couple of interests
-            try:
-                if (
-                        len(steps_redefine) == 0 and len(steps_utilization) > 0 or
-                        steps_utilization[0] < steps_redefine[0]
-                ):
-                    couple_of_interest.append((step_definition, steps_utilization[0]))
-            except IndexError:
-                pass
-
-    # third: build a list of nodes that are inside while loops
-    inside_while_loops_steps = []
-    for value in graph.values():
-        if type_node(value) == 'while':
-            inside_while_loops_steps.append(value[-1][0])
-
-    # fourth: process values from the set of tests
-    result_paths = []
-    for data in values_test:
-        path, var = process_value_test(graph, data)
-        result_paths.append(path)
-
-    # fifth: check if all path for each couple have been taken
-    # check if inner while loops haven't been looped more than one time
-    correctness_couples = {couple: False for couple in couple_of_interest}
-    correctness_while = {step: True for step in inside_while_loops_steps}
-    for path in result_paths:
-        for couple in couple_of_interest:
-            if is_sub_path_in_path(list(couple), path):
-                correctness_couples[couple] = True
-        for step_target in correctness_couples.keys():
-            if path.count(step_target) > 1:
-                correctness_while[step_target] = False
-
-    if (
-            all(result_couple for result_couple in correctness_couples.values())
-            and all(result_while for result_while in correctness_while.values())
-    ):
-        correct = True
-    else:
-        correct = False
+    if verbose:
+        print("We want the following paths (variable, path) to be taken: " + str(target_paths))
 
-    if correct:
+    bad_results = [du_path for du_path in target_paths if du_path not in state.du_paths]
+
+    if len(bad_results) == 0:
         if verbose:
             print("TDU: OK")
             print("Coverage: 100%")
         return True
     else:
         if verbose:
-            bad_results = [key for key, result_couple in correctness_couples.items() if not result_couple]
-            bad_results.append(
-                [key for key, result_while in correctness_while.items() if not result_while]
-            )
-
-            nb_bad_result = len(bad_results)
-
-            coverage = round((len(correctness_couples) + len(correctness_while) - nb_bad_result) /
-                             (len(correctness_couples) + len(correctness_while)), 4) * 100
+            coverage = round((len(target_paths) - len(bad_results)) / len(target_paths), 4) * 100
             print("TDU: fails")
-            print("Following couples definition - utilisation were never taken"
-                  "or were executed more than one time: " + str(bad_results))
+            print("Following du-paths were never taken: " + str(bad_results))
             print("Coverage: " + str(coverage) + "%")
         return False
 
 
-def all_conditions(values_test, graph, verbose):
+def all_conditions(state, graph, verbose):
     if verbose:
         print("\n ------")
         print("Criterion: all conditions")
 
     # dictionary {node: list(conditions)}
-    conditions = get_all_conditions_from_graph(graph)
+    conditions = get_all_conditions_from_graph(get_indexed_cfg(graph))
 
     result_true = {str(condition): False for condition in conditions.values()}
     result_false = result_true.copy()
@@ -378,16 +429,13 @@ def all_conditions(values_test, graph, verbose):
     # when a condition is evaluated to true in the program, we set its value to
     # true in result_true. When it's evaluated to false, we set its value to false in result_false.
 
-    for value in values_test:
-        path, var, info_cond = process_value_test(graph, value, info_conditions=True)
-        # info cond: a dic {node: list(evaluated conditions)
-        for index_node, list_results in info_cond.items():
-            for index, result in enumerate(list_results):
-                condition_just_evaluated = conditions[index_node][index]
-                if result:
-                    result_true[str([condition_just_evaluated])] = True
-                else:
-                    result_false[str([condition_just_evaluated])] = True
+    # state.conditions: a set of (node, index of condition, evaluated boolean)
+    for index_node, index, result in sorted(state.conditions):
+        condition_just_evaluated = conditions[index_node][index]
+        if result:
+            result_true[str([condition_just_evaluated])] = True
+        else:
+            result_false[str([condition_just_evaluated])] = True
 
     if all(correct for correct in result_true.values()) and all(correct for correct in result_false.values()):
         if verbose:
@@ -409,89 +457,337 @@ def all_conditions(values_test, graph, verbose):
         return False
 
 
-def read_test_file(path_tests):
-    values_tests = []
+def iter_test_file(path_tests):
+    """
+    Read a file of test values line by line: only one line is kept in memory at once
+    :param path_tests: path of a file, each line being a set of values 'x:1,y:2'
+    :return: a generator of dictionaries {var: initial_value}
+    """
     with open(path_tests) as file:
         for line in file:
+            if line.strip() == '':
+                continue
             variables = {}
             assignments = line.split(",")
             for assignment in assignments:
                 var = assignment.split(":")[0]
                 value = assignment.split(":")[1]
                 variables[var] = int(value)
-            values_tests.append(variables)
-    return values_tests
+            yield variables
+
+
+def read_test_file(path_tests):
+    return list(iter_test_file(path_tests))
+
+
+def chunks(iterable, size):
+    """
+    :param iterable: any iterable (for example a generator of test values)
+    :param size: size of chunks
+    :return: a generator of lists of at most size elements
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
 
 def treat_command():
+    """
+    :return: path of the program, path of the test values, and a dic of options
+    {'verbose': bool, 'batch': bool, 'jobs': int, 'stop': bool, 'load': path, 'merge': list of paths, 'output': path}
+    """
     try:
         file_program = argv[1]
         file_test = argv[2]
-        verbose = False
-        if len(argv) == 4:
-            verbose = argv[3] == '-v'
-        return file_program, file_test, verbose
     except IndexError:
         display_usage()
         exit()
 
+    options = {'verbose': False, 'batch': False, 'jobs': 1, 'stop': False, 'load': None, 'merge': [], 'output': None}
+    arguments = iter(argv[3:])
+    for argument in arguments:
+        if argument == '-v':
+            options['verbose'] = True
+        elif argument == '-b':
+            options['batch'] = True
+        elif argument == '-s':
+            options['stop'] = True
+        elif argument == '-j':
+            try:
+                options['jobs'] = int(next(arguments))
+            except (StopIteration, ValueError):
+                display_usage()
+                exit()
+        elif argument in ('-l', '-m', '-o'):
+            try:
+                path = next(arguments)
+            except StopIteration:
+                display_usage()
+                exit()
+            if argument == '-l':
+                options['load'] = path
+            elif argument == '-m':
+                options['merge'].append(path)
+            else:
+                options['output'] = path
+        else:
+            display_usage()
+            exit()
+    return file_program, file_test, options
+
 
 def display_usage():
     print("Usage: ")
-    print("$ python analysis_coverage.py path_prog.txt path_data_test.txt [-v]")
-
-
-def get_name_file_from_path(path):
-    return path.split('\\')[-1].split('.')[0]
-
-
-def calc_coverage(cfg_graph, test_values, verbose):
-    print("Starting analysis...")
-    number_tests = 8
-    copies_values = []
-    for i in range(number_tests):
-        copies_values.append(deep_copy_list_dic(test_values))
-
+    print("$ python analysis_coverage.py path_prog.txt path_data_test.txt [-v] [-b] [-j N] [-s] [-l state] "
+          "[-m state]... [-o state]")
+    print("  -v: verbose mode (show coverage)")
+    print("  -b: batch mode, process all test values at once with numpy arrays")
+    print("  -j N: process the test values in N processes")
+    print("  -s: stop reading test values as soon as every criterion is covered")
+    print("  -l state: load the coverage state of tests already processed, and add the new test values to it")
+    print("  -m state: merge an other coverage state (for example recorded on an other machine), can be repeated")
+    print("  -o state: write the resulting coverage state to a file")
+
+
+def iter_traces(graph, values_test, batch=False):
+    """
+    Process every test value once on the program and yield its trace.
+    The traces are then shared by every criterion, so that a test is never interpreted twice.
+    Test values are consumed as they come: values_test can be a generator (see iter_test_file).
+    :param graph: a CFG graph
+    :param values_test: an iterable of dictionaries {var: initial_value} (they are not modified)
+    :param batch: if true, test values are processed together (by chunks) with numpy arrays
+    (see batch_interpreter)
+    :return: a generator of traces, each trace being a couple (path, dic {node: list(evaluated conditions)})
+    """
+    if batch:
+        # imported here: numpy is only needed for batch mode
+        from batch_interpreter import BatchCfg
+        batch_graph = BatchCfg(graph)
+        for chunk in chunks(values_test, SIZE_CHUNK):
+            for trace in batch_graph.get_traces(chunk):
+                yield trace
+        return
+
+    # the program is compiled once, and the compiled version is reused for every test value
+    compiled_graph = CompiledCfg(graph)
+    for value in values_test:
+        path, var, info_cond = compiled_graph.process_value_test(value.copy(), info_conditions=True)
+        yield path, info_cond
+
+
+def record_traces(graph, values_test, batch=False):
+    """
+    Same as iter_traces, but returns the list of traces
+    """
+    return list(iter_traces(graph, values_test, batch))
+
+
+def calc_coverage_state(graph, values_test, k=4, batch=False, stop_when_covered=False, state=None):
+    """
+    Process test values and record them in a coverage state, in a single pass over the test values.
+    Used for each shard of tests in parallel mode (must stay a module level function).
+    :param graph: a CFG graph
+    :param values_test: an iterable of dictionaries {var: initial_value}
+    :param k: length of the prefixes of paths recorded
+    :param batch: if true, test values are processed with numpy arrays
+    :param stop_when_covered: if true, remaining test values are skipped as soon as every criterion is covered
+    :param state: a CoverageState to extend with the test values (by default, a new one)
+    :return: a CoverageState
+    """
+    if state is None:
+        state = CoverageState(graph, k)
+    objectives = CoverageObjectives(graph) if stop_when_covered else None
+    for path, info_cond in iter_traces(graph, values_test, batch):
+        state.add_trace(path, info_cond)
+        if stop_when_covered and state.nb_tests % CHECK_INTERVAL == 0 and objectives.is_covered(state):
+            break
+    return state
+
+
+def calc_coverage_state_parallel(graph, values_test, jobs, k=4, batch=False, stop_when_covered=False, state=None):
+    """
+    Split the test values in shards, record each shard in a separate process, and merge the states.
+    Shards are read from values_test as processes need them: values_test can be a generator.
+    :param jobs: number of processes
+    :param stop_when_covered: if true, remaining shards are skipped as soon as every criterion is covered
+    :param state: a CoverageState to extend with the test values (by default, a new one)
+    :return: a CoverageState
+    """
+    if hasattr(values_test, '__len__'):
+        # a few shards per process, so that processes finishing early can take another one
+        size_shard = max(1, min(SIZE_CHUNK, -(-len(values_test) // (jobs * 4))))
+    else:
+        size_shard = SIZE_CHUNK
+    shards = chunks(values_test, size_shard)
+
+    if state is None:
+        state = CoverageState(graph, k)
+    objectives = CoverageObjectives(graph) if stop_when_covered else None
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # only a few shards are kept in memory at once; they are merged in the order of the file
+        futures = [executor.submit(calc_coverage_state, graph, shard, k, batch) for shard in islice(shards, jobs * 2)]
+        while futures:
+            state.merge(futures.pop(0).result())
+            if stop_when_covered and objectives.is_covered(state):
+                for future in futures:
+                    future.cancel()
+                break
+            for shard in islice(shards, 1):
+                futures.append(executor.submit(calc_coverage_state, graph, shard, k, batch))
+    return state
+
+
+def run_criteria(state, graph, verbose):
+    """
+    :param state: a CoverageState
+    :param graph: a CFG graph
+    :param verbose: if true, each criterion prints its coverage
+    :return: list of booleans, result of each criterion
+    """
     # noinspection PyListCreation
     results = []
-    results.append(all_affectations(copies_values[0], cfg_graph, verbose))
-    results.append(all_decisions(copies_values[1], cfg_graph, verbose))
-    results.append(all_k_paths(copies_values[2], cfg_graph, 4, verbose))
-    results.append(all_i_loops(copies_values[3], cfg_graph, 2, verbose))
-    results.append(all_definitions(copies_values[4], cfg_graph, verbose))
-    results.append(all_utilization(copies_values[5], cfg_graph, verbose))
-    results.append(all_du_path(copies_values[6], cfg_graph, verbose))
-    results.append(all_conditions(copies_values[7], cfg_graph, verbose))
+    results.append(all_affectations(state, graph, verbose))
+    results.append(all_decisions(state, graph, verbose))
+    results.append(all_k_paths(state, graph, 4, verbose))
+    results.append(all_i_loops(state, graph, 2, verbose))
+    results.append(all_definitions(state, graph, verbose))
+    results.append(all_utilization(state, graph, verbose))
+    results.append(all_du_path(state, graph, verbose))
+    results.append(all_conditions(state, graph, verbose))
+    return results
+
+
+class CoverageObjectives(object):
+    """
+    Objectives of the criteria of run_criteria, computed once for a graph, to know while tests are processed
+    whether every criterion is covered: each check (see is_covered) only looks at the objectives which were not
+    covered yet, and forgets the ones which are
+    """
+    def __init__(self, graph, k=4, i=2):
+        """
+        :param graph: a CFG graph
+        :param k: length of the paths of all k paths
+        :param i: maximal number of visits of a loop of all i loops
+        """
+        graph = get_indexed_cfg(graph)
+        intervals = get_interval_analysis(graph)
+        self.k = k
+        self.i = i
+        # all affectations and all decisions: {node: number of visits required} (see remaining_objective)
+        affectations = [node for node in graph.nodes_by_type['assign'] if intervals.is_reachable_node(node)]
+        decisions = []
+        for key in graph.decision_nodes:
+            if intervals.is_reachable_node(key):
+                decisions.append(key)
+                decisions.extend(following for following in graph.successors[key]
+                                 if intervals.is_feasible_edge(key, following))
+        self.visits = {}
+        for objective in (affectations, decisions):
+            counts = {}
+            for node in objective:
+                counts[node] = counts.get(node, 0) + 1
+            for node, count in counts.items():
+                self.visits[node] = max(self.visits.get(node, 0), count)
+        # all k paths: the k-paths taken are counted
+        self.nb_k_paths = count_k_paths(graph, k)
+        # all i loops: first nodes of the loops
+        self.loops = [graph.successors[key][0] for key in graph.nodes_by_type['while']
+                      if intervals.is_reachable_node(graph.successors[key][0])]
+        # all definitions: {(definition node, variable): utilizations}, all utilization and all du-paths
+        def_use = get_def_use(graph)
+        self.definitions = {definition: uses for definition, uses in def_use.def_use.items() if len(uses) != 0}
+        self.du_pairs = set(def_use.get_du_pairs())
+        self.du_paths = set(def_use.get_all_du_paths())
+        # all conditions: (condition, value) to evaluate, with the (node, index of condition) where it is found
+        conditions = get_all_conditions_from_graph(graph)
+        self.conditions = {(str(node_conditions), result) for node_conditions in conditions.values()
+                           for result in (True, False)}
+        self.condition_positions = {}
+        for node, node_conditions in conditions.items():
+            for index, condition in enumerate(node_conditions):
+                self.condition_positions.setdefault(str([condition]), []).append((node, index))
+
+    def is_covered(self, state):
+        """
+        :param state: a CoverageState, which must only grow from a check to the next (tests added, states merged)
+        :return: True if every criterion of run_criteria is covered by the state
+        """
+        self.visits = {node: count for node, count in self.visits.items() if state.visits.get(node, 0) < count}
+        if self.visits:
+            return False
+        k_paths = state.k_paths if state.k == self.k else {path[:self.k] for path in state.k_paths}
+        if len(k_paths) < self.nb_k_paths:
+            return False
+        self.loops = [node for node in self.loops if not self.i >= state.loops.get(node, 0) > 0]
+        if self.loops:
+            return False
+        self.definitions = {definition: uses for definition, uses in self.definitions.items()
+                            if not any(definition + (use,) in state.du_pairs for use in uses)}
+        self.du_pairs = {pair for pair in self.du_pairs if pair not in state.du_pairs}
+        self.du_paths = {du_path for du_path in self.du_paths if du_path not in state.du_paths}
+        if self.definitions or self.du_pairs or self.du_paths:
+            return False
+        self.conditions = {(key, result) for key, result in self.conditions
+                           if not any((node, index, result) in state.conditions
+                                      for node, index in self.condition_positions.get(key, []))}
+        return len(self.conditions) == 0
+
+
+def calc_coverage(cfg_graph, test_values, verbose, batch=False, jobs=1, stop_when_covered=False, state=None):
+    """
+    Process the test values and print the coverage of each criterion
+    :param test_values: an iterable of dictionaries {var: initial_value}
+    :param jobs: number of processes used to process the tests (1: no parallelism)
+    :param stop_when_covered: if true, remaining test values are skipped as soon as every criterion is covered
+    :param state: a CoverageState of tests already processed (see load_coverage_state), extended with test_values
+    :return: the CoverageState of the tests
+    """
+    print("Starting analysis...")
+    # indexes of the graph are built once, and shared by every criterion
+    cfg_graph = get_indexed_cfg(cfg_graph)
+    if jobs > 1:
+        state = calc_coverage_state_parallel(cfg_graph, test_values, jobs, 4, batch, stop_when_covered, state)
+    else:
+        state = calc_coverage_state(cfg_graph, test_values, 4, batch, stop_when_covered, state)
+
+    results = run_criteria(state, cfg_graph, verbose)
 
     count_pass = 0
     for result in results:
         if result:
             count_pass += 1
 
-    print("End analysis coverage.")
+    print("End analysis coverage (" + str(state.nb_tests) + " tests processed).")
 
     print("Tests are passing " + str(count_pass) + " criterion on " + str(len(results)))
+    return state
 
 
 def main():
-    file_program, file_test, verbose = treat_command()
-    test_values = read_test_file(file_test)
-
-    # if parser is on, we get the AST Tree by parsing the file program.
-    # if not, we get the AST tree already written from ast_tree.py module
-    if my_parser.is_on():
-        # TODO
-        ast_tree_prog = {}
-    else:
-        name_prog = get_name_file_from_path(file_program)
-        ast_tree_prog = GeneratorAstTree.get_ast_from_name(name_prog)
+    file_program, file_test, options = treat_command()
+    # test values are read while they are processed
+    test_values = iter_test_file(file_test)
+
+    # the CFG graph comes from the cache, or from the parsing of the file program
+    cfg_graph_prog = load_program(file_program)['cfg']
 
-    # Convert AST to CFG
-    converter = AstToCfgConverter(ast_tree_prog)
-    cfg_graph_prog = converter.get_cfg_graph()
+    # Coverage of tests already processed
+    state = None
+    if options['load'] is not None:
+        state = load_coverage_state(options['load'], cfg_graph_prog)
+    for path_state in options['merge']:
+        other_state = load_coverage_state(path_state, cfg_graph_prog)
+        state = other_state if state is None else state.merge(other_state)
 
     # Process tests to get coverage
-    calc_coverage(cfg_graph_prog, test_values, verbose)
+    state = calc_coverage(cfg_graph_prog, test_values, options['verbose'], options['batch'], options['jobs'],
+                          options['stop'], state)
+
+    if options['output'] is not None:
+        save_coverage_state(state, options['output'])
 
 
 if __name__ == '__main__':
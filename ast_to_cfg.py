@@ -51,231 +51,115 @@ graph_prog = {
 
 
 class AstToCfgConverter(object):
+    """
+    Converts an AST tree into a CFG graph.
+
+    Nodes are numbered in the order of the program (preorder of the tree): a statement of size n starting at
+    step s uses the steps s to s+n-1, the size being 1 for an assignment, 1 + size of the body for a while,
+    and 1 + size of both bodies for a if. The following node of each step is then known without looking at the
+    rest of the graph: the tree is traversed once, and each step is written once.
+    """
     def __init__(self, ast_tree):
         self.ast_tree = ast_tree
         self.step = 1
 
-    @staticmethod
-    def get_last_step_graph(graph):
-        max_step = 0
-        for key, value in graph.items():
-            if max_step < max(value[-1]):
-                max_step = max(value[-1])
-        return max_step
-
     def get_cfg_graph(self):
         # master node must be a sequence
         if self.ast_tree.category == "sequence":
-            graph = self.treat_seq_node(self.ast_tree)
-            # before returning the graph, we set the last steps to 0 (exit node)
-            AstToCfgConverter.set_value_following_node(graph, AstToCfgConverter.get_last_step_graph(graph), 0)
-            # before returning the graph, we check for any inconsistencies like
-            # node jumping a step (passing from step 3 to 5 for example),
-            # and if it is the case we clean the graph
-            # can occur when we have sequence while nested in the if of the sequence,
-            # or others cases like that
-            graph = AstToCfgConverter.clean_inconsistent_graph(graph)
-            return graph
+            self.step = 1
+            # the last steps lead to 0 (exit node)
+            return self.treat_node(self.ast_tree, 0)
         else:
             return None
 
-    @staticmethod
-    def set_value_following_node(graph, target_step, new_value):
-        for key, value_list in graph.items():
-            next_steps = value_list[-1]
-            if isinstance(next_steps, list):
-                for index, item in enumerate(next_steps):
-                    if item == target_step:
-                        next_steps[index] = new_value
+    def treat_node(self, node, following_step=None):
+        """
+        Build the graph of a statement (sequence, if, while or assign), starting at self.step.
+        self.step is then set to the first step after the statement.
+        :param node: an AST node
+        :param following_step: step reached at the end of the statement (by default, the step after the statement)
+        :return: dic, the CFG graph of the statement
+        """
+        sizes = AstToCfgConverter.get_sizes(node)
+        first_step = self.step
+        self.step = first_step + sizes[id(node)]
+        if following_step is None:
+            following_step = self.step
+
+        graph = {}
+        # (node, its first step, step following it); children are pushed in reverse order
+        # so that steps are added to the graph in increasing order
+        stack = [(node, first_step, following_step)]
+        while stack:
+            current, step, following = stack.pop()
+            if current.category == "assign":
+                graph[step] = ["assign", self.treat_assign_node(current), [following]]
+            elif current.category == "sequence":
+                if len(current.children) == 0:
+                    graph[step] = ["skip", [following]]
+                    continue
+                to_push = []
+                for index, child in enumerate(current.children):
+                    if index == len(current.children) - 1:
+                        to_push.append((child, step, following))
+                    else:
+                        to_push.append((child, step, step + sizes[id(child)]))
+                    step += sizes[id(child)]
+                stack.extend(reversed(to_push))
+            elif current.category == "if":
+                else_step = step + 1 + sizes[id(current.children[1])]
+                graph[step] = ["if", self.treat_boolean_expr(current.children[0]), [step + 1, else_step]]
+                stack.append((current.children[2], else_step, following))
+                stack.append((current.children[1], step + 1, following))
+            elif current.category == "while":
+                graph[step] = ["while", self.treat_boolean_expr(current.children[0]), [step + 1, following]]
+                # the end of the body goes back to the while step
+                stack.append((current.children[1], step + 1, step))
             else:
-                if next_steps == target_step:
-                    value_list[-1] = new_value
+                raise ValueError("Unexpected node in a program: " + str(current.category))
         return graph
 
     @staticmethod
-    def clean_inconsistent_graph(graph):
+    def get_sizes(node):
         """
-        If there is missing nodes or shifted nodes in the graph,
-        will shift every wrong based node.
-        Otherwise, returns the graph
-        This method should not be used if all methods of ast to cgf converter are correct.
-        However and sadly, for lack of time, we use this "hack" to make correct tree
-        :param graph:
-        :return: clean graph
+        :param node: an AST node
+        :return: dic {id(node): number of steps} for the node and every statement inside it
         """
-        # if their is missing nodes of shifted node in the graph,
-        # will shift every wrong based node.
-        # Otherwise, returns the graph
-        initial_keys = []
-        for key, value_list in graph.items():
-            initial_keys.append(key)
-
-        bigger_key = max(initial_keys)
-
-        error = 0
-        # loop through the keys to see if there is any missing
-        for i in range(1, bigger_key):
-            if i not in initial_keys:
-                error = i
-
-        if error == 0:
-            return graph
-
-        # make sub graph of keys to modify, shifting the keys number already
-        sub_graph = {key - 1: graph[key] for key in graph if key > error}
-
-        # shift values for all values inside each node (including last one) from n to n-1
-        for j in range(error, bigger_key + 1):
-            AstToCfgConverter.set_value_following_node(sub_graph, j, j-1)
-            if j < bigger_key:
-                graph.pop(j+1)
-
-        graph.update(sub_graph)
-        # recursive call to clean if their was an other error
-        return AstToCfgConverter.clean_inconsistent_graph(graph)
-
-    def treat_seq_node(self, node):
-        full_graph = {}
-        for child in node.children:
-            if child.category == "if":
-                partial_graph = self.treat_if_node(child)
-                full_graph.update(partial_graph)
-                self.step += 1
-            elif child.category == "assign":
-                tmp = self.treat_assign_node(child)  # ["x+1", ""]
-                # 2: ("assign", "-x", "", 4),
-                partial_graph = {
-                    self.step: ["assign", tmp, [self.step + 1]]
-                }
-                full_graph.update(partial_graph)
-                self.step += 1
-            elif child.category == "while":
-                partial_graph = self.treat_while_node(child)
-                full_graph.update(partial_graph)
-                self.step += 1
-            elif child.category == "sequence":
-                partial_graph = self.treat_seq_node(child)
-                full_graph.update(partial_graph)
-                self.step += 1
-
-        return full_graph
-
-    def treat_while_node(self, node):
-        if node.children[0].category == 'compare':
-            operator = [[tuple(self.treat_condition(node.children[0]))]]
-        elif node.children[0].category == 'logic':
-            operator = self.treat_composed_boolean_expr(node.children[0])
-        else:
-            return None
-
-        while_number_step = self.step
-        delta = 1
-
-        # The loop is inside node.children[1].
-        # We have to build the graph for this inside loop,
-        # and set the exit step to the step number of the while node
-
-        # we have to get the number of steps inside the while loop
-        if node.children[1].category == "assign":
-            self.step += 1
-            delta += 1
-            loop_body = self.treat_assign_node(node.children[1])
-            # new: replace two places in list by dic
-            # to_add = {self.step: ["assign", loop_body[0], loop_body[1], while_number_step]}  # Back to loop
-            to_add = {self.step: ["assign", loop_body, [while_number_step]]}  # Back to loop
-        elif node.children[1].category == "sequence":
-            self.step += 1
-            to_change_before_add = self.treat_seq_node(node.children[1])
-            # set last step of sequence to while step number
-            self.set_value_following_node(to_change_before_add, self.step, while_number_step)
-            # get delta
-            delta += len(to_change_before_add)
-            to_add = to_change_before_add
-        elif node.children[1].category == "if":
-            self.step += 1
-            to_change_before_add = self.treat_if_node(node.children[1])
-            # set last steps of if graph to while step number
-            self.set_value_following_node(to_change_before_add, self.step + 1, while_number_step)
-
-            # get delta
-            delta += len(to_change_before_add)
-            to_add = to_change_before_add
-        else:
-            to_add = {}
-
-        partial_graph = {while_number_step: ["while",
-                                             operator,
-                                             [while_number_step + 1, while_number_step + delta]]}
-        partial_graph.update(to_add)
-        return partial_graph
-
-    def treat_if_node(self, node):
-        if node.children[0].category == 'compare':
-            operator = [[tuple(self.treat_condition(node.children[0]))]]
-        elif node.children[0].category == 'logic':
-            operator = self.treat_composed_boolean_expr(node.children[0])
-        else:
-            return None
-
-        # delta is used to set the number of next step (by default one, and more for sequence, if, while)
-        delta = 1
-        delta_left = 2
-        delta_right = 1
-        if any(node.children[1].category == x for x in ("sequence", "while", "if")):
-            length_child_node = AstToCfgConverter.get_length_node(node.children[1])
-            delta_left = 1 + length_child_node
-            if delta < length_child_node:
-                delta = length_child_node
-
-        if any(node.children[2].category == x for x in ("sequence", "while", "if")):
-            length_child_node = AstToCfgConverter.get_length_node(node.children[2])
-            delta_right = length_child_node
-            if delta < length_child_node:
-                delta = length_child_node
-
-        right_value_next_step = self.step + delta_left
-        partial_graph = {self.step: ["if", operator, [self.step + 1, right_value_next_step]]}
-
-        # left member
-        if node.children[1].category == "assign":
-            self.step += 1
-            if_body_assign = self.treat_assign_node(node.children[1])
-            partial_graph[self.step] = ["assign", if_body_assign, [self.step + delta + 1]]
-        elif node.children[1].category == "sequence":
-            self.step += 1
-            seq = node.children[1]
-            partial_graph.update(self.treat_seq_node(seq))
-        elif node.children[1].category == "while":
-            self.step += 1
-            if_body_while = self.treat_while_node(node.children[1])
-            AstToCfgConverter.set_value_following_node(
-                if_body_while, self.step + 1, right_value_next_step + delta_right
-            )
-            partial_graph.update(if_body_while)
-        elif node.children[1].category == "if":
-            self.step += 1
-            if_body_if = self.treat_if_node(node.children[1])
-            partial_graph.update(if_body_if)
-
-        # right member
-        if node.children[2].category == "assign":
-            self.step += 1
-            else_body_assign = self.treat_assign_node(node.children[2])
-            partial_graph[self.step] = ["assign", else_body_assign, [self.step + 1]]
-        elif node.children[2].category == "sequence":
-            self.step += 1
-            seq = node.children[2]
-            partial_graph.update(self.treat_seq_node(seq))
-        elif node.children[2].category == "while":
-            self.step += 1
-            else_body_while = self.treat_while_node(node.children[2])
-            partial_graph.update(else_body_while)
-        elif node.children[2].category == "if":
-            self.step += 1
-            else_body_if = self.treat_if_node(node.children[2])
-            partial_graph.update(else_body_if)
+        sizes = {}
+        # post order traversal: the size of a node is computed after the sizes of its children
+        stack = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if current.category == "sequence":
+                children = current.children
+            elif current.category == "if":
+                children = current.children[1:3]
+            elif current.category == "while":
+                children = current.children[1:2]
+            else:
+                sizes[id(current)] = 1
+                continue
+
+            if not children_done:
+                stack.append((current, True))
+                stack.extend((child, False) for child in children)
+            elif current.category == "sequence":
+                sizes[id(current)] = max(1, sum(sizes[id(child)] for child in children))
+            else:
+                sizes[id(current)] = 1 + sum(sizes[id(child)] for child in children)
+        return sizes
 
-        return partial_graph
+    @staticmethod
+    def treat_boolean_expr(node):
+        """
+        :param node: condition of a if or a while (compare or logic node)
+        :return: the condition in CNF format
+        """
+        if node.category == 'compare':
+            return [[tuple(AstToCfgConverter.treat_condition(node))]]
+        elif node.category == 'logic':
+            return AstToCfgConverter.treat_composed_boolean_expr(node)
+        raise ValueError("Unexpected condition: " + str(node.category))
 
     @staticmethod
     def treat_condition(node):
@@ -326,9 +210,24 @@ class AstToCfgConverter(object):
     @staticmethod
     def treat_operation_node(node):
         """
-        Returns a string containing the operation
+        Returns a string containing the operation (nested operations are put between parentheses)
         """
-        return str(node.children[0].data) + node.data + str(node.children[1].data)
+        parts = []
+        # what is left to write, in reverse order: strings, or operations to write in their place
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            members = []
+            for child in item.children:
+                if child.category == "operation":
+                    members.append(['(', child, ')'])
+                else:
+                    members.append([str(child.data)])
+            stack.extend(reversed(members[0] + [item.data] + members[1]))
+        return ''.join(parts)
 
     @staticmethod
     def treat_assign_node(node):
@@ -354,62 +253,3 @@ class AstToCfgConverter(object):
             if child.category != "constant" and child.category != "variable":
                 return False
         return True
-
-    @staticmethod
-    def get_length_node(node):
-        if node.category == "sequence":
-            return AstToCfgConverter.get_length_sequence(node)
-        elif node.category == "if":
-            return AstToCfgConverter.get_length_if(node)
-        elif node.category == "while":
-            return AstToCfgConverter.get_length_while(node)
-        else:
-            return 1
-
-    @staticmethod
-    def get_length_if(node):
-        if node.children[1] == "sequence":
-            length_if_body = AstToCfgConverter.get_length_sequence(node.children[1])
-        elif node.children[1] == "while":
-            length_if_body = AstToCfgConverter.get_length_while(node.children[1])
-        elif node.children[1] == "if":
-            length_if_body = AstToCfgConverter.get_length_if(node.children[1])
-        else:
-            length_if_body = 1
-
-        if node.children[2] == "sequence":
-            length_else_body = AstToCfgConverter.get_length_sequence(node.children[2])
-        elif node.children[2] == "while":
-            length_else_body = AstToCfgConverter.get_length_while(node.children[2])
-        elif node.children[2] == "if":
-            length_else_body = AstToCfgConverter.get_length_if(node.children[2])
-        else:
-            length_else_body = 1
-        return 2 + max(length_if_body, length_else_body)
-
-    @staticmethod
-    def get_length_while(node):
-        if node.children[1] == "sequence":
-            length_body = AstToCfgConverter.get_length_sequence(node.children[1])
-        elif node.children[1] == "while":
-            length_body = AstToCfgConverter.get_length_while(node.children[1])
-        elif node.children[1] == "if":
-            length_body = AstToCfgConverter.get_length_if(node.children[1])
-        else:
-            length_body = 1
-        return 1 + length_body
-
-    @staticmethod
-    def get_length_sequence(node):
-        if all(child != long_cat for child in node.children for long_cat in ("sequence", "while", "if")):
-            return len(node.children)
-        else:
-            length = 0
-            for child in node.children:
-                if child.category == "sequence":
-                    length += AstToCfgConverter.get_length_sequence(child)
-                elif child.category == "if":
-                    length += AstToCfgConverter.get_length_if(child)
-                elif child.category == "while":
-                    length += AstToCfgConverter.get_length_while(child)
-            return length
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module processes a whole set of values on a program at once, using numpy arrays.
+
+Values of the variables are stored in columns (one integer array per variable, one row per set of values).
+All the rows go through the CFG together: at each step, rows are grouped by their current node,
+assignments are computed on the whole group at once, and a boolean mask splits the group
+between the two following nodes of a 'if' or 'while' node.
+
+The result is exactly the one of process_value_test (process_cfg_tools), for every set of values.
+Rows that can not be processed with fixed size integers (values too large, variable used before being
+defined, ...) are set apart and processed one by one with the compiled program (cfg_compiler).
+Rows still running after LIMIT_FOR_INFINITE_LOOP steps are set apart too: the ValueError is only raised
+when their own result is reached, so the results of the other rows are not lost.
+
+Dependency: numpy (only needed for this module).
+"""
+
+from cfg_compiler import CompiledCfg, VARIABLE_PATTERN, expression_source, bool_expression_source
+from process_cfg_tools import LIMIT_FOR_INFINITE_LOOP, get_conditions_from_bool_expression, \
+    is_boolean_expression_node, type_node
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# above this bound, a value could overflow a 64 bits integer during the next operation
+SAFE_BOUND = 2 ** 62
+
+
+def _column(value, length):
+    """
+    Returns a column of given length (used when a constant is assigned)
+    """
+    return np.array(np.broadcast_to(value, (length,)))
+
+
+def _mask(value, length):
+    """
+    Returns a column of booleans of given length (used when a condition only involves constants)
+    """
+    return np.broadcast_to(np.asarray(value, dtype=bool), (length,))
+
+
+def _get_names(expressions):
+    """
+    :param expressions: a list of expressions from the CFG ('x+1', 'y', 3)
+    :return: the list of variables used in these expressions
+    """
+    names = []
+    for expression in expressions:
+        if isinstance(expression, str):
+            for name in VARIABLE_PATTERN.findall(expression):
+                if name not in names:
+                    names.append(name)
+    return names
+
+
+class BatchNode(object):
+    """
+    A node of the CFG, compiled into functions working on columns of values
+    """
+    def __init__(self, number_node, node_value):
+        self.type = type_node(node_value)
+        self.following_nodes = node_value[-1]
+
+        if self.type == 'assign':
+            self.assigned = list(node_value[1].keys())
+            expressions = list(node_value[1].values())
+            source = 'def run(v, n):\n'
+            for key, instruction in node_value[1].items():
+                source += '    v[%r] = _column(%s, n)\n' % (key, expression_source(instruction))
+        elif is_boolean_expression_node(node_value):
+            self.assigned = []
+            conditions = get_conditions_from_bool_expression(node_value[1])
+            expressions = [value for condition in conditions for value in condition[1]]
+            source = 'def run(v, n):\n    return _mask(%s, n)\n' % bool_expression_source(
+                node_value[1], 'v', '&', '|'
+            )
+            source += 'def conditions(v, n):\n    return [%s]\n' % ', '.join(
+                '_mask((%s %s %s), n)' % (expression_source(condition[1][0]), condition[0],
+                                          expression_source(condition[1][1]))
+                for condition in conditions
+            )
+            source += 'def values(v, n):\n    return [%s]\n' % ', '.join(
+                expression_source(expression) for expression in expressions
+            )
+        else:
+            self.assigned = []
+            expressions = []
+            source = 'def run(v, n):\n    pass\n'
+
+        self.used = _get_names(expressions)
+        # a node with an operation must be checked against overflows
+        self.checked = any(
+            isinstance(expression, str) and not expression.isidentifier()
+            and not expression.lstrip('-').isdigit()
+            for expression in expressions
+        )
+
+        namespace = {'_column': _column, '_mask': _mask}
+        exec(compile(source, '<cfg node %d>' % number_node, 'exec'), namespace)
+        self.run = namespace['run']
+        self.conditions = namespace.get('conditions')
+        self.values = namespace.get('values')
+
+    def out_of_bounds(self, env, length):
+        """
+        Evaluates the operations of the node with floats, to find the rows whose values could overflow
+        :param env: dic {var: column of integers}
+        :param length: number of rows
+        :return: a column of booleans, True for rows that can not be processed with integers
+        """
+        float_env = {name: column.astype(float) for name, column in env.items()}
+        if self.type == 'assign':
+            self.run(float_env, length)
+            results = [float_env[key] for key in self.assigned]
+        else:
+            results = [
+                np.broadcast_to(np.asarray(value, dtype=float), (length,))
+                for value in self.values(float_env, length)
+            ]
+
+        bad_rows = np.zeros(length, dtype=bool)
+        for result in results:
+            bad_rows |= ~(np.abs(result) < SAFE_BOUND)
+        return bad_rows
+
+
+class BatchCfg(object):
+    """
+    A CFG graph compiled in order to process a whole set of values at once
+    """
+    def __init__(self, graph):
+        if np is None:
+            raise ImportError("numpy is required to process sets of values in batch mode")
+        self.graph = graph
+        self.compiled = CompiledCfg(graph)
+        self.nodes = {number_node: BatchNode(number_node, node_value) for number_node, node_value in graph.items()}
+
+        self.assigned = []
+        for node in self.nodes.values():
+            for key in node.assigned:
+                if key not in self.assigned:
+                    self.assigned.append(key)
+
+    def process_values_tests(self, values_tests, info_conditions=False):
+        """
+        Same as process_value_test from process_cfg_tools, for each set of values
+        :param values_tests: a list of dictionaries {var: initial_value} (they are not modified)
+        :param info_conditions: a boolean, if true: each result contains an additional value which is a dic,
+        stating how each condition was evaluated.
+        :return: a list, containing for each set of values the result of process_value_test
+        """
+        values_tests = list(values_tests)
+        run = self._run(values_tests, info_conditions)
+        return list(self._iter_results(values_tests, run, info_conditions, True))
+
+    def get_traces(self, values_tests):
+        """
+        Process each set of values and yield its trace, without the final values of variables.
+        As with process_value_test, a ValueError is raised when the trace of a set of values reaching
+        LIMIT_FOR_INFINITE_LOOP is reached: the traces of the previous sets of values are yielded first.
+        :param values_tests: a list of dictionaries {var: initial_value} (they are not modified)
+        :return: a generator of traces, each trace being a couple (path, dic {node: list(evaluated conditions)})
+        """
+        values_tests = list(values_tests)
+        run = self._run(values_tests, True)
+        return self._iter_results(values_tests, run, True, False)
+
+    def _run(self, values_tests, info_conditions):
+        """
+        Process all sets of values together
+        :return: a dic of the resulting columns
+        """
+        length = len(values_tests)
+
+        # load values in columns
+        names = list(self.assigned)
+        for values in values_tests:
+            for key in values:
+                if key not in names:
+                    names.append(key)
+        columns = {name: np.zeros(length, dtype=np.int64) for name in names}
+        defined = {name: np.zeros(length, dtype=bool) for name in names}
+        # rows which will be processed one by one
+        set_apart = np.zeros(length, dtype=bool)
+        # rows stopped by LIMIT_FOR_INFINITE_LOOP
+        looping = np.zeros(length, dtype=bool)
+        for row, values in enumerate(values_tests):
+            for key, value in values.items():
+                if isinstance(value, int) and -SAFE_BOUND < value < SAFE_BOUND:
+                    columns[key][row] = value
+                    defined[key][row] = True
+                else:
+                    set_apart[row] = True
+
+        cond_values = {}
+        cond_seen = {}
+        if info_conditions:
+            for number_node, node_value in self.graph.items():
+                if is_boolean_expression_node(node_value):
+                    nb_conditions = len(get_conditions_from_bool_expression(node_value[1]))
+                    cond_values[number_node] = np.zeros((length, nb_conditions), dtype=bool)
+                    cond_seen[number_node] = np.zeros(length, dtype=bool)
+
+        current = np.ones(length, dtype=np.int64)
+        current[set_apart] = 0
+        steps = [current.copy()]
+        count = 0
+
+        while True:
+            active = np.flatnonzero(current)
+            if len(active) == 0:
+                break
+            if count == LIMIT_FOR_INFINITE_LOOP:
+                # every row still active has run LIMIT_FOR_INFINITE_LOOP steps, the other ones are done
+                looping[active] = True
+                break
+
+            # group active rows by their current node
+            nodes_active = current[active]
+            order = np.argsort(nodes_active, kind='stable')
+            sorted_nodes = nodes_active[order]
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_nodes)) + 1))
+            ends = np.concatenate((starts[1:], [len(sorted_nodes)]))
+
+            next_nodes = current.copy()
+            for start, end in zip(starts, ends):
+                number_node = int(sorted_nodes[start])
+                rows = active[order[start:end]]
+                node = self.nodes[number_node]
+
+                # rows with a variable not defined yet are set apart
+                keep = np.ones(len(rows), dtype=bool)
+                for name in node.used:
+                    if name in defined:
+                        keep &= defined[name][rows]
+                    else:
+                        keep[:] = False
+                env = {name: columns[name][rows] for name in node.used if name in columns}
+                if node.checked and keep.any():
+                    keep &= ~node.out_of_bounds(env, len(rows))
+                if not keep.all():
+                    set_apart[rows[~keep]] = True
+                    next_nodes[rows[~keep]] = 0
+                    rows = rows[keep]
+                    env = {name: column[keep] for name, column in env.items()}
+                if len(rows) == 0:
+                    continue
+
+                if node.type == 'assign':
+                    node.run(env, len(rows))
+                    for key in node.assigned:
+                        columns[key][rows] = env[key]
+                        defined[key][rows] = True
+                    next_nodes[rows] = node.following_nodes[0]
+                elif node.type == 'skip':
+                    next_nodes[rows] = node.following_nodes[0]
+                else:
+                    bool_result = node.run(env, len(rows))
+                    next_nodes[rows] = np.where(bool_result, node.following_nodes[0], node.following_nodes[1])
+                    if info_conditions:
+                        cond_values[number_node][rows] = np.stack(node.conditions(env, len(rows)), axis=1)
+                        cond_seen[number_node][rows] = True
+
+            current = next_nodes
+            steps.append(current.copy())
+            count += 1
+
+        return {
+            'names': names, 'columns': columns, 'defined': defined, 'set_apart': set_apart,
+            'looping': looping, 'steps': steps, 'cond_values': cond_values, 'cond_seen': cond_seen
+        }
+
+    def _iter_results(self, values_tests, run, info_conditions, final_values):
+        """
+        Convert the columns back to the result of process_value_test for each set of values, in order
+        :param final_values: if false, the dic of final values of variables is left out of each result
+        """
+        matrix = np.stack(run['steps'], axis=1)
+        # index of the exit node (0) in each path
+        lengths = np.argmax(matrix == 0, axis=1).tolist()
+        paths = matrix.tolist()
+        names = run['names'] if final_values else []
+        column_lists = {name: run['columns'][name].tolist() for name in names}
+        defined_lists = {name: run['defined'][name].tolist() for name in names}
+        cond_lists = {key: value.tolist() for key, value in run['cond_values'].items()}
+        seen_lists = {key: value.tolist() for key, value in run['cond_seen'].items()}
+        set_apart = run['set_apart'].tolist()
+        looping = run['looping'].tolist()
+
+        for row, values in enumerate(values_tests):
+            if looping[row]:
+                raise ValueError('Infinite loop - program stopped')
+            if set_apart[row]:
+                result = self.compiled.process_value_test(dict(values), info_conditions)
+                yield result if final_values else (result[0], result[2])
+                continue
+
+            result = [paths[row][:lengths[row] + 1]]
+            if final_values:
+                variables = dict(values)
+                for name in names:
+                    if defined_lists[name][row]:
+                        variables[name] = column_lists[name][row]
+                result.append(variables)
+            if info_conditions:
+                result.append({key: cond_lists[key][row] for key in cond_lists if seen_lists[key][row]})
+            yield tuple(result)
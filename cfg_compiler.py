@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module compiles a CFG graph into native python functions.
+
+process_value_test (process_cfg_tools) interprets the graph: each assignment is rewritten as a string
+and evaluated, each condition goes through compare(). When the same program is run on a lot of values,
+we rather translate the graph once into python source code, one function per node:
+
+    1: ['if', [[('<=', ["x", 0])]], [2, 3]]     def node_1(v):
+                                                    return 2 if (v['x'] <= 0) else 3
+
+    2: ['assign', {'x': '0-x'}, [4]]            def node_2(v):
+                                                    v['x'] = 0-v['x']
+                                                    return 4
+
+Each function takes the dictionary of variables, updates it, and returns the following node.
+The compiled program is then reused for every set of values.
+"""
+
+import re
+
+from process_cfg_tools import LIMIT_FOR_INFINITE_LOOP, get_conditions_from_bool_expression, type_node
+
+VARIABLE_PATTERN = re.compile(r'[A-Za-z_]\w*')
+
+
+def expression_source(expression, env='v'):
+    """
+    Translate an expression of the CFG (assignment or value of a condition) into python source code
+    :param expression: a constant (3), a variable ('x') or an operation ('x+1')
+    :param env: name of the dictionary of variables in the generated code
+    :return: str: "v['x']+1"
+    """
+    if not isinstance(expression, str):
+        return repr(expression)
+    return VARIABLE_PATTERN.sub(lambda match: "%s[%r]" % (env, match.group(0)), expression)
+
+
+def condition_source(comparison, env='v'):
+    """
+    :param comparison: ('<=', ['x', 0])
+    :param env: name of the dictionary of variables in the generated code
+    :return: str: "(v['x'] <= 0)"
+    """
+    operator = comparison[0]
+    values = comparison[1]
+    return '(' + expression_source(values[0], env) + ' ' + operator + ' ' + expression_source(values[1], env) + ')'
+
+
+def bool_expression_source(boolean_expression, env='v', and_operator='and', or_operator='or'):
+    """
+    Translate a boolean expression in CNF format (as stored in the CFG) into python source code
+    :param boolean_expression: [[('<=', ['x', 0]), ('>', ['y', 2])], [('==', ['y', 3])]]
+    :param env: name of the dictionary of variables in the generated code
+    :param and_operator: operator used between the elements of the CNF ('and', or '&' for arrays)
+    :param or_operator: operator used inside an element of the CNF ('or', or '|' for arrays)
+    :return: str: "((v['x'] <= 0) or (v['y'] > 2)) and ((v['y'] == 3))"
+    """
+    and_str_list = []
+    for or_expr in boolean_expression:
+        or_str = (' ' + or_operator + ' ').join(condition_source(condition, env) for condition in or_expr)
+        and_str_list.append('(' + or_str + ')')
+    return (' ' + and_operator + ' ').join(and_str_list)
+
+
+def node_source(number_node, node_value):
+    """
+    :param number_node: number of the node in the CFG
+    :param node_value: value of the node in the CFG
+    :return: str: source code of the function processing the node
+    """
+    lines = ['def node_%d(v):' % number_node]
+    if type_node(node_value) == 'if' or type_node(node_value) == 'while':
+        lines.append('    return %d if %s else %d' % (
+            node_value[-1][0], bool_expression_source(node_value[1]), node_value[-1][1]
+        ))
+    elif type_node(node_value) == 'assign':
+        for key, instruction in node_value[1].items():
+            lines.append('    v[%r] = %s' % (key, expression_source(instruction)))
+        lines.append('    return %d' % node_value[2][0])
+    elif type_node(node_value) == 'skip':
+        lines.append('    return %d' % node_value[1][0])
+    else:
+        raise ValueError('Unknown type of node: ' + str(type_node(node_value)))
+    return '\n'.join(lines)
+
+
+def conditions_source(number_node, node_value):
+    """
+    :param number_node: number of the node in the CFG
+    :param node_value: value of a 'if' or 'while' node
+    :return: str: source code of the function returning the list of evaluated conditions of the node
+    """
+    conditions = get_conditions_from_bool_expression(node_value[1])
+    return 'def cond_%d(v):\n    return [%s]' % (
+        number_node, ', '.join(condition_source(condition) for condition in conditions)
+    )
+
+
+class CompiledCfg(object):
+    """
+    A CFG graph compiled into python functions, built once per program.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+        sources = []
+        for number_node, node_value in graph.items():
+            sources.append(node_source(number_node, node_value))
+            if type_node(node_value) == 'if' or type_node(node_value) == 'while':
+                sources.append(conditions_source(number_node, node_value))
+        self.source = '\n\n'.join(sources) + '\n'
+
+        namespace = {}
+        exec(compile(self.source, '<cfg>', 'exec'), namespace)
+        self.steps = {number_node: namespace['node_%d' % number_node] for number_node in graph}
+        self.conditions = {
+            number_node: namespace['cond_%d' % number_node] for number_node in graph
+            if 'cond_%d' % number_node in namespace
+        }
+
+    def process_value_test(self, variables, info_conditions=False):
+        """
+        Same as process_value_test from process_cfg_tools, on the compiled program
+        :param variables: a dictionary {var: initial_value} (modified in place)
+        :param info_conditions: a boolean, if true: will return an additional value which is a dic,
+        stating how each condition was evaluated.
+        :return: steps the program went through, dic of final values of variables, and perhaps a dic of
+        value of boolean for each condition in a node.
+        """
+        steps = self.steps
+        conditions = self.conditions
+        next_node = 1
+        path = [next_node]
+        count = 0
+
+        dic_result_cond = {}
+
+        while next_node != 0:
+            if count == LIMIT_FOR_INFINITE_LOOP:
+                raise ValueError('Infinite loop - program stopped')
+
+            if info_conditions and next_node in conditions:
+                dic_result_cond[next_node] = conditions[next_node](variables)
+
+            next_node = steps[next_node](variables)
+            path.append(next_node)
+            count += 1
+
+        if info_conditions:
+            return path, variables, dic_result_cond
+        else:
+            return path, variables
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Concolic test generation (concrete and symbolic execution together, as in DART).
+
+The program is run on concrete values (see CompiledCfg.process_value_test), and the predicate of the path taken is
+built along the way (see PathPredicate). For each decision of the path, the predicate of the path up to this
+decision, followed by the other branch, gives by solving new values which take the other branch; the other values
+are kept. Branches are flipped first when they lead to an edge taken by fewer tests (never taken first).
+
+Values are only looked for paths which a run already reached up to the flipped decision: loops are followed as
+far as the concrete values go, without enumerating paths which no value can take.
+"""
+
+import heapq
+
+from cfg_compiler import CompiledCfg
+from dataflow import get_used_variables, get_defined_variables
+from predicates import PathPredicate
+from process_cfg_tools import get_indexed_cfg, is_boolean_expression_node
+from symbolic_exec_tools import solve_predicate
+
+# maximal number of runs of the program
+LIMIT_RUNS = 100
+
+
+def get_program_variables(graph):
+    """
+    :return: list of the variables used or assigned by the program, in order of the nodes
+    """
+    variables = []
+    for node in sorted(graph):
+        for variable in get_used_variables(graph[node]) + get_defined_variables(graph[node]):
+            if variable not in variables:
+                variables.append(variable)
+    return variables
+
+
+def concolic_tests(graph, initial_values=None, limit_runs=LIMIT_RUNS, backend=None, cache=None):
+    """
+    :param graph: a CFG graph
+    :param initial_values: dic {variable: value} of the first run (0 for every variable by default)
+    :param limit_runs: maximal number of runs of the program
+    :param backend: solver to use (see symbolic_exec_tools.BACKENDS)
+    :param cache: dic of the predicates already solved (see symbolic_exec_tools.solve_constraints)
+    :return: list of dic {variable: value}, the values read by each run, in order (a run in an infinite loop, or
+    reading the same values as a previous one, is left out)
+    """
+    graph = get_indexed_cfg(graph)
+    compiled_graph = CompiledCfg(graph)
+    values = {variable: 0 for variable in get_program_variables(graph)}
+    if initial_values is not None:
+        values.update(initial_values)
+
+    # number of runs which took each edge (decision node, following node)
+    covered = {(node, following): 0 for node in graph.decision_nodes for following in graph.successors[node]}
+    # branches to flip: (times the edge was taken when pushed, order, values of the run, path to take)
+    candidates = []
+    # paths already looked for
+    tried = set()
+    tests = []
+    order = 0
+    runs = 0
+    while values is not None and runs < limit_runs:
+        runs += 1
+        try:
+            path = compiled_graph.process_value_test(dict(values))[0]
+        except ValueError:
+            path = None
+
+        # only the variables read before being assigned are values of the test
+        test = None if path is None else {name: values[name] for name in PathPredicate(graph, path).inputs}
+        if test is not None and test not in tests:
+            tests.append(test)
+            for index, step in enumerate(path[:-1]):
+                following = path[index + 1]
+                if is_boolean_expression_node(graph[step]):
+                    covered[(step, following)] += 1
+                    for other in graph.successors[step]:
+                        target = tuple(path[:index + 1]) + (other,)
+                        if other != following and target not in tried:
+                            tried.add(target)
+                            heapq.heappush(candidates, (covered[(step, other)], order, values, target))
+                            order += 1
+
+        values = None
+        while candidates and values is None:
+            times, number, parent_values, target = heapq.heappop(candidates)
+            edge = (target[-2], target[-1])
+            if covered[edge] != times:
+                # the edge was taken since: the branch waits behind the ones leading to less taken edges
+                heapq.heappush(candidates, (covered[edge], number, parent_values, target))
+                continue
+            solution = solve_predicate(PathPredicate(graph, target), backend, cache)
+            # no value is known for the branch if there is none, or if the solver was stopped (UNKNOWN)
+            if isinstance(solution, dict):
+                values = dict(parent_values)
+                values.update(solution)
+    return tests
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module provides a dataflow analysis over a CFG graph: reaching definitions, and the def-use chains
+used by the coverage criteria on definitions and utilizations.
+
+A definition is a couple (node, variable): an 'assign' node defines each of its keys.
+A node uses a variable when the variable appears in one of its expressions (values of an assignment,
+values compared in a condition). In 'x := x + 1', the use of x is before its definition.
+
+Sets of definitions are stored as integers (bit i set: definition i is in the set), and the dataflow
+equations are solved with a worklist:
+    in[n]  = union of out[p] for p predecessor of n
+    out[n] = gen[n] | (in[n] & ~kill[n])
+
+A couple definition - utilization (d, u) exists when the definition d reaches a node u using its variable:
+there is then a path from d to u on which the variable is not redefined (def-clear path).
+"""
+
+from cfg_compiler import VARIABLE_PATTERN
+from process_cfg_tools import get_indexed_cfg, type_node, is_boolean_expression_node, \
+    get_conditions_from_bool_expression
+
+# maximal number of du-paths enumerated for a couple definition - utilization
+LIMIT_DU_PATHS = 1000
+
+
+def get_used_variables(node_value):
+    """
+    :param node_value: value of a node in the CFG
+    :return: list of variables used by the node, without duplicates ['x', 'y']
+    """
+    if type_node(node_value) == 'assign':
+        expressions = list(node_value[1].values())
+    elif is_boolean_expression_node(node_value):
+        expressions = [value for condition in get_conditions_from_bool_expression(node_value[1])
+                       for value in condition[1]]
+    else:
+        expressions = []
+
+    variables = []
+    for expression in expressions:
+        if isinstance(expression, str):
+            for name in VARIABLE_PATTERN.findall(expression):
+                if name not in variables:
+                    variables.append(name)
+    return variables
+
+
+def get_defined_variables(node_value):
+    """
+    :param node_value: value of a node in the CFG
+    :return: list of variables defined by the node ['x']
+    """
+    if type_node(node_value) == 'assign':
+        return list(node_value[1].keys())
+    return []
+
+
+def solve_forward(graph, gen, kill):
+    """
+    Solve a forward 'may' dataflow problem (union at junctions) with a worklist
+    :param graph: an IndexedCfg
+    :param gen: dic {node: bitset generated by the node}
+    :param kill: dic {node: bitset killed by the node}
+    :return: couple of dics (in, out) {node: bitset}
+    """
+    in_sets = {node: 0 for node in graph}
+    out_sets = {node: gen[node] for node in graph}
+    worklist = list(graph)
+    in_worklist = set(worklist)
+    while worklist:
+        node = worklist.pop()
+        in_worklist.discard(node)
+        in_set = 0
+        for predecessor in graph.predecessors.get(node, []):
+            in_set |= out_sets[predecessor]
+        in_sets[node] = in_set
+        out_set = gen[node] | (in_set & ~kill[node])
+        if out_set != out_sets[node]:
+            out_sets[node] = out_set
+            for following in graph.successors[node]:
+                if following != 0 and following not in in_worklist:
+                    worklist.append(following)
+                    in_worklist.add(following)
+    return in_sets, out_sets
+
+
+def get_def_use(graph):
+    """
+    :param graph: a CFG graph
+    :return: the DefUse of the graph; for an IndexedCfg, it is computed once and kept with the indexes
+    """
+    graph = get_indexed_cfg(graph)
+    if getattr(graph, 'dataflow', None) is None:
+        graph.dataflow = DefUse(graph)
+    return graph.dataflow
+
+
+class DefUse(object):
+    """
+    Reaching definitions of a CFG graph, and the def-use chains built from them
+    """
+    def __init__(self, graph):
+        graph = get_indexed_cfg(graph)
+        self.graph = graph
+        self.uses = {node: get_used_variables(value) for node, value in graph.items()}
+        self.defs = {node: get_defined_variables(value) for node, value in graph.items()}
+
+        # list of definitions (node, variable), in the order of the graph
+        self.definitions = [(node, variable) for node in graph for variable in self.defs[node]]
+        bits_per_var = {}
+        for index, (node, variable) in enumerate(self.definitions):
+            bits_per_var[variable] = bits_per_var.get(variable, 0) | (1 << index)
+
+        gen = {node: 0 for node in graph}
+        kill = {node: 0 for node in graph}
+        for index, (node, variable) in enumerate(self.definitions):
+            gen[node] |= 1 << index
+            kill[node] |= bits_per_var[variable]
+        for node in graph:
+            kill[node] &= ~gen[node]
+        self.reaching_in, self.reaching_out = solve_forward(graph, gen, kill)
+
+        # use_def: {(node, variable used): list of definition nodes reaching it}
+        # def_use: {(definition node, variable): list of nodes using it}
+        self.use_def = {}
+        self.def_use = {definition: [] for definition in self.definitions}
+        for node in graph:
+            for variable in self.uses[node]:
+                reaching = self.get_definitions(self.reaching_in[node] & bits_per_var.get(variable, 0))
+                self.use_def[(node, variable)] = [definition[0] for definition in reaching]
+                for definition in reaching:
+                    self.def_use[definition].append(node)
+        # du-paths of every couple, computed the first time they are needed (see get_all_du_paths)
+        self.du_paths = None
+
+    def get_definitions(self, bits):
+        """
+        :param bits: a bitset of definitions
+        :return: list of definitions (node, variable)
+        """
+        definitions = []
+        while bits:
+            lowest_bit = bits & -bits
+            definitions.append(self.definitions[lowest_bit.bit_length() - 1])
+            bits ^= lowest_bit
+        return definitions
+
+    def get_du_pairs(self):
+        """
+        :return: list of couples definition - utilization (definition node, variable, utilization node)
+        """
+        return [(node, variable, use) for (node, variable), uses in self.def_use.items() for use in uses]
+
+    def get_du_paths(self, definition, variable, use):
+        """
+        Every path from the definition to the utilization that is def-clear (the variable is not redefined
+        between them) and loop free (no node visited twice, except definition and utilization which can be
+        the same node).
+        :return: list of paths (tuples of nodes), at most LIMIT_DU_PATHS
+        """
+        paths = []
+        # depth first search: (current node, path until the current node)
+        stack = [(definition, (definition,))]
+        while stack and len(paths) < LIMIT_DU_PATHS:
+            node, path = stack.pop()
+            for following in reversed(self.graph.successors[node]):
+                if following == 0:
+                    continue
+                if following == use:
+                    paths.append(path + (following,))
+                elif following not in path and variable not in self.defs[following]:
+                    stack.append((following, path + (following,)))
+        return paths[:LIMIT_DU_PATHS]
+
+    def get_all_du_paths(self):
+        """
+        :return: list of du-paths (variable, path) of every couple definition - utilization
+        """
+        if self.du_paths is None:
+            self.du_paths = [(variable, path) for definition, variable, use in self.get_du_pairs()
+                             for path in self.get_du_paths(definition, variable, use)]
+        return self.du_paths
+
+    def get_covered(self, path):
+        """
+        Find the couples definition - utilization and du-paths taken by the path of a test
+        :param path: steps the program went through
+        :return: couple (set of (definition, variable, utilization), set of (variable, du-path))
+        """
+        pairs = set()
+        du_paths = set()
+        last_definition = {}
+        for index, step in enumerate(path):
+            if step == 0:
+                break
+            for variable in self.uses[step]:
+                if variable in last_definition:
+                    start = last_definition[variable]
+                    pairs.add((path[start], variable, step))
+                    # a du-path visits each node at most once: a longer part of the path can not be one
+                    if index - start <= len(self.graph):
+                        inside = path[start + 1:index]
+                        if len(set(inside)) == len(inside) and path[start] not in inside and step not in inside:
+                            du_paths.add((variable, tuple(path[start:index + 1])))
+            for variable in self.defs[step]:
+                last_definition[variable] = index
+        return pairs, du_paths
@@ -1,25 +1,68 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from analysis_coverage import get_name_file_from_path
-from ast_tree import GeneratorAstTree
-from ast_to_cfg import AstToCfgConverter
+import os
+from program_cache import load_program
 from sys import argv, exit
-from symbolic_exec_tools import generate_value_from_node, generate_value_from_path
-from process_cfg_tools import get_all_k_paths_brute
+from concurrent.futures import ProcessPoolExecutor
+import integer_solver
+from symbolic_exec_tools import generate_value_from_node, get_path_search
+from process_cfg_tools import get_indexed_cfg, iter_k_paths, count_k_paths
+from symbolic_explorer import SymbolicExplorer
+from concolic import concolic_tests
+from interval_analysis import get_interval_analysis
 
+# in parallel mode, time given to each job, after which its solver is stopped (see solve_objectives)
+LIMIT_JOB = 60
 
-def all_affectations(graph):
+
+def get_affectation_objectives(graph):
+    """
+    :return: list of the 'assign' nodes to reach (a node no value can reach is left out)
+    """
+    graph = get_indexed_cfg(graph)
+    intervals = get_interval_analysis(graph)
+    objectives = []
+    for node in graph.nodes_by_type['assign']:
+        # no value can reach the node: no need to look for one
+        if not intervals.is_reachable_node(node):
+            print("[All affectations] Node " + str(node) + " is unreachable")
+            continue
+        objectives.append(node)
+    return objectives
+
+
+def get_decision_objectives(graph):
+    """
+    :return: list of the decision nodes, and of the nodes following them, to reach (decisions no value can take
+    are left out)
+    """
+    graph = get_indexed_cfg(graph)
+    intervals = get_interval_analysis(graph)
     objectives = []
-    for key, value in graph.items():
-        if value[0] == "assign":
-            objectives.append(key)
+    for key in graph.decision_nodes:
+        # decisions that no value can take are left out
+        if not intervals.is_reachable_node(key):
+            print("[All decisions] Node " + str(key) + " is unreachable")
+            continue
+        objectives.append(key)
+        for following_nodes in graph.successors[key]:
+            if not intervals.is_feasible_edge(key, following_nodes):
+                print("[All decisions] Decision " + str((key, following_nodes)) + " is infeasible")
+            elif following_nodes != 0:
+                objectives.append(following_nodes)
+    return objectives
+
+
+def all_affectations(graph, cache=None):
+    graph = get_indexed_cfg(graph)
+    objectives = get_affectation_objectives(graph)
 
     solutions = []
 
     for objective in objectives:
         # /!\ generate_value_from_node seems to be a dic, but it could be a list of dic!
-        result_objective = generate_value_from_node(graph, objective)
+        result_objective = generate_value_from_node(graph, objective, cache)
         if isinstance(result_objective, dict):
             solutions.append(result_objective)
         elif isinstance(result_objective, list):
@@ -42,20 +85,15 @@ def all_affectations(graph):
     return merge_solutions
 
 
-def all_decisions(graph):
-    objectives = []
-    for key, value in graph.items():
-        if value[0] == "if" or value[0] == "while":
-            objectives.append(key)
-            for following_nodes in value[-1]:
-                if following_nodes != 0:
-                    objectives.append(following_nodes)
+def all_decisions(graph, cache=None):
+    graph = get_indexed_cfg(graph)
+    objectives = get_decision_objectives(graph)
 
     solutions = []
 
     for objective in objectives:
         # /!\ generate_value_from_node seems to be a dic, but it could be a list of dic!
-        result_objective = generate_value_from_node(graph, objective)
+        result_objective = generate_value_from_node(graph, objective, cache)
         if isinstance(result_objective, dict):
             solutions.append(result_objective)
         elif isinstance(result_objective, list):
@@ -78,26 +116,19 @@ def all_decisions(graph):
     return merge_solutions
 
 
-def all_k_paths(graph, k):
-    target_paths = get_all_k_paths_brute(graph, k)
-
-    # remove 0 for all targets
-    for target in target_paths:
-        if 0 in target:
-            target.remove(0)
-
+def all_k_paths(graph, k, cache=None):
+    graph = get_indexed_cfg(graph)
+    explorer = SymbolicExplorer(graph, cache=cache)
     solutions = []
 
-    for target in target_paths:
-        # /!\ generate_value_from_node seems to be a dic, but it could be a list of dic!
-        result_objective = generate_value_from_path(graph, target)
-        if isinstance(result_objective, dict):
-            solutions.append(result_objective)
-        elif isinstance(result_objective, list):
-            solutions.extend(result_objective)
-        elif result_objective is None:
-            target.reverse()
-            print("[All k-paths] Impossible to cover path " + str(target))
+    # paths are explored depth first (see SymbolicExplorer): paths sharing a prefix share its solving,
+    # and a prefix no value can take is cut once for all the paths starting with it
+    for _, result_objective in explorer.explore(k):
+        solutions.append(result_objective)
+    for prefix in explorer.infeasible_prefixes:
+        print("[All k-paths] Impossible to cover paths starting with " + str(prefix))
+    for prefix in explorer.unknown_prefixes:
+        print("[All k-paths] No values found in time for paths starting with " + str(prefix))
 
     merge_solutions = {}
     # merge solution dictionaries
@@ -116,16 +147,15 @@ def all_k_paths(graph, k):
     return merge_solutions
 
 
-def generate_sets_tests(graph_prog, path_folder_to_write, name_file='generated.txt'):
+def generate_values(graph, k):
     """
-    For a given CFG, generate the sets of tests respecting coverage of all criteria already defined
-    :param graph_prog: a CFG of a program
-    :param path_folder_to_write: path of folder in which the output file will be written (must exist)
-    :param name_file: name of file output (default: generated.txt)
-    :return: void (write on disk)
+    Values of all_affectations, all_decisions and all_k_paths, solved one after the other
+    :return: dic {variable: list of values}
     """
+    # predicates solved by a criterion are not solved again by the others
+    cache = {}
     all_results = {}
-    result_all_aff = all_affectations(graph_prog)
+    result_all_aff = all_affectations(graph, cache)
 
     for key, value in result_all_aff.items():
         if key not in all_results:
@@ -133,7 +163,7 @@ def generate_sets_tests(graph_prog, path_folder_to_write, name_file='generated.t
         else:
             all_results[key] += value
 
-    result_all_dec = all_decisions(graph_prog)
+    result_all_dec = all_decisions(graph, cache)
 
     for key, value in result_all_dec.items():
         if key not in all_results:
@@ -141,13 +171,126 @@ def generate_sets_tests(graph_prog, path_folder_to_write, name_file='generated.t
         else:
             all_results[key] += value
 
-    result_k_paths = all_k_paths(graph_prog, 10)
+    result_k_paths = all_k_paths(graph, k, cache)
 
     for key, value in result_k_paths.items():
         if key not in all_results:
             all_results[key] = value
         else:
             all_results[key] += value
+    return all_results
+
+
+def get_k_paths_prefixes(graph, k, number):
+    """
+    :return: list of the shortest prefixes of the k-paths (all of the same length, except those reaching 0) such
+    that there are at least number of them (or the k-paths themselves)
+    """
+    length = 1
+    while length < k and count_k_paths(graph, length) < number:
+        length += 1
+    return list(iter_k_paths(graph, length))
+
+
+def solve_objectives(graph, objectives, k, seconds=LIMIT_JOB):
+    """
+    Solve the objectives of a job, one after the other (used by each process in parallel mode, must stay a
+    module level function)
+    :param graph: a CFG graph
+    :param objectives: list of couples ('node', node to reach) or ('k-paths', prefix of the k-paths to cover)
+    :param k: maximal length of the paths of all k-paths
+    :param seconds: time given to the job: every predicate is solved with the same integer_solver.Budget, so that
+    the solver stops when the time is over, and no objective is started after
+    :return: list of couples (objective, list of solutions {variable: value}), for the objectives solved in time,
+    list of the prefixes of paths found infeasible, and list of the prefixes of paths for which the solver was
+    stopped (see SymbolicExplorer.unknown_prefixes)
+    """
+    graph = get_indexed_cfg(graph)
+    cache = {}
+    budget = integer_solver.Budget(seconds)
+    explorer = SymbolicExplorer(graph, cache=cache, budget=budget)
+    results = []
+    infeasible_prefixes = []
+    unknown_prefixes = []
+    for objective in objectives:
+        # no step spent: only the time is checked
+        if not budget.spend(0):
+            break
+        kind, target = objective
+        if kind == 'node':
+            found = get_path_search(graph).find_path(target, cache, budget)
+            if found is None and budget.exhausted:
+                # the search was stopped: the objective is not solved
+                break
+            results.append((objective, [found[1]] if found is not None else []))
+        else:
+            results.append((objective, [values for _, values in explorer.explore(k, prefix=target)]))
+            infeasible_prefixes.extend(explorer.infeasible_prefixes)
+            unknown_prefixes.extend(explorer.unknown_prefixes)
+    return results, infeasible_prefixes, unknown_prefixes
+
+
+def generate_values_parallel(graph, k, jobs):
+    """
+    Same objectives as all_affectations, all_decisions and all_k_paths, without duplicates, solved by jobs processes.
+    The k-paths are split by prefix, each prefix being an objective. Results are merged in the order of the
+    objectives, whatever the order in which processes end.
+    :return: dic {variable: list of values}
+    """
+    graph = get_indexed_cfg(graph)
+    objectives = [('node', node) for node in
+                  dict.fromkeys(get_affectation_objectives(graph) + get_decision_objectives(graph))]
+    objectives += [('k-paths', tuple(prefix)) for prefix in get_k_paths_prefixes(graph, k, jobs * 4)]
+    # a few jobs per process, so that processes finishing early can take another one
+    size_job = max(1, -(-len(objectives) // (jobs * 4)))
+    # the graph is sent without its indexes, which each process builds again
+    plain_graph = dict(graph)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(solve_objectives, plain_graph, objectives[index:index + size_job], k)
+                   for index in range(0, len(objectives), size_job)]
+        results = []
+        infeasible_prefixes = []
+        unknown_prefixes = []
+        for future in futures:
+            results_job, infeasible_job, unknown_job = future.result()
+            results.extend(results_job)
+            infeasible_prefixes.extend(infeasible_job)
+            unknown_prefixes.extend(unknown_job)
+
+    solved = set(objective for objective, _ in results)
+    for objective in objectives:
+        if objective not in solved:
+            print("[Generation] Objective " + str(objective) + " not solved within the time of its job (" +
+                  str(LIMIT_JOB) + " seconds)")
+    for prefix in infeasible_prefixes:
+        print("[All k-paths] Impossible to cover paths starting with " + str(prefix))
+    for prefix in unknown_prefixes:
+        print("[All k-paths] No values found in time for paths starting with " + str(prefix))
+
+    all_results = {}
+    for _, solutions in results:
+        for solution in solutions:
+            for key, value in solution.items():
+                all_results.setdefault(key, []).append(value)
+    return all_results
+
+
+def generate_sets_tests(graph_prog, path_folder_to_write, name_file='generated.txt', jobs=1):
+    """
+    For a given CFG, generate the sets of tests respecting coverage of all criteria already defined
+    :param graph_prog: a CFG of a program
+    :param path_folder_to_write: path of folder in which the output file will be written (must exist)
+    :param name_file: name of file output (default: generated.txt)
+    :param jobs: number of processes solving the objectives (1: no parallelism, os.cpu_count() for every core),
+    see generate_values_parallel
+    :return: void (write on disk)
+    """
+    # indexes of the graph are built once, and shared by every criterion
+    graph_prog = get_indexed_cfg(graph_prog)
+    if jobs > 1:
+        all_results = generate_values_parallel(graph_prog, 10, jobs)
+    else:
+        all_results = generate_values(graph_prog, 10)
 
     # TODO: concat others generated files
 
@@ -175,33 +318,68 @@ def generate_sets_tests(graph_prog, path_folder_to_write, name_file='generated.t
         file.close()
 
 
-def main():
-    file_program = treat_command()
-    name_prog = get_name_file_from_path(file_program)
-    ast_tree_prog = GeneratorAstTree.get_ast_from_name(name_prog)
+def generate_sets_tests_concolic(graph_prog, path_folder_to_write, name_file='generated.txt'):
+    """
+    For a given CFG, generate a set of tests by concolic execution (see concolic): the program is run on concrete
+    values, and the branches of the paths taken are flipped one after the other
+    :param graph_prog: a CFG of a program
+    :param path_folder_to_write: path of folder in which the output file will be written (must exist)
+    :param name_file: name of file output (default: generated.txt)
+    :return: void (write on disk), one test per line
+    """
+    tests = concolic_tests(graph_prog)
+    with open(path_folder_to_write + '/' + name_file, 'w') as file:
+        for test in tests:
+            file.write(",".join(key + ':' + str(value) for key, value in test.items()) + "\n")
+
 
-    # Convert AST to CFG
-    converter = AstToCfgConverter(ast_tree_prog)
-    graph = converter.get_cfg_graph()
+def main():
+    file_program, options = treat_command()
+    # the CFG graph comes from the cache, or from the parsing of the file program
+    graph = load_program(file_program)['cfg']
 
-    # generates
-    all_affectations(graph)
-    all_decisions(graph)
-    all_k_paths(graph, 10)
+    os.makedirs(options['output'], exist_ok=True)
+    generate_sets_tests(graph, options['output'], options['name'], options['jobs'])
+    print("Tests written to " + os.path.join(options['output'], options['name']))
 
 
 def treat_command():
+    """
+    :return: path of the program, and a dic of options {'jobs': int, 'output': path of folder, 'name': file name}
+    """
     try:
         file_program = argv[1]
-        return file_program
     except IndexError:
         display_usage()
         exit()
 
+    options = {'jobs': 1, 'output': 'generated_tests', 'name': 'generated.txt'}
+    arguments = iter(argv[2:])
+    for argument in arguments:
+        if argument in ('-j', '-o', '-n'):
+            try:
+                value = next(arguments)
+                if argument == '-j':
+                    options['jobs'] = os.cpu_count() if value == 'all' else int(value)
+                elif argument == '-o':
+                    options['output'] = value
+                else:
+                    options['name'] = value
+            except (StopIteration, ValueError):
+                display_usage()
+                exit()
+        else:
+            display_usage()
+            exit()
+    return file_program, options
+
 
 def display_usage():
     print("Usage: ")
-    print("$ python generator.py path_prog.txt")
+    print("$ python generator.py path_prog.txt [-j N] [-o folder] [-n name]")
+    print("  -j N: solve the objectives in N processes ('all': one per core)")
+    print("  -o folder: folder where the tests are written (generated_tests by default)")
+    print("  -n name: name of the file of tests (generated.txt by default)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A solver for the path predicates built by symbolic_exec_tools: integer variables, operations +, -, *,
+comparisons, and any combination of them with 'and', 'or', 'not'.
+
+Each variable has a domain (an interval of integers, unbounded by default: see DOMAIN). The solver alternates:
+    - propagation: each comparison removes from the domains the values which can not verify it
+      (for 'x2 == x1 - 1', the domain of x2 is restricted to the domain of x1 minus 1, and the domain of x1
+      to the domain of x2 plus 1); a 'or' is propagated when only one of its members can still be true
+    - branching: when nothing more can be removed, a 'or' is split into one branch per member, or else the
+      domain of a variable is split (its value closest to 0 first, then the rest of the domain)
+until every variable has a single value. A branch whose domain gets empty is abandoned.
+
+Branches are explored depth first, in the same order each time: the solution found for a predicate is always
+the same, and values close to 0 are found first.
+The search stops after LIMIT_NODES branches, or when its Budget is exhausted: the result is then UNKNOWN, which
+is not the same as None (the predicate has no solution).
+"""
+
+import ast
+import time
+from fractions import Fraction
+from math import ceil, floor
+
+INFINITY = float('inf')
+# domain of every variable: any integer, so that a predicate found without solution has none (a bounded domain
+# would leave out the solutions beyond its bounds)
+DOMAIN = (-INFINITY, INFINITY)
+# maximal number of branches explored for a predicate
+LIMIT_NODES = 20000
+# maximal number of passes of propagation before branching
+LIMIT_PROPAGATION = 50
+
+NEGATED_COMPARATORS = {'==': '!=', '!=': '==', '<=': '>', '>': '<=', '<': '>=', '>=': '<'}
+AST_COMPARATORS = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+AST_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*'}
+
+
+class Budget(object):
+    """
+    Work a solver may do: a number of steps and/or a time. The solver checks it itself at each step (see spend):
+    no signal nor thread is used, so budgets of solvers running at the same time, in different threads or
+    processes, are independent, and a budget can be shared by several solvings.
+    """
+    def __init__(self, seconds=None, steps=None):
+        """
+        :param seconds: time allowed from now (no limit if None)
+        :param steps: number of steps allowed (no limit if None)
+        """
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.steps = steps
+        self.spent = 0
+        self.exhausted = False
+
+    def spend(self, steps=1):
+        """
+        :return: False once the budget is exhausted (the solver must then stop)
+        """
+        self.spent += steps
+        if (self.steps is not None and self.spent > self.steps) or \
+                (self.deadline is not None and time.monotonic() > self.deadline):
+            self.exhausted = True
+        return not self.exhausted
+
+
+class Unknown(object):
+    """
+    Result of a solver stopped before it found a solution or proved there is none (see LIMIT_NODES and Budget)
+    """
+    def __repr__(self):
+        return 'UNKNOWN'
+
+    def __reduce__(self):
+        # UNKNOWN stays the same object once sent to another process
+        return 'UNKNOWN'
+
+
+UNKNOWN = Unknown()
+
+
+class BudgetExhausted(Exception):
+    """
+    Raised to stop a solver which can not check a Budget itself (see symbolic_exec_tools)
+    """
+    pass
+
+
+class Infeasible(Exception):
+    """
+    Raised when a domain gets empty
+    """
+    pass
+
+
+def parse_constraint(text):
+    """
+    :param text: a constraint of a path predicate '(x2 >= 1) and not (y1 == x2 * 2)'
+    ('=' is read as '==')
+    :return: the constraint as a tree, without 'not': ('and', [constraints]), ('or', [constraints]),
+    or a comparison ('cmp', operator, left expression, right expression)
+    Expressions are ('const', value), ('var', name), ('+'|'-'|'*', left, right)
+    """
+    text = text.replace('==', '=').replace('<=', '\0').replace('>=', '\1').replace('!=', '\2')
+    text = text.replace('=', '==').replace('\0', '<=').replace('\1', '>=').replace('\2', '!=')
+    return _to_constraint(ast.parse(text.strip(), mode='eval').body, True)
+
+
+def parse_expression(text):
+    """
+    :param text: an expression 'x+1', '(0-x)*y'
+    :return: the expression as a tree (see parse_constraint)
+    """
+    return _to_expression(ast.parse(str(text).strip(), mode='eval').body)
+
+
+def _to_constraint(node, positive):
+    """
+    :param positive: if false, the negation of the node is returned
+    """
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return _to_constraint(node.operand, not positive)
+    elif isinstance(node, ast.BoolOp):
+        is_and = isinstance(node.op, ast.And) == positive
+        return ('and' if is_and else 'or', [_to_constraint(value, positive) for value in node.values])
+    elif isinstance(node, ast.Compare):
+        members = [node.left] + node.comparators
+        comparisons = []
+        for index, operator in enumerate(node.ops):
+            comparator = AST_COMPARATORS[type(operator)]
+            if not positive:
+                comparator = NEGATED_COMPARATORS[comparator]
+            comparisons.append(('cmp', comparator, _to_expression(members[index]),
+                                _to_expression(members[index + 1])))
+        if len(comparisons) == 1:
+            return comparisons[0]
+        return ('and' if positive else 'or', comparisons)
+    elif isinstance(node, ast.Constant) and isinstance(node.value, bool):
+        # true is 0 == 0, false is 0 != 0
+        return ('cmp', '==' if node.value == positive else '!=', ('const', 0), ('const', 0))
+    raise ValueError("Unexpected constraint: " + ast.dump(node))
+
+
+def _to_expression(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool):
+        return 'const', node.value
+    elif isinstance(node, ast.Name):
+        return 'var', node.id
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return '-', ('const', 0), _to_expression(node.operand)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+        return _to_expression(node.operand)
+    elif isinstance(node, ast.BinOp) and type(node.op) in AST_OPERATORS:
+        return AST_OPERATORS[type(node.op)], _to_expression(node.left), _to_expression(node.right)
+    raise ValueError("Unexpected expression: " + ast.dump(node))
+
+
+def get_variables(constraint, variables=None):
+    """
+    :return: list of the variables of a constraint (or of an expression), in order of appearance
+    """
+    if variables is None:
+        variables = []
+    if constraint[0] == 'var':
+        if constraint[1] not in variables:
+            variables.append(constraint[1])
+    elif constraint[0] in ('and', 'or'):
+        for member in constraint[1]:
+            get_variables(member, variables)
+    elif constraint[0] == 'cmp':
+        get_variables(constraint[2], variables)
+        get_variables(constraint[3], variables)
+    elif constraint[0] != 'const':
+        get_variables(constraint[1], variables)
+        get_variables(constraint[2], variables)
+    return variables
+
+
+def evaluate(expression, domains):
+    """
+    :param expression: an expression tree (see parse_constraint)
+    :param domains: dic {variable: (low, high)}
+    :return: interval (low, high) of the values of the expression
+    """
+    kind = expression[0]
+    if kind == 'const':
+        return expression[1], expression[1]
+    elif kind == 'var':
+        return domains[expression[1]]
+    left = evaluate(expression[1], domains)
+    right = evaluate(expression[2], domains)
+    if kind == '+':
+        return left[0] + right[0], left[1] + right[1]
+    elif kind == '-':
+        return left[0] - right[1], left[1] - right[0]
+    products = [_multiply(x, y) for x in left for y in right]
+    return min(products), max(products)
+
+
+def _multiply(a, b):
+    # 0 * infinity is 0 for intervals of integers
+    if a == 0 or b == 0:
+        return 0
+    return a * b
+
+
+def _intersect(interval, low, high):
+    low = max(interval[0], low)
+    high = min(interval[1], high)
+    if low > high:
+        raise Infeasible()
+    return low, high
+
+
+def restrict(expression, target, domains):
+    """
+    Remove from the domains the values for which the expression is out of the target interval
+    :param target: interval (low, high)
+    :return: True if a domain changed
+    :raise Infeasible: if the expression can not be in the target interval
+    """
+    kind = expression[0]
+    value = evaluate(expression, domains)
+    target = _intersect(value, target[0], target[1])
+    if kind == 'const' or target == value:
+        return False
+    if kind == 'var':
+        domains[expression[1]] = target
+        return True
+
+    left = evaluate(expression[1], domains)
+    right = evaluate(expression[2], domains)
+    if kind == '+':
+        # left = target - right, right = target - left
+        changed = restrict(expression[1], (target[0] - right[1], target[1] - right[0]), domains)
+        left = evaluate(expression[1], domains)
+        return restrict(expression[2], (target[0] - left[1], target[1] - left[0]), domains) or changed
+    elif kind == '-':
+        # left = target + right, right = left - target
+        changed = restrict(expression[1], (target[0] + right[0], target[1] + right[1]), domains)
+        left = evaluate(expression[1], domains)
+        return restrict(expression[2], (left[0] - target[1], left[1] - target[0]), domains) or changed
+    # product: a member can only be restricted when the other one can not be 0
+    changed = False
+    if not right[0] <= 0 <= right[1]:
+        changed = restrict(expression[1], _divide(target, right), domains)
+        left = evaluate(expression[1], domains)
+    if not left[0] <= 0 <= left[1]:
+        changed = restrict(expression[2], _divide(target, left), domains) or changed
+    return changed
+
+
+def _divide(target, divisor):
+    """
+    :return: the smallest interval of integers containing every t / d (t in target, d in divisor, 0 not in divisor)
+    """
+    quotients = []
+    for t in target:
+        for d in divisor:
+            if t in (-INFINITY, INFINITY):
+                # infinity / infinity is left out: a finite bound of the divisor gives the same infinite quotient
+                if d not in (-INFINITY, INFINITY):
+                    quotients.append(t if d > 0 else -t)
+            else:
+                quotients.append(0 if d in (-INFINITY, INFINITY) else Fraction(t, d))
+    low, high = min(quotients), max(quotients)
+    return low if low == -INFINITY else ceil(low), high if high == INFINITY else floor(high)
+
+
+def can_be_true(constraint, domains):
+    """
+    :return: False if the constraint is false for every value of the domains
+    """
+    kind = constraint[0]
+    if kind == 'and':
+        return all(can_be_true(member, domains) for member in constraint[1])
+    elif kind == 'or':
+        return any(can_be_true(member, domains) for member in constraint[1])
+    left = evaluate(constraint[2], domains)
+    right = evaluate(constraint[3], domains)
+    operator = constraint[1]
+    if operator == '==':
+        return left[0] <= right[1] and right[0] <= left[1]
+    elif operator == '!=':
+        return not (left[0] == left[1] == right[0] == right[1])
+    elif operator == '<=':
+        return left[0] <= right[1]
+    elif operator == '<':
+        return left[0] < right[1]
+    elif operator == '>=':
+        return left[1] >= right[0]
+    return left[1] > right[0]
+
+
+def is_true(constraint, domains):
+    """
+    :return: True if the constraint is true for every value of the domains
+    """
+    kind = constraint[0]
+    if kind == 'and':
+        return all(is_true(member, domains) for member in constraint[1])
+    elif kind == 'or':
+        return any(is_true(member, domains) for member in constraint[1])
+    return not can_be_true(('cmp', NEGATED_COMPARATORS[constraint[1]], constraint[2], constraint[3]), domains)
+
+
+def propagate(constraint, domains):
+    """
+    Remove from the domains values for which the constraint is false
+    :return: True if a domain changed
+    :raise Infeasible: if the constraint can not be true
+    """
+    kind = constraint[0]
+    if kind == 'and':
+        changed = False
+        for member in constraint[1]:
+            changed = propagate(member, domains) or changed
+        return changed
+    elif kind == 'or':
+        possible = [member for member in constraint[1] if can_be_true(member, domains)]
+        if len(possible) == 0:
+            raise Infeasible()
+        if len(possible) == 1:
+            return propagate(possible[0], domains)
+        return False
+
+    operator, left_expression, right_expression = constraint[1:]
+    left = evaluate(left_expression, domains)
+    right = evaluate(right_expression, domains)
+    if operator == '==':
+        target_left, target_right = right, left
+    elif operator == '<=':
+        target_left, target_right = (left[0], right[1]), (left[0], right[1])
+    elif operator == '<':
+        target_left, target_right = (left[0], right[1] - 1), (left[0] + 1, right[1])
+    elif operator == '>=':
+        target_left, target_right = (right[0], left[1]), (right[0], left[1])
+    elif operator == '>':
+        target_left, target_right = (right[0] + 1, left[1]), (right[0], left[1] - 1)
+    else:
+        # '!=': only a bound equal to the single value of the other member can be removed
+        if not can_be_true(constraint, domains):
+            raise Infeasible()
+        target_left = _remove_bound(left, right)
+        target_right = _remove_bound(right, left)
+    changed = restrict(left_expression, target_left, domains)
+    return restrict(right_expression, target_right, domains) or changed
+
+
+def _remove_bound(interval, other):
+    if other[0] != other[1]:
+        return interval
+    if interval[0] == other[0]:
+        return interval[0] + 1, interval[1]
+    if interval[1] == other[0]:
+        return interval[0], interval[1] - 1
+    return interval
+
+
+def _find_undecided_or(constraint, domains):
+    """
+    :return: a 'or' which must be true (member of the constraint, or of a 'and' inside it) and which is not true yet
+    """
+    if constraint[0] == 'and':
+        for member in constraint[1]:
+            found = _find_undecided_or(member, domains)
+            if found is not None:
+                return found
+    elif constraint[0] == 'or' and not is_true(constraint, domains):
+        return constraint
+    return None
+
+
+def _replace(constraint, old, new):
+    """
+    :return: the constraint, where the member old (compared by identity) is replaced by new
+    """
+    if constraint is old:
+        return new
+    if constraint[0] == 'and':
+        return 'and', [_replace(member, old, new) for member in constraint[1]]
+    return constraint
+
+
+def solve(constraints, variables=None, domain=DOMAIN, limit_nodes=None, budget=None):
+    """
+    :param constraints: list of constraints (strings, see parse_constraint, or trees) which must all be true
+    :param variables: variables of the solution (by default, every variable of the constraints)
+    :param domain: interval (low, high) of the values of every variable
+    :param limit_nodes: maximal number of branches explored (LIMIT_NODES by default)
+    :param budget: a Budget, one step being spent per branch explored
+    :return: a solution {variable: value}, None if there is none, or UNKNOWN if none was found within the limits
+    """
+    if limit_nodes is None:
+        limit_nodes = LIMIT_NODES
+    trees = [parse_constraint(constraint) if isinstance(constraint, str) else constraint
+             for constraint in constraints]
+    root = ('and', trees)
+    all_variables = list(variables) if variables is not None else []
+    get_variables(root, all_variables)
+
+    # depth first search: (domains, constraint still to satisfy)
+    stack = [({variable: domain for variable in all_variables}, root)]
+    nodes = 0
+    while stack and nodes < limit_nodes:
+        nodes += 1
+        if budget is not None and not budget.spend():
+            break
+        domains, constraint = stack.pop()
+        try:
+            for _ in range(LIMIT_PROPAGATION):
+                if not propagate(constraint, domains):
+                    break
+        except Infeasible:
+            continue
+
+        undecided = _find_undecided_or(constraint, domains)
+        if undecided is not None:
+            # one branch per member which can still be true; the first member is explored first
+            members = [member for member in undecided[1] if can_be_true(member, domains)]
+            for member in reversed(members):
+                stack.append((dict(domains), _replace(constraint, undecided, member)))
+            continue
+
+        not_fixed = [variable for variable in all_variables if domains[variable][0] != domains[variable][1]]
+        if not not_fixed:
+            if is_true(constraint, domains):
+                return {variable: domains[variable][0] for variable in all_variables}
+            continue
+
+        # the variable with the smallest domain is split: its value closest to 0 first
+        variable = min(not_fixed, key=lambda name: domains[name][1] - domains[name][0])
+        low, high = domains[variable]
+        value = min(max(0, low), high)
+        branches = [(value, value)]
+        if value < high:
+            branches.append((value + 1, high))
+        if low < value:
+            branches.append((low, value - 1))
+        for branch in reversed(branches):
+            branch_domains = dict(domains)
+            branch_domains[variable] = branch
+            stack.append((branch_domains, constraint))
+    # branches left unexplored may have a solution
+    return UNKNOWN if stack else None
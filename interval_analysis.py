@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module computes, by abstract interpretation, an interval of possible values for each variable at each
+node of a CFG graph, whatever the values given to the program.
+
+A state is a dic {variable: (low, high)} (a variable which is not in the dic can have any value), or None
+when the node can not be reached. Bounds can be infinite (-INFINITY, INFINITY).
+
+The states are computed with a worklist, from node 1 (every variable can have any value):
+    - an 'assign' node computes the interval of the expression
+    - a 'if' or 'while' node restricts the state to the values for which the condition is true
+      (first following node) or false (second following node): a branch which gets an empty state is infeasible
+States reaching a node by different branches are joined (smallest interval containing both).
+At a while node, after WIDENING_DELAY visits, a bound which is still moving is set to infinity, so that the
+computation ends; a few passes without widening then give back some precision (narrowing).
+
+The result over-approximates the values of any execution: a node found unreachable (or a branch found
+infeasible) is never reached by a test, and no test needs to be looked for.
+"""
+
+import ast
+import heapq
+
+from process_cfg_tools import get_indexed_cfg, type_node, is_boolean_expression_node
+
+INFINITY = float('inf')
+TOP = (-INFINITY, INFINITY)
+# number of visits of a while node before widening
+WIDENING_DELAY = 3
+# any node visited more often is widened too (only for graphs with a cycle that does not go through a while)
+LIMIT_VISITS = 100
+# number of passes over the graph after widening
+NARROWING_PASSES = 2
+
+NEGATED_COMPARATORS = {'==': '!=', '!=': '==', '<=': '>', '>': '<=', '<': '>=', '>=': '<'}
+# comparator to use when both sides of a comparison are exchanged (x < y is y > x)
+SWAPPED_COMPARATORS = {'==': '==', '!=': '!=', '<=': '>=', '>=': '<=', '<': '>', '>': '<'}
+
+# parsed expressions of the graph {expression: python ast}
+_parsed_expressions = {}
+
+
+def _multiply(a, b):
+    # 0 * infinity is 0 for intervals of integers
+    if a == 0 or b == 0:
+        return 0
+    return a * b
+
+
+def add_intervals(a, b):
+    return a[0] + b[0], a[1] + b[1]
+
+
+def subtract_intervals(a, b):
+    return a[0] - b[1], a[1] - b[0]
+
+
+def multiply_intervals(a, b):
+    products = [_multiply(x, y) for x in a for y in b]
+    return min(products), max(products)
+
+
+def evaluate(expression, state):
+    """
+    :param expression: a constant (3), a variable ('x') or an operation ('(x+1)*y') from the CFG
+    :param state: dic {variable: (low, high)}
+    :return: interval (low, high) of the possible values of the expression
+    """
+    if isinstance(expression, int):
+        return expression, expression
+    if expression not in _parsed_expressions:
+        try:
+            _parsed_expressions[expression] = ast.parse(str(expression).strip(), mode='eval').body
+        except SyntaxError:
+            _parsed_expressions[expression] = None
+    return _evaluate_ast(_parsed_expressions[expression], state)
+
+
+def _evaluate_ast(node, state):
+    if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool):
+        return node.value, node.value
+    elif isinstance(node, ast.Name):
+        return state.get(node.id, TOP)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _evaluate_ast(node.operand, state)
+        return (-value[1], -value[0]) if isinstance(node.op, ast.USub) else value
+    elif isinstance(node, ast.BinOp):
+        left = _evaluate_ast(node.left, state)
+        right = _evaluate_ast(node.right, state)
+        if isinstance(node.op, ast.Add):
+            return add_intervals(left, right)
+        elif isinstance(node.op, ast.Sub):
+            return subtract_intervals(left, right)
+        elif isinstance(node.op, ast.Mult):
+            return multiply_intervals(left, right)
+    # anything else can have any value
+    return TOP
+
+
+def _restrict(interval, operator, other):
+    """
+    :return: the part of interval whose values v verify (v operator w) for some w of other, or None if empty
+    """
+    low, high = interval
+    if operator == '<=':
+        high = min(high, other[1])
+    elif operator == '<':
+        high = min(high, other[1] - 1)
+    elif operator == '>=':
+        low = max(low, other[0])
+    elif operator == '>':
+        low = max(low, other[0] + 1)
+    elif operator == '==':
+        low, high = max(low, other[0]), min(high, other[1])
+    elif operator == '!=' and other[0] == other[1]:
+        # only a bound equal to the single value of other can be removed
+        if low == other[0]:
+            low += 1
+        if high == other[0]:
+            high -= 1
+    if low > high:
+        return None
+    return low, high
+
+
+def refine_comparison(state, comparison, result=True):
+    """
+    :param state: dic {variable: (low, high)}, or None
+    :param comparison: ('<=', ['x', 0])
+    :param result: the value the comparison must have
+    :return: the state restricted to the values for which the comparison has this result (None if there is none)
+    """
+    if state is None:
+        return None
+    operator, values = comparison
+    if not result:
+        operator = NEGATED_COMPARATORS[operator]
+
+    left = evaluate(values[0], state)
+    right = evaluate(values[1], state)
+    left_restricted = _restrict(left, operator, right)
+    right_restricted = _restrict(right, SWAPPED_COMPARATORS[operator], left)
+    if left_restricted is None or right_restricted is None:
+        return None
+
+    refined = state
+    for value, interval in ((values[0], left_restricted), (values[1], right_restricted)):
+        if isinstance(value, str) and value.strip().isidentifier():
+            if refined is state:
+                refined = dict(state)
+            refined[value.strip()] = interval
+    return refined
+
+
+def refine_bool_expression(state, boolean_expression, result=True):
+    """
+    :param state: dic {variable: (low, high)}, or None
+    :param boolean_expression: condition in CNF format [[('<=', ['x', 0]), ('>', ['y', 2])], [('==', ['y', 3])]]
+    :param result: the value the condition must have
+    :return: the state restricted to the values for which the condition has this result (None if there is none)
+    """
+    if result:
+        # every clause is true: at least one comparison of each clause is true
+        for clause in boolean_expression:
+            refined = None
+            for comparison in clause:
+                refined = join_states(refined, refine_comparison(state, comparison, True))
+            state = refined
+        return state
+
+    # a clause is false: every comparison of this clause is false
+    refined = None
+    for clause in boolean_expression:
+        clause_state = state
+        for comparison in clause:
+            clause_state = refine_comparison(clause_state, comparison, False)
+        refined = join_states(refined, clause_state)
+    return refined
+
+
+def join_states(state, other):
+    """
+    :return: a state containing both states (for each variable, the smallest interval containing both intervals)
+    """
+    if state is None:
+        return other
+    if other is None:
+        return state
+    return {
+        variable: (min(interval[0], other[variable][0]), max(interval[1], other[variable][1]))
+        for variable, interval in state.items() if variable in other
+    }
+
+
+def widen_states(state, new_state):
+    """
+    :return: a state containing both states, where each bound that moved since the previous state is set to infinity
+    """
+    if state is None or new_state is None:
+        return join_states(state, new_state)
+    new_state = join_states(state, new_state)
+    return {
+        variable: (interval[0] if interval[0] >= state[variable][0] else -INFINITY,
+                   interval[1] if interval[1] <= state[variable][1] else INFINITY)
+        for variable, interval in new_state.items() if variable in state
+    }
+
+
+class IntervalAnalysis(object):
+    """
+    Intervals of the variables at each node of a CFG graph
+    """
+    def __init__(self, graph):
+        self.graph = get_indexed_cfg(graph)
+        # state at the entry of each node
+        self.states = {node: None for node in self.graph}
+        self.states[0] = None
+        # state on each branch {(node, following node): state}
+        self.edges = {(node, following): None for node, following_nodes in self.graph.successors.items()
+                      for following in following_nodes}
+        self.compute()
+
+    def get_entry_state(self, node):
+        """
+        :return: join of the states of the branches leading to the node
+        """
+        state = {} if node == 1 else None
+        for predecessor in self.graph.predecessors.get(node, []):
+            state = join_states(state, self.edges[(predecessor, node)])
+        return state
+
+    def transfer(self, node, state):
+        """
+        :return: list of the states of the branches leaving the node, in the order of the following nodes
+        """
+        value = self.graph[node]
+        if state is None:
+            return [None for _ in self.graph.successors[node]]
+        if type_node(value) == 'assign':
+            new_state = dict(state)
+            for variable, expression in value[1].items():
+                new_state[variable] = evaluate(expression, state)
+            return [new_state]
+        elif is_boolean_expression_node(value):
+            return [refine_bool_expression(state, value[1], True), refine_bool_expression(state, value[1], False)]
+        return [state for _ in self.graph.successors[node]]
+
+    def update(self, node, state):
+        """
+        Set the state at the entry of the node, and the states of its branches
+        :return: list of following nodes whose branch changed
+        """
+        self.states[node] = state
+        changed = []
+        for following, edge_state in zip(self.graph.successors[node], self.transfer(node, state)):
+            if edge_state != self.edges[(node, following)]:
+                self.edges[(node, following)] = edge_state
+                changed.append(following)
+        return changed
+
+    def compute(self):
+        graph = self.graph
+        while_nodes = set(graph.nodes_by_type['while'])
+        visits = {node: 0 for node in graph}
+        # nodes are taken in the order of the graph: a node is processed after the nodes before it
+        worklist = sorted(graph)
+        in_worklist = set(worklist)
+        while worklist:
+            node = heapq.heappop(worklist)
+            in_worklist.discard(node)
+            state = self.get_entry_state(node)
+            visits[node] += 1
+            if (node in while_nodes and visits[node] > WIDENING_DELAY) or visits[node] > LIMIT_VISITS:
+                state = widen_states(self.states[node], state)
+            for following in self.update(node, state):
+                if following != 0 and following not in in_worklist:
+                    heapq.heappush(worklist, following)
+                    in_worklist.add(following)
+
+        for _ in range(NARROWING_PASSES):
+            for node in sorted(graph):
+                self.update(node, self.get_entry_state(node))
+        self.states[0] = self.get_entry_state(0)
+
+    def is_reachable_node(self, node):
+        """
+        :return: False if no test can reach the node
+        """
+        return self.states.get(node) is not None
+
+    def is_feasible_edge(self, node, following):
+        """
+        :return: False if no test can go from the node to the following node
+        """
+        return self.edges.get((node, following)) is not None
+
+    def get_unreachable_nodes(self):
+        """
+        :return: list of nodes no test can reach
+        """
+        return [node for node in self.graph if self.states[node] is None]
+
+    def get_infeasible_decisions(self):
+        """
+        :return: list of couples (decision node, following node) no test can take
+        """
+        return [(node, following) for node in self.graph.decision_nodes
+                for following in self.graph.successors[node] if self.edges[(node, following)] is None]
+
+    def is_feasible_path(self, path):
+        """
+        The states are computed again along the path only (without joining other branches)
+        :param path: a path of the graph [1, 3, 4, 5] (starting at node 1)
+        :return: False if no test can take the whole path
+        """
+        state = {}
+        for index, node in enumerate(path[:-1]):
+            following = path[index + 1]
+            if node == 0 or following not in self.graph.successors[node]:
+                return False
+            state = self.transfer(node, state)[self.graph.successors[node].index(following)]
+            if state is None:
+                return False
+        return True
+
+    def get_interval(self, node, variable):
+        """
+        :return: interval (low, high) of the variable at the entry of the node, None if the node is unreachable
+        """
+        state = self.states.get(node)
+        if state is None:
+            return None
+        return state.get(variable, TOP)
+
+
+def get_interval_analysis(graph):
+    """
+    :param graph: a CFG graph
+    :return: the IntervalAnalysis of the graph; for an IndexedCfg, it is computed once and kept with the indexes
+    """
+    graph = get_indexed_cfg(graph)
+    if getattr(graph, 'intervals', None) is None:
+        graph.intervals = IntervalAnalysis(graph)
+    return graph.intervals
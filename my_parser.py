@@ -1,88 +1,453 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+Parser of the While language: turns a program (see sources_txt) into an AST tree (see ast_tree).
 
-booleans = ["true", "false"]
+#### Syntax:
+
+    program    := statements
+    statements := statement ((';')* statement)*
+    statement  := variable ':=' expression
+                | 'if' condition 'then' body 'else' body
+                | 'while' condition ['do'] body             (body between braces or parentheses)
+                | 'while' condition ['do'] statements 'end'
+    body       := '{' statements '}' | '(' statements ')' | statement
+
+    condition  := conjunction ('or' conjunction)*
+    conjunction:= negation ('and' negation)*
+    negation   := 'not' negation | comparison
+    comparison := expression comparator expression | 'true' | 'false' | '(' condition ')'
+    expression := term (('+' | '-') term)*
+    term       := factor ('*' factor)*
+    factor     := '-' factor | number | variable | '(' expression ')'
+
+Statements can be separated by ';' or by new lines. Comparison '=' is the same as '=='.
+Variables and keywords are not case sensitive (X and x are the same variable).
+Conditions are put in CNF form, as expected by the AST to CFG converter.
+
+Tokens are read in a single pass, and the parser never goes back: parsing is linear in the size of the program.
+Statements are read with an explicit stack (see Parser.parse_statements), so that programs nested deeply are parsed
+without recursion, and the operands of a chain of 'and' (or of 'or') are kept in a single logic node.
+"""
+
+import re
+
+from ast_tree import Node
+
+booleans = ['true', 'false']
 operators = ['+', '-', '*']
-comparators = ['==', '<=', '<', '>', '>=', '!=']
-keywords = ['if', 'then', 'else', 'while', ':=']
+comparators = ['==', '<=', '<', '>', '>=', '!=', '=', '<>']
+keywords = ['if', 'then', 'else', 'while', 'do', 'end', 'and', 'or', 'not', ':=']
 separators = ['(', ')', '{', '}', ';']
 numbers = [x for x in range(10)]
 
+TOKEN_PATTERN = re.compile(r'\s*(?:(\d+)|([A-Za-z_]\w*)|(:=|==|<=|>=|!=|<>|[-+*<>=(){};]))')
 
-def is_on():
-    # set to True when operational
-    return False
+# negation of each comparator (used to remove 'not' from conditions)
+NEGATED_COMPARATORS = {'==': '!=', '!=': '==', '<=': '>', '>': '<=', '<': '>=', '>=': '<'}
 
 
 def tokenize(program_lines_as_list):
+    """
+    :param program_lines_as_list: lines of the program
+    :return: list of tokens, each token being [type, word, number of the line]
+    """
     result = []
-    for line in program_lines_as_list:
-        result = result + tokenize_line(line)
+    for number_line, line in enumerate(program_lines_as_list, 1):
+        result.extend(tokenize_line(line, number_line))
     return result
 
 
-def tokenize_line(program_line):
+def tokenize_line(program_line, number_line=1):
+    """
+    :param program_line: a line of the program 'X := X + 1'
+    :param number_line: number of the line, used in error messages
+    :return: list of tokens [['identifier', 'x', 1], ['keyword', ':=', 1], ...]
+    """
     result = []
-    list_words = program_line.split(" ")
-    for word in list_words:
+    position = 0
+    end = len(program_line.rstrip())
+    while position < end:
+        match = TOKEN_PATTERN.match(program_line, position)
+        if match is None:
+            raise SyntaxError("line " + str(number_line) + ": unexpected character '" +
+                              program_line[position:].strip()[0] + "'")
+        position = match.end()
+
+        number, name, symbol = match.groups()
+        if number is not None:
+            result.append(['numeric', number, number_line])
+            continue
+
+        word = name.lower() if name is not None else symbol
         if word in booleans:
-            result.append(['boolean', word])
+            result.append(['boolean', word, number_line])
         elif word in operators:
-            result.append(['operator', word])
+            result.append(['operator', word, number_line])
         elif word in comparators:
-            result.append(['comparator', word])
+            result.append(['comparator', word, number_line])
         elif word in keywords:
-            result.append(['keyword', word])
-        elif word.isnumeric():
-            result.append(['numeric', word])
+            result.append(['keyword', word, number_line])
         elif word in separators:
-            result.append(['separator', word])
+            result.append(['separator', word, number_line])
         else:
-            result.append(['identifier', word])
+            result.append(['identifier', word, number_line])
     return result
 
 
-def build_blocks(tokens):
-    blocks = []
+class Parser(object):
+    """
+    Parser reading the list of tokens from left to right: statements with an explicit stack, conditions and
+    expressions by recursive descent (the depth of recursion is the depth of the parentheses)
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def current(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return ['end_of_file', '', self.tokens[-1][2] if self.tokens else 1]
+
+    def is_word(self, *words):
+        token = self.current()
+        return token[0] != 'numeric' and token[0] != 'identifier' and token[1] in words
+
+    def error(self, expected):
+        token = self.current()
+        found = "end of file" if token[0] == 'end_of_file' else "'" + token[1] + "'"
+        return SyntaxError("line " + str(token[2]) + ": expected " + expected + ", found " + found)
+
+    def take(self, word):
+        if not self.is_word(word):
+            raise self.error("'" + word + "'")
+        self.position += 1
+
+    def parse_program(self):
+        program = self.parse_statements()
+        if self.position < len(self.tokens):
+            raise self.error("a statement")
+        return program
+
+    def parse_statements(self):
+        """
+        Statements are read with a stack of frames [kind, node, closing word]: a 'sequence' of statements read up to
+        its closing word, a 'body' to read (a statement, or statements between braces or parentheses), or an 'if'
+        or a 'while' waiting for its bodies. Each node read is given to the frame below it.
+        :return: a sequence node (nested sequences are flattened)
+        """
+        stack = [['sequence', Node("sequence"), None]]
+        while True:
+            kind, node, closing = stack[-1]
+            if kind == 'body':
+                stack.pop()
+                result = self.parse_statement(stack)
+            else:
+                while self.is_word(';'):
+                    self.position += 1
+                if not (self.position == len(self.tokens) or self.is_word('}', ')', 'end', 'else')):
+                    stack.append(['body', None, None])
+                    continue
+                if len(node.children) == 0:
+                    raise self.error("a statement")
+                stack.pop()
+                if not stack:
+                    return node
+                self.take(closing)
+                # a body of a single statement is the statement
+                result = node.children[0] if len(node.children) == 1 else node
+
+            # the node read completes the frames below it
+            while result is not None:
+                kind, node, closing = stack[-1]
+                if kind == 'sequence':
+                    if result.category == "sequence":
+                        node.add_children(result.children)
+                    else:
+                        node.add_child(result)
+                    result = None
+                elif kind == 'if' and len(node.children) == 1:
+                    # the 'then' body: the 'else' body follows
+                    node.add_child(result)
+                    self.take('else')
+                    stack.append(['body', None, None])
+                    result = None
+                else:
+                    node.add_child(result)
+                    stack.pop()
+                    result = node
+
+    def parse_statement(self, stack):
+        """
+        Read a statement, up to its first body
+        :param stack: frames of parse_statements, where the frames of an 'if', a 'while' or a sequence are added
+        :return: the node of the statement if it is complete (an assignment), or else None
+        """
+        token = self.current()
+        if self.is_word('if'):
+            self.position += 1
+            if_node = Node("if")
+            if_node.add_child(self.parse_condition())
+            self.take('then')
+            stack.append(['if', if_node, None])
+            stack.append(['body', None, None])
+        elif self.is_word('while'):
+            self.position += 1
+            while_node = Node("while")
+            while_node.add_child(self.parse_condition())
+            if self.is_word('do'):
+                self.position += 1
+            stack.append(['while', while_node, None])
+            if self.is_word('{', '('):
+                stack.append(['body', None, None])
+            else:
+                stack.append(['sequence', Node("sequence"), 'end'])
+        elif self.is_word('{', '('):
+            closing = '}' if self.is_word('{') else ')'
+            self.position += 1
+            stack.append(['sequence', Node("sequence"), closing])
+        elif token[0] == 'identifier':
+            self.position += 1
+            self.take(':=')
+            assign = Node("assign")
+            assign.add_child(Node("variable", token[1]))
+            assign.add_child(self.parse_expression())
+            return assign
+        else:
+            raise self.error("a statement")
+        return None
+
+    def parse_condition(self):
+        """
+        :return: the condition in CNF form: a compare node, or a logic node
+        """
+        return cnf_to_node(to_cnf(self.parse_disjunction()))
+
+    def parse_disjunction(self):
+        return self.parse_rest_of_disjunction(self.parse_conjunction())
+
+    def parse_rest_of_disjunction(self, first):
+        """
+        :return: first, or a single 'or' node of first and the conjunctions following it
+        """
+        members = [first]
+        while self.is_word('or'):
+            self.position += 1
+            members.append(self.parse_conjunction())
+        return members[0] if len(members) == 1 else logic_node('or', members)
+
+    def parse_conjunction(self):
+        return self.parse_rest_of_conjunction(self.parse_negation())
 
-    while len(tokens) != 0:
-        blocks.append(process_list(tokens))
+    def parse_rest_of_conjunction(self, first):
+        """
+        :return: first, or a single 'and' node of first and the negations following it
+        """
+        members = [first]
+        while self.is_word('and'):
+            self.position += 1
+            members.append(self.parse_negation())
+        return members[0] if len(members) == 1 else logic_node('and', members)
 
-    return blocks
+    def parse_negation(self):
+        if self.is_word('not'):
+            self.position += 1
+            return logic_node('not', [self.parse_negation()])
+        return self.parse_comparison()
 
+    def parse_comparison(self):
+        if self.is_word('true', 'false'):
+            value = self.current()[1] == 'true'
+            self.position += 1
+            return compare_node('==' if value else '!=', Node("constant", 0), Node("constant", 0))
 
-def process_list(tokens):
-    new_block = []
+        left = self.parse_expression(True)
+        if left.category == "compare" or left.category == "logic":
+            # condition between parentheses
+            return left
+        return compare_node(self.parse_comparator(), left, self.parse_expression())
 
-    if tokens[0][1] == 'while':
-        target = tokens.index(['separator', '}'])
-        new_block.extend(tokens[0:target])
-        tokens[:] = tokens[target + 1:]
-    elif tokens[0][1] == 'if':
-        # behaviour depends on if there's an else part
-        target_one = tokens.index(['separator', '}'])
-        new_block.extend(tokens[0:target_one])
-        tokens[:] = tokens[target_one + 1:]
-        if tokens[0] == ['keyword', 'else']:
-            target_two = tokens.index(['separator', '}'])
-            new_block.extend(tokens[0:target_two])
-            tokens[:] = tokens[target_two + 1:]
+    def parse_comparator(self):
+        if self.current()[0] != 'comparator':
+            raise self.error("a comparator")
+        operator = self.current()[1]
+        self.position += 1
+        if operator == '=':
+            return '=='
+        elif operator == '<>':
+            return '!='
+        return operator
 
-    return new_block
+    def parse_expression(self, in_condition=False):
+        """
+        :param in_condition: if true, the expression can be a condition between parentheses
+        """
+        node = self.parse_term(in_condition)
+        if node.category == "compare" or node.category == "logic":
+            return node
+        while self.is_word('+', '-'):
+            operator = self.current()[1]
+            self.position += 1
+            node = operation_node(operator, node, self.parse_term())
+        return node
+
+    def parse_term(self, in_condition=False):
+        node = self.parse_factor(in_condition)
+        if node.category == "compare" or node.category == "logic":
+            return node
+        while self.is_word('*'):
+            self.position += 1
+            node = operation_node('*', node, self.parse_factor())
+        return node
+
+    def parse_factor(self, in_condition=False):
+        token = self.current()
+        if token[0] == 'numeric':
+            self.position += 1
+            return Node("constant", int(token[1]))
+        elif token[0] == 'identifier':
+            self.position += 1
+            return Node("variable", token[1])
+        elif self.is_word('-'):
+            self.position += 1
+            factor = self.parse_factor()
+            if factor.category == "constant":
+                return Node("constant", -factor.data)
+            return operation_node('-', Node("constant", 0), factor)
+        elif self.is_word('('):
+            self.position += 1
+            if in_condition:
+                node = self.parse_disjunction_or_expression()
+            else:
+                node = self.parse_expression()
+            self.take(')')
+            return node
+        raise self.error("an expression")
+
+    def parse_disjunction_or_expression(self):
+        """
+        Inside parentheses at the beginning of a condition, we can find either a condition '(x < 1 or y > 2)',
+        or an expression '(x + 1) * 2 < y'.
+        The expression is read first, and it is a condition if it is followed by a comparator or a logic keyword.
+        A condition starting with 'not', 'true' or 'false' can not be an expression: it is read as a condition.
+        """
+        if self.is_word('not', 'true', 'false'):
+            return self.parse_rest_of_condition(self.parse_negation())
+        node = self.parse_expression(True)
+        if node.category != "compare" and node.category != "logic":
+            if self.current()[0] != 'comparator':
+                return node
+            node = compare_node(self.parse_comparator(), node, self.parse_expression())
+        # the rest of the condition between parentheses follows the usual priorities ('and' before 'or')
+        return self.parse_rest_of_condition(node)
+
+    def parse_rest_of_condition(self, first):
+        return self.parse_rest_of_disjunction(self.parse_rest_of_conjunction(first))
+
+
+def operation_node(operator, left, right):
+    if left.category not in ("constant", "variable", "operation") or \
+            right.category not in ("constant", "variable", "operation"):
+        raise SyntaxError("a condition can not be used in an operation")
+    node = Node("operation", operator)
+    node.add_children([left, right])
+    return node
+
+
+def compare_node(operator, left, right):
+    node = Node("compare", operator)
+    node.add_children([left, right])
+    return node
+
+
+def logic_node(operator, children):
+    node = Node("logic", operator)
+    node.add_children(children)
+    return node
+
+
+def to_cnf(node):
+    """
+    :param node: a compare node or a logic node ('and', 'or', 'not')
+    :return: list of clauses (and), each clause being a list of compare nodes (or)
+    """
+    if node.category == "compare":
+        return [[node]]
+    if node.category != "logic":
+        raise SyntaxError("expected a condition, found an expression")
+
+    if node.data == 'not':
+        return to_cnf(negate(node.children[0]))
+    elif node.data == 'and':
+        clauses = []
+        for child in node.children:
+            clauses.extend(to_cnf(child))
+        return clauses
+    else:
+        # distribution of or over and
+        clauses = [[]]
+        for child in node.children:
+            child_clauses = to_cnf(child)
+            if len(clauses) == 1 and len(child_clauses) == 1:
+                # a chain of 'or' stays a single clause, extended in place
+                clauses[0].extend(child_clauses[0])
+            else:
+                clauses = [left + right for left in clauses for right in child_clauses]
+        return clauses
+
+
+def negate(node):
+    """
+    :return: the negation of a condition, without 'not' at the top (De Morgan laws)
+    """
+    if node.category == "compare":
+        return compare_node(NEGATED_COMPARATORS[node.data], node.children[0], node.children[1])
+    elif node.data == 'not':
+        return node.children[0]
+    elif node.data == 'and':
+        return logic_node('or', [logic_node('not', [child]) for child in node.children])
+    else:
+        return logic_node('and', [logic_node('not', [child]) for child in node.children])
+
+
+def cnf_to_node(clauses):
+    """
+    :param clauses: list of clauses, each clause being a list of compare nodes
+    :return: a compare node, a 'or' node, or a 'and' node whose children are compare or 'or' nodes
+    """
+    children = []
+    for clause in clauses:
+        if len(clause) == 1:
+            children.append(clause[0])
+        else:
+            children.append(logic_node('or', clause))
+    if len(children) == 1:
+        return children[0]
+    return logic_node('and', children)
+
+
+def parse_text(program_text):
+    """
+    :param program_text: source code of a program
+    :return: AST tree (a sequence node)
+    """
+    tokens = tokenize(program_text.splitlines())
+    return Parser(tokens).parse_program()
 
 
 def parse(path_program):
     """
-    :param path_program:
+    :param path_program: path of the file of the program
     :return: AST tree
     """
-    # TODO
-    pass
+    with open(path_program) as file:
+        return parse_text(file.read())
 
 
 def main():
-    with open("./sources_txt/prog_3.txt") as file:
-        program = file.read().splitlines()
+    tree = parse("./sources_txt/prog_1.txt")
+    tree.print_me()
 
-    tokens = tokenize(program)
 
+if __name__ == '__main__':
+    main()
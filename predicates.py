@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Structured form of the path predicates: the predicate of a path is built directly from the nodes of the CFG,
+without writing it as a string, and given as is to the solver (see integer_solver).
+
+Expressions are tuples:
+    ('const', 3)
+    ('var', ('x', 1))
+    ('+' | '-' | '*', left expression, right expression)
+Constraints are tuples too, without 'not' (a negation is pushed down to the comparisons):
+    ('cmp', '<=', left expression, right expression)
+    ('and', [constraints])
+    ('or', [constraints])
+
+A variable of a predicate is a couple (name, version): version 0 is the value given to the program, and version k
+the value after the k-th assignment of the variable along the path. For the path [1, 2, 4, 5] of
+    1: ['if', [[('<=', ["x", 0])]], [2, 3]]
+    2: ['assign', {'x': '0-x'}, [4]]
+    4: ['if', [[('==', ["x", 1])]], [5, 6]]
+the predicate is
+    x0 <= 0,  x1 == 0 - x0,  x1 == 1
+
+Before solving, the equalities defining a variable (x1 == 0 - x0) are eliminated: the definition is substituted
+in the other constraints, so that only the values given to the program stay free
+    x0 <= 0,  0 - x0 == 1
+and the values of the eliminated variables are computed back from a solution (see eliminate_equalities).
+"""
+
+from integer_solver import NEGATED_COMPARATORS, parse_expression, get_variables
+from process_cfg_tools import get_indexed_cfg, type_node, is_boolean_expression_node
+
+# constraints always true and always false
+TRUE = ('and', [])
+FALSE = ('or', [])
+# an expression with more nodes is not substituted (its variable stays in the constraints)
+LIMIT_SUBSTITUTION = 100
+
+# expressions of the CFG already parsed {expression: tree, variables being names}
+_parsed_expressions = {}
+
+
+def get_expression(value):
+    """
+    :param value: a value of the CFG: a constant (3), a variable ('x') or an operation ('x+1')
+    :return: the expression tree, variables being names ('var', 'x')
+    """
+    if isinstance(value, int):
+        return 'const', value
+    if value not in _parsed_expressions:
+        _parsed_expressions[value] = parse_expression(value)
+    return _parsed_expressions[value]
+
+
+def rename(expression, versions, inputs=None):
+    """
+    :param expression: an expression tree, variables being names
+    :param versions: dic {name: current version} (a name which is not in the dic is at version 0)
+    :param inputs: if given, list to which names read at version 0 are added
+    :return: the expression, variables being couples (name, version)
+    """
+    kind = expression[0]
+    if kind == 'const':
+        return expression
+    elif kind == 'var':
+        name = expression[1]
+        version = versions.get(name, 0)
+        if version == 0 and inputs is not None and name not in inputs:
+            inputs.append(name)
+        return 'var', (name, version)
+    return kind, rename(expression[1], versions, inputs), rename(expression[2], versions, inputs)
+
+
+def get_comparison(condition, versions, inputs=None):
+    """
+    :param condition: a condition of the CFG ('<=', ['x', 0])
+    :return: the comparison ('cmp', '<=', ('var', ('x', version)), ('const', 0))
+    """
+    operator, values = condition
+    return ('cmp', operator, rename(get_expression(values[0]), versions, inputs),
+            rename(get_expression(values[1]), versions, inputs))
+
+
+def get_condition(boolean_expression, versions, result=True, inputs=None):
+    """
+    :param boolean_expression: condition of a 'if' or 'while' node in CNF format
+    :param result: value the condition must have
+    :return: a constraint
+    """
+    constraint = ('and', [('or', [get_comparison(condition, versions, inputs) for condition in clause])
+                          for clause in boolean_expression])
+    return constraint if result else negate(constraint)
+
+
+def negate(constraint):
+    """
+    :return: the negation of a constraint (De Morgan laws, comparators are inverted)
+    """
+    kind = constraint[0]
+    if kind == 'cmp':
+        return 'cmp', NEGATED_COMPARATORS[constraint[1]], constraint[2], constraint[3]
+    return 'or' if kind == 'and' else 'and', [negate(member) for member in constraint[1]]
+
+
+def evaluate(expression, values):
+    """
+    :param expression: an expression tree
+    :param values: dic {variable: value}
+    :return: int, value of the expression
+    """
+    kind = expression[0]
+    if kind == 'const':
+        return expression[1]
+    elif kind == 'var':
+        return values[expression[1]]
+    left = evaluate(expression[1], values)
+    right = evaluate(expression[2], values)
+    if kind == '+':
+        return left + right
+    elif kind == '-':
+        return left - right
+    return left * right
+
+
+def is_satisfied(constraint, values):
+    """
+    :param constraint: a constraint
+    :param values: dic {variable: value}
+    :return: True if the constraint is true for these values
+    """
+    kind = constraint[0]
+    if kind == 'and':
+        return all(is_satisfied(member, values) for member in constraint[1])
+    elif kind == 'or':
+        return any(is_satisfied(member, values) for member in constraint[1])
+    left = evaluate(constraint[2], values)
+    right = evaluate(constraint[3], values)
+    operator = constraint[1]
+    if operator == '==':
+        return left == right
+    elif operator == '!=':
+        return left != right
+    elif operator == '<=':
+        return left <= right
+    elif operator == '<':
+        return left < right
+    elif operator == '>=':
+        return left >= right
+    return left > right
+
+
+def get_size(expression):
+    """
+    :return: number of nodes of an expression tree
+    """
+    if expression[0] in ('const', 'var'):
+        return 1
+    return 1 + get_size(expression[1]) + get_size(expression[2])
+
+
+def substitute(expression, definitions):
+    """
+    :param expression: an expression tree
+    :param definitions: dic {variable: expression}
+    :return: the expression where the variables of definitions are replaced, constant operations being computed
+    """
+    kind = expression[0]
+    if kind == 'const':
+        return expression
+    elif kind == 'var':
+        return definitions.get(expression[1], expression)
+    left = substitute(expression[1], definitions)
+    right = substitute(expression[2], definitions)
+    if left[0] == 'const' and right[0] == 'const':
+        return 'const', evaluate((kind, left, right), {})
+    if left is expression[1] and right is expression[2]:
+        return expression
+    return kind, left, right
+
+
+def simplify(constraint, definitions):
+    """
+    :param constraint: a constraint
+    :param definitions: dic {variable: expression} to substitute
+    :return: the constraint after substitution, comparisons between constants being replaced by TRUE or FALSE
+    """
+    kind = constraint[0]
+    if kind == 'cmp':
+        left = substitute(constraint[2], definitions)
+        right = substitute(constraint[3], definitions)
+        if left[0] == 'const' and right[0] == 'const':
+            return TRUE if is_satisfied(('cmp', constraint[1], left, right), {}) else FALSE
+        return 'cmp', constraint[1], left, right
+
+    # TRUE is neutral for 'and' and absorbing for 'or' (FALSE the other way around)
+    neutral, absorbing = (TRUE, FALSE) if kind == 'and' else (FALSE, TRUE)
+    members = []
+    for member in constraint[1]:
+        member = simplify(member, definitions)
+        if member == absorbing:
+            return absorbing
+        if member[0] == kind:
+            members.extend(member[1])
+        elif member != neutral:
+            members.append(member)
+    if len(members) == 1:
+        return members[0]
+    return kind, members
+
+
+def get_definition(constraint, limit_size=LIMIT_SUBSTITUTION):
+    """
+    :param constraint: a constraint
+    :return: couple (variable, expression) if the constraint is (variable == expression), and the expression
+    does not use the variable, None otherwise
+    """
+    if constraint[0] != 'cmp' or constraint[1] != '==':
+        return None
+    for variable, expression in ((constraint[2], constraint[3]), (constraint[3], constraint[2])):
+        if variable[0] == 'var' and variable[1] not in get_variables(expression) \
+                and get_size(expression) <= limit_size:
+            return variable[1], expression
+    return None
+
+
+def eliminate_equalities(constraints, limit_size=LIMIT_SUBSTITUTION):
+    """
+    Remove the variables defined by an equality (x1 == 0 - x0) from a list of constraints, by substitution
+    :param constraints: list of constraints
+    :param limit_size: expressions with more nodes are not substituted
+    :return: couple (constraints left, dic {variable eliminated: expression}), expressions only using the
+    variables left; the constraints left are [FALSE] when they can not be satisfied
+    """
+    definitions = {}
+    remaining = []
+    for constraint in constraints:
+        constraint = simplify(constraint, definitions)
+        if constraint == FALSE:
+            return [FALSE], definitions
+        members = constraint[1] if constraint[0] == 'and' else [constraint]
+        for member in members:
+            # a member may use a variable defined by a previous member
+            member = simplify(member, definitions)
+            if member == FALSE:
+                return [FALSE], definitions
+            definition = get_definition(member, limit_size)
+            if definition is None:
+                remaining.append(member)
+                continue
+            variable, expression = definition
+            for defined in definitions:
+                definitions[defined] = substitute(definitions[defined], {variable: expression})
+            definitions[variable] = expression
+
+    result = []
+    for constraint in remaining:
+        constraint = simplify(constraint, definitions)
+        if constraint == FALSE:
+            return [FALSE], definitions
+        if constraint != TRUE:
+            result.append(constraint)
+    return result, definitions
+
+
+def complete(solution, definitions):
+    """
+    Add to a solution of the constraints left by eliminate_equalities the values of the variables eliminated
+    :param solution: dic {variable: value}
+    :param definitions: dic {variable: expression}, as given by eliminate_equalities
+    :return: the solution
+    """
+    for variable, expression in definitions.items():
+        solution[variable] = evaluate(expression, solution)
+    return solution
+
+
+def freeze(constraint):
+    """
+    :return: the constraint where lists are replaced by tuples, which can be used as a key of a dic
+    """
+    if constraint[0] in ('and', 'or'):
+        return constraint[0], tuple(freeze(member) for member in constraint[1])
+    return constraint
+
+
+def canonicalize(constraints, variables):
+    """
+    Canonical form of a list of constraints: the same constraints, whatever their order and the names of their
+    variables, have the same canonical form (variables are renamed ('v', 0), ('v', 1)... in order of variables)
+    :param constraints: list of constraints
+    :param variables: list of the variables of the constraints
+    :return: couple (canonical form, which can be a key of a dic; dic {variable: new name})
+    """
+    names = {variable: ('v', index) for index, variable in enumerate(variables)}
+    renamed = [freeze(simplify(constraint, {variable: ('var', name) for variable, name in names.items()}))
+               for constraint in constraints]
+    return (tuple(sorted(renamed, key=repr)), len(names)), names
+
+
+def split_independent(constraints, variables):
+    """
+    Split constraints into groups sharing no variable: each group can be solved on its own
+    :param constraints: list of constraints (a conjunction can be split between groups)
+    :param variables: list of the variables of the constraints (a variable of no constraint is a group alone)
+    :return: list of couples (constraints of the group, variables of the group), in the order of the variables
+    (constraints without any variable are a last group, without variables)
+    """
+    # union-find: each variable points to a variable of its group, the root representing the group
+    parents = {variable: variable for variable in variables}
+
+    def find(variable):
+        while parents[variable] != variable:
+            parents[variable] = parents[parents[variable]]
+            variable = parents[variable]
+        return variable
+
+    # the members of a conjunction are split too
+    members = []
+    for constraint in constraints:
+        members.extend(constraint[1] if constraint[0] == 'and' else [constraint])
+    constraints = members
+
+    constant_constraints = []
+    for constraint in constraints:
+        variables_constraint = get_variables(constraint)
+        if not variables_constraint:
+            constant_constraints.append(constraint)
+            continue
+        for variable in variables_constraint:
+            parents.setdefault(variable, variable)
+        root = find(variables_constraint[0])
+        for variable in variables_constraint[1:]:
+            parents[find(variable)] = root
+
+    groups = {}
+    for variable in parents:
+        groups.setdefault(find(variable), ([], []))[1].append(variable)
+    for constraint in constraints:
+        variables_constraint = get_variables(constraint)
+        if variables_constraint:
+            groups[find(variables_constraint[0])][0].append(constraint)
+    result = list(groups.values())
+    if constant_constraints:
+        result.append((constant_constraints, []))
+    return result
+
+
+class PathPredicate(object):
+    """
+    The constraints the values given to a program must verify for the program to take a path
+    """
+    def __init__(self, graph, path):
+        """
+        :param graph: a CFG graph
+        :param path: the steps of the path, in the order of execution [1, 2, 4, 5]
+        (what the last step does is not taken into account: the path only has to reach it)
+        """
+        self.graph = get_indexed_cfg(graph)
+        self.path = list(path[:1])
+        self.constraints = []
+        # current version of each variable at the end of the path
+        self.versions = {}
+        # names of the variables read before being assigned, in order of appearance: the values to find
+        self.inputs = []
+        # {(name, version): expression assigned}, in the order of the path
+        self.definitions = {}
+        # for each step added by push, what pop has to undo:
+        # (number of constraints before, number of inputs before, names of the variables assigned)
+        self.frames = []
+
+        for following in path[1:]:
+            self.push(following)
+
+    def push(self, following):
+        """
+        Add a step at the end of the path: the constraints of the last step (to go to the following step) are added
+        :param following: a following step of the last step of the path
+        """
+        graph = self.graph
+        step = self.path[-1]
+        if step == 0 or following not in graph.successors[step]:
+            raise ValueError("Step " + str(following) + " can not follow step " + str(step))
+        frame = (len(self.constraints), len(self.inputs), [])
+        value = graph[step]
+        if type_node(value) == 'assign':
+            # assignments of a node are done one after the other (see cfg_compiler)
+            for name, expression in value[1].items():
+                renamed = rename(get_expression(expression), self.versions, self.inputs)
+                self.versions[name] = self.versions.get(name, 0) + 1
+                self.definitions[(name, self.versions[name])] = renamed
+                self.constraints.append(('cmp', '==', ('var', (name, self.versions[name])), renamed))
+                frame[2].append(name)
+        elif is_boolean_expression_node(value):
+            true_step, false_step = graph.successors[step]
+            # when both branches lead to the same step, the condition does not matter
+            if true_step != false_step:
+                self.constraints.append(get_condition(value[1], self.versions, following == true_step,
+                                                      self.inputs))
+        self.frames.append(frame)
+        self.path.append(following)
+
+    def pop(self):
+        """
+        Remove the last step of the path, and the constraints added with it
+        """
+        constraints_size, inputs_size, assigned = self.frames.pop()
+        for name in reversed(assigned):
+            del self.definitions[(name, self.versions[name])]
+            self.versions[name] -= 1
+            if self.versions[name] == 0:
+                del self.versions[name]
+        del self.constraints[constraints_size:]
+        del self.inputs[inputs_size:]
+        self.path.pop()
+
+    def get_variables(self):
+        """
+        :return: list of the variables (name, version) of the constraints, inputs first
+        """
+        variables = [(name, 0) for name in self.inputs]
+        for constraint in self.constraints:
+            get_variables(constraint, variables)
+        return variables
+
+    def is_satisfied(self, values):
+        """
+        :param values: dic {name: value} of the inputs
+        :return: True if the program given these values takes the path (as far as the predicate knows)
+        """
+        variables = {(name, 0): value for name, value in values.items()}
+        for variable, expression in self.definitions.items():
+            variables[variable] = evaluate(expression, variables)
+        return all(is_satisfied(constraint, variables) for constraint in self.constraints)
+
+    def get_inputs(self, solution):
+        """
+        :param solution: dic {(name, version): value}, a solution of the constraints
+        :return: dic {name: value} of the values to give to the program
+        """
+        return {name: solution[(name, 0)] for name in self.inputs}
@@ -5,11 +5,184 @@ This module provides tools and functions in order to process a set of values on
 We expect a CFG graph for program processed and a dictionary of value for every variable of the program
 """
 
-import random
+import hashlib
+import json
 
 LIMIT_FOR_INFINITE_LOOP = 100
 
 
+class IndexedCfg(dict):
+    """
+    A CFG graph (same dict format, it can be used anywhere a graph is expected) with indexes built once:
+        - successors: {node: list of following nodes}
+        - predecessors: {node: list of nodes preceding it} (node 0 included)
+        - nodes_by_type: {'assign'|'if'|'while'|'skip': list of nodes}
+        - decision_nodes: list of 'if' and 'while' nodes
+        - variables: list of variables, as returned by get_all_var
+        - definitions: {variable: list of nodes assigning it}
+        - utilizations: {variable: list of nodes referencing it} (see is_ref)
+    Lists of nodes are in the order of the graph.
+    The reachability between nodes is computed the first time it is needed (see get_reachable), and so are
+    the def-use chains (see dataflow.get_def_use), the intervals of the variables
+    (see interval_analysis.get_interval_analysis) and the feasible paths to the nodes
+    (see symbolic_exec_tools.get_path_search).
+    The graph must not be modified once indexed.
+    """
+    def __init__(self, graph):
+        super(IndexedCfg, self).__init__(graph)
+        self.successors = {}
+        self.predecessors = {}
+        self.nodes_by_type = {'assign': [], 'if': [], 'while': [], 'skip': []}
+        self.decision_nodes = []
+        self.variables = []
+        self.definitions = {}
+        self.utilizations = {}
+        # reachability, as bitsets: bit i of reachable[node] is set if sorted_nodes[i] can be reached from node
+        self.sorted_nodes = None
+        self.bit_index = None
+        self.reachable = None
+        # reaching definitions and def-use chains (see dataflow.get_def_use)
+        self.dataflow = None
+        # intervals of the variables at each node (see interval_analysis.get_interval_analysis)
+        self.intervals = None
+        # feasible paths found to the nodes (see symbolic_exec_tools.get_path_search)
+        self.path_search = None
+
+        for node, value in self.items():
+            following_nodes = value[-1]
+            self.successors[node] = following_nodes
+            for following in following_nodes:
+                predecessors = self.predecessors.setdefault(following, [])
+                if not predecessors or predecessors[-1] != node:
+                    predecessors.append(node)
+
+            self.nodes_by_type.setdefault(type_node(value), []).append(node)
+            if is_boolean_expression_node(value):
+                self.decision_nodes.append(node)
+                variables_used = get_var_from_bool_expr(value[1])
+                self.variables.extend(variables_used)
+                for variable in dict.fromkeys(variables_used):
+                    self.utilizations.setdefault(variable, []).append(node)
+            elif type_node(value) == 'assign':
+                self.variables.extend(value[1].keys())
+                for variable in value[1]:
+                    self.definitions.setdefault(variable, []).append(node)
+                for used in dict.fromkeys(value[1].values()):
+                    self.utilizations.setdefault(used, []).append(node)
+
+    def get_reachable(self, node):
+        """
+        :param node: a node of the graph (or 0)
+        :return: int, bitset of the nodes reachable from node by at least one step (see sorted_nodes)
+        """
+        if self.reachable is None:
+            self.compute_reachability()
+        return self.reachable[node]
+
+    def is_reachable(self, start, target):
+        """
+        :return: True if target can be reached from start by at least one step
+        """
+        if self.reachable is None:
+            self.compute_reachability()
+        return target in self.bit_index and self.reachable[start] >> self.bit_index[target] & 1 == 1
+
+    def get_reachable_nodes(self, node):
+        """
+        :param node: a node of the graph (or 0)
+        :return: list of nodes reachable from node by at least one step, in increasing order
+        """
+        bits = self.get_reachable(node)
+        nodes = []
+        while bits:
+            lowest_bit = bits & -bits
+            nodes.append(self.sorted_nodes[lowest_bit.bit_length() - 1])
+            bits ^= lowest_bit
+        return nodes
+
+    def compute_reachability(self):
+        """
+        Compute the nodes reachable from every node, in a time linear in the size of the graph (times the size
+        of the bitsets): nodes of a same strongly connected component (a loop) reach the same nodes, and
+        components are processed from the end of the program, each one reusing the result of the following ones.
+        """
+        nodes = set(self.successors)
+        nodes.add(0)
+        for following_nodes in self.successors.values():
+            nodes.update(following_nodes)
+        self.sorted_nodes = sorted(nodes)
+        self.bit_index = {node: index for index, node in enumerate(self.sorted_nodes)}
+
+        # strongly connected components (Tarjan, iterative), found in reverse topological order
+        index_of = {}
+        low_link = {}
+        on_stack = set()
+        component_stack = []
+        components = []
+        for root in self.sorted_nodes:
+            if root in index_of:
+                continue
+            index_of[root] = low_link[root] = len(index_of)
+            component_stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.successors.get(root, [])))]
+            while work:
+                node, following_iterator = work[-1]
+                pushed = False
+                for following in following_iterator:
+                    if following not in index_of:
+                        index_of[following] = low_link[following] = len(index_of)
+                        component_stack.append(following)
+                        on_stack.add(following)
+                        work.append((following, iter(self.successors.get(following, []))))
+                        pushed = True
+                        break
+                    elif following in on_stack:
+                        low_link[node] = min(low_link[node], index_of[following])
+                if pushed:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+                if low_link[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+        self.reachable = {}
+        for component in components:
+            members = set(component)
+            bits = 0
+            in_loop = len(component) > 1
+            for node in component:
+                for following in self.successors.get(node, []):
+                    if following in members:
+                        in_loop = True
+                    else:
+                        bits |= (1 << self.bit_index[following]) | self.reachable[following]
+            if in_loop:
+                for node in component:
+                    bits |= 1 << self.bit_index[node]
+            for node in component:
+                self.reachable[node] = bits
+
+
+def get_indexed_cfg(graph):
+    """
+    :param graph: a CFG graph
+    :return: the graph with its indexes (the graph itself if it is already an IndexedCfg)
+    """
+    if isinstance(graph, IndexedCfg):
+        return graph
+    return IndexedCfg(graph)
+
+
 def process_value_test(graph, variables, info_conditions=False):
     """
     :param graph: CFG graph
@@ -217,29 +390,157 @@ def get_conditions_from_bool_expression(boolean_expression):
     return conditions
 
 
+def iter_k_paths(graph, k, start=1):
+    """
+    Every path of the graph from the start step, cut after k steps (a path reaching 0 before is shorter).
+    Paths are generated one by one by a depth first search, always in the same order (following nodes are
+    taken in the order of the graph): the paths are not kept in memory.
+    :param graph: a CFG graph
+    :param k: maximal length of the paths
+    :param start: first step of the paths
+    :return: a generator of lists, each list being a path [1, 4, 5]
+    """
+    if k <= 0:
+        return
+    successors = get_indexed_cfg(graph).successors
+    path = [start]
+    # iterators on the following nodes of each step of the current path
+    stack = [iter(successors[start]) if start != 0 and k > 1 else iter(())]
+    while stack:
+        following = next(stack[-1], None)
+        if following is None:
+            if len(path) == k or path[-1] == 0:
+                yield list(path)
+            stack.pop()
+            path.pop()
+            continue
+        path.append(following)
+        if following == 0 or len(path) == k:
+            stack.append(iter(()))
+        else:
+            stack.append(iter(successors[following]))
+
+
+def count_k_paths(graph, k, start=1):
+    """
+    Number of paths generated by iter_k_paths, without generating them:
+    count(node, k) = 1 if node is 0 or k is 1, else the sum of count(following node, k - 1)
+    The counts are computed for every node, one length after the other, in O(k * number of edges).
+    :return: int
+    """
+    if k <= 0:
+        return 0
+    successors = get_indexed_cfg(graph).successors
+    # counts[node]: number of paths of length at most length starting at node
+    counts = {node: 1 for node in successors}
+    counts[0] = 1
+    for length in range(2, k + 1):
+        counts = {node: sum(counts[following] for following in following_nodes)
+                  for node, following_nodes in successors.items()}
+        counts[0] = 1
+    return counts[start]
+
+
+class PathTrie(object):
+    """
+    A set of paths stored as a prefix tree: each node of the tree is a dic {step: child node}, and the key
+    None marks the end of a path. Adding a path or checking if a path is in the set costs O(length of path),
+    and the k-paths which are not in the set can be found without enumerating the paths which are.
+    """
+    def __init__(self, paths=()):
+        self.root = {}
+        self.size = 0
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        """
+        :param path: a path [1, 2, 4]
+        :return: True if the path was not in the set yet
+        """
+        node = self.root
+        for step in path:
+            node = node.setdefault(step, {})
+        if None in node:
+            return False
+        node[None] = True
+        self.size += 1
+        return True
+
+    def __contains__(self, path):
+        node = self.root
+        for step in path:
+            if step not in node:
+                return False
+            node = node[step]
+        return None in node
+
+    def __len__(self):
+        return self.size
+
+    def iter_uncovered(self, graph, k, start=1):
+        """
+        The k-paths of the graph (see iter_k_paths) which are not in the set, in the order of iter_k_paths.
+        As soon as a prefix is not in the tree, every path starting with it is generated without any more check.
+        :return: a generator of lists, each list being a path [1, 4, 5]
+        """
+        if k <= 0:
+            return
+        successors = get_indexed_cfg(graph).successors
+        # (prefix of path, node of the tree for this prefix, or None if the prefix is not in the tree)
+        stack = [([start], self.root.get(start))]
+        while stack:
+            prefix, node = stack.pop()
+            if node is None:
+                # no path of the set starts with this prefix
+                for path in iter_k_paths(graph, k - len(prefix) + 1, prefix[-1]):
+                    yield prefix[:-1] + path
+            elif len(prefix) == k or prefix[-1] == 0:
+                if None not in node:
+                    yield prefix
+            else:
+                for following in reversed(successors[prefix[-1]]):
+                    stack.append((prefix + [following], node.get(following)))
+
+    def count_uncovered(self, graph, k, start=1):
+        """
+        :return: number of paths generated by iter_uncovered, without generating them
+        """
+        return count_k_paths(graph, k, start) - self.count_covered(graph, k, start)
+
+    def count_covered(self, graph, k, start=1):
+        """
+        :return: number of k-paths of the graph (see iter_k_paths) which are in the set
+        """
+        if k <= 0 or start not in self.root:
+            return 0
+        successors = get_indexed_cfg(graph).successors
+        count = 0
+        stack = [([start], self.root[start])]
+        while stack:
+            prefix, node = stack.pop()
+            if len(prefix) == k or prefix[-1] == 0:
+                if None in node:
+                    count += 1
+                continue
+            for following in successors[prefix[-1]]:
+                if following in node:
+                    stack.append((prefix + [following], node[following]))
+        return count
+
+
+def get_all_k_paths(graph, k):
+    """
+    :return: list of every path of length at most k (see iter_k_paths)
+    """
+    return list(iter_k_paths(graph, k))
+
+
 def get_all_k_paths_brute(graph, k):
     """
-    A brute force way to get k paths by choosing at each step randomly the next step.
-    We iterate 100 times to be sure to cover all probables paths (TODO: justify why 100)
-    :param graph:
-    :param k:
-    :return: a list of list, each list being a path [1, 4, 5]
+    Former name of get_all_k_paths (paths were found by random walks): paths are now enumerated exactly.
     """
-    paths = []
-
-    limit = 100
-    for i in range(limit):
-        path = []
-        next_step = 1
-        for j in range(k):
-            path.append(next_step)
-            if next_step == 0:
-                break
-            next_step = random.choice(graph[next_step][-1])
-
-        if path not in paths:
-            paths.append(path)
-    return paths
+    return get_all_k_paths(graph, k)
 
 
 def get_all_paths(graph, start, path=None):
@@ -290,28 +591,29 @@ def get_children(step_number, graph, visited=None):
     Return the list of children (eg following nodes from this starting point)
     :param step_number: starting step_number
     :param graph: a CFG graph
-    :param visited: argument used for recursive calls of function (a list of already visited nodes)
+    :param visited: a set of already visited nodes (by default, empty)
     :return: set: the list of following steps
     """
-    if visited is None:
-        visited = []
-
-    children = []
     if step_number == 0:
-        return children
-    else:
-        following_nodes = graph[step_number][-1]
-
-        # we add the list of following nodes
-        children.extend(following_nodes)
-
-        # for each following node, we add their following nodes
-        # to avoid issue when we encounter potential cycle, we keep track of visited nodes
-        for following in [e for e in following_nodes if e not in visited]:
-            visited.append(following)
-            children.extend(get_children(following, graph, visited))
+        return []
+    if isinstance(graph, IndexedCfg):
+        return set(graph.get_reachable_nodes(step_number))
 
-        return set(children)
+    # depth first search; to avoid issue when we encounter potential cycle, we keep track of visited nodes
+    if visited is None:
+        visited = set()
+    children = set()
+    to_visit = [step_number]
+    while to_visit:
+        current = to_visit.pop()
+        if current == 0:
+            continue
+        for following in graph[current][-1]:
+            children.add(following)
+            if following not in visited:
+                visited.add(following)
+                to_visit.append(following)
+    return children
 
 
 def get_accessible_graph(graph, number_node):
@@ -319,9 +621,42 @@ def get_accessible_graph(graph, number_node):
     Returns the graph that is accessible starting from a given node
     :param graph: a cfg graph
     :param number_node: the starting step
-    :return: dictionary : a sub-cfg graph
+    :return: dictionary : a sub-cfg graph (nodes in increasing order)
+    """
+    return {key: graph[key] for key in sorted(get_children(number_node, graph)) if key != 0}
+
+
+def get_accessible_definition(graph, number_node, variable):
+    """
+    Same as get_definition_for_variable(get_accessible_graph(graph, number_node), variable),
+    without building the sub graph
+    :param graph: an IndexedCfg
+    :param number_node: the starting step
+    :param variable: a variable 'x'
+    :return: list: a list of steps [1, 4], in increasing order
     """
-    return {key: graph[key] for key in get_children(number_node, graph) if key != 0}
+    return sorted(step for step in graph.definitions.get(variable, []) if graph.is_reachable(number_node, step))
+
+
+def get_accessible_utilization(graph, number_node, variable):
+    """
+    Same as get_utilization_for_variable(get_accessible_graph(graph, number_node), variable),
+    without building the sub graph
+    :param graph: an IndexedCfg
+    :param number_node: the starting step
+    :param variable: a variable 'x'
+    :return: list: a list of steps [1, 4], in increasing order
+    """
+    return sorted(step for step in graph.utilizations.get(variable, []) if graph.is_reachable(number_node, step))
+
+
+def get_graph_hash(graph):
+    """
+    :param graph: a CFG graph
+    :return: str, a hash identifying the program (same graph => same hash, whatever the order of the dics)
+    """
+    canonical = json.dumps(graph, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 
 def get_all_conditions_from_graph(graph):
@@ -329,6 +664,9 @@ def get_all_conditions_from_graph(graph):
     :param graph: a cfg graph
     :return: returns a dictionary {node_number: list(conditions)}
     """
+    if isinstance(graph, IndexedCfg):
+        return {node: get_conditions_from_bool_expression(graph[node][1]) for node in graph.decision_nodes}
+
     conditions = {}
     for node, value in graph.items():
         if value[0] == 'if' or value[0] == 'while':
@@ -343,6 +681,7 @@ def get_all_def(graph):
     :param graph: a CFG graph
     :return: list: a list of steps [1, 4]
     """
+    graph = get_indexed_cfg(graph)
     variables = get_all_var(graph)
     steps = []
     for variable in variables:
@@ -358,6 +697,9 @@ def get_definition_for_variable(graph, variable):
     :param variable: a variable 'x'
     :return: list: a list of steps [1, 4]
     """
+    if isinstance(graph, IndexedCfg):
+        return list(graph.definitions.get(variable, []))
+
     steps = []
     for key, value in graph.items():
         if is_def(value, variable):
@@ -373,6 +715,9 @@ def get_utilization_for_variable(graph, variable):
     :param variable: a variable 'x'
     :return: list: a list of steps [1, 4]
     """
+    if isinstance(graph, IndexedCfg):
+        return list(graph.utilizations.get(variable, []))
+
     steps = []
     for key, value in graph.items():
         if is_ref(value, variable):
@@ -386,6 +731,9 @@ def get_all_var(graph):
     :param graph: a CFG graph
     :return: list: the list of variables ['e', 'r']
     """
+    if isinstance(graph, IndexedCfg):
+        return list(graph.variables)
+
     variables = []
     for node, value in graph.items():
         if any(value[0] == x for x in ('while', 'if')):
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module keeps on disk the result of parsing and converting a program, so that a program is parsed and
+converted only once as long as its source does not change.
+
+Each program is stored in a single json file of the cache directory, named by the hash of its source (plain data
+only: reading a file of the cache never runs code, whoever wrote it). The file contains the AST tree (see
+encode_tree), the CFG graph and some metadata on the program:
+    - 'source_hash': hash of the source of the program
+    - 'graph_hash': hash of the CFG graph (see get_graph_hash)
+    - 'variables': sorted list of the variables of the program
+    - 'definitions': list of the steps which are assignments
+    - 'conditions': dic {step: list(conditions)} of the 'if' and 'while' steps (not written: computed again from
+      the graph when the file is read)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import my_parser
+from ast_to_cfg import AstToCfgConverter
+from ast_tree import Node
+from process_cfg_tools import IndexedCfg, get_graph_hash, get_all_var, get_all_def, get_all_conditions_from_graph
+
+CACHE_DIRECTORY = '.while_cache'
+# to change when the parser or the converter give a different result: older files of the cache are then ignored
+CACHE_VERSION = 4
+
+
+def get_source_hash(source):
+    """
+    :param source: source code of a program
+    :return: str, hash of the source (and of the version of the cache)
+    """
+    return hashlib.sha256((str(CACHE_VERSION) + '\n' + source).encode('utf-8')).hexdigest()
+
+
+def build_program(source):
+    """
+    Parse and convert a program, without using the cache
+    :param source: source code of a program
+    :return: dic {'ast': AST tree, 'cfg': CFG graph (IndexedCfg), 'metadata': dic}
+    """
+    ast_tree = my_parser.parse_text(source)
+    # the graph is given with its indexes (built again when it is read from the cache)
+    graph = IndexedCfg(AstToCfgConverter(ast_tree).get_cfg_graph())
+    metadata = {
+        'source_hash': get_source_hash(source),
+        'graph_hash': get_graph_hash(graph),
+        'variables': sorted(set(get_all_var(graph))),
+        'definitions': get_all_def(graph),
+        'conditions': get_all_conditions_from_graph(graph)
+    }
+    return {'ast': ast_tree, 'cfg': graph, 'metadata': metadata}
+
+
+def encode_tree(tree):
+    """
+    :param tree: an AST tree
+    :return: list of the nodes of the tree in preorder, each node being [category, data, number of children]
+    """
+    nodes = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        nodes.append([node.category, node.data, len(node.children)])
+        stack.extend(reversed(node.children))
+    return nodes
+
+
+def decode_tree(nodes):
+    """
+    :param nodes: list of nodes, see encode_tree
+    :return: the AST tree
+    """
+    tree = None
+    # nodes whose children are being read: [node, number of children left to read]
+    stack = []
+    for category, data, number_children in nodes:
+        node = Node(category, data)
+        if stack:
+            stack[-1][0].add_child(node)
+            stack[-1][1] -= 1
+            if stack[-1][1] == 0:
+                stack.pop()
+        else:
+            tree = node
+        if number_children > 0:
+            stack.append([node, number_children])
+    return tree
+
+
+def encode_program(program):
+    """
+    :param program: dic {'ast': AST tree, 'cfg': CFG graph, 'metadata': dic}, see build_program
+    :return: the program as plain data, written by json
+    """
+    return {
+        'ast': encode_tree(program['ast']),
+        # json keys are strings: the steps are kept as numbers in a list of couples
+        'cfg': [[step, node] for step, node in program['cfg'].items()],
+        'metadata': {key: value for key, value in program['metadata'].items() if key != 'conditions'}
+    }
+
+
+def decode_program(data):
+    """
+    :param data: a program read by json, see encode_program
+    :return: dic {'ast': AST tree, 'cfg': CFG graph (IndexedCfg), 'metadata': dic}
+    """
+    graph = {}
+    for step, node in data['cfg']:
+        if node[0] == 'if' or node[0] == 'while':
+            # comparisons are tuples ('<=', ['x', 0])
+            node[1] = [[tuple(comparison) for comparison in clause] for clause in node[1]]
+        graph[step] = node
+    graph = IndexedCfg(graph)
+    metadata = dict(data['metadata'])
+    metadata['conditions'] = get_all_conditions_from_graph(graph)
+    return {'ast': decode_tree(data['ast']), 'cfg': graph, 'metadata': metadata}
+
+
+def load_program(path_program, cache_directory=CACHE_DIRECTORY):
+    """
+    Returns the AST tree, the CFG graph and the metadata of a program, from the cache if the source of the program
+    was already processed, else the program is parsed and converted, and the result is written in the cache.
+    :param path_program: path of the file of the program
+    :param cache_directory: directory of the cache (None: the cache is not used)
+    :return: dic {'ast': AST tree, 'cfg': CFG graph, 'metadata': dic}
+    """
+    with open(path_program) as file:
+        source = file.read()
+    if cache_directory is None:
+        return build_program(source)
+
+    path_cache = os.path.join(cache_directory, get_source_hash(source) + '.json')
+    try:
+        with open(path_cache) as file:
+            return decode_program(json.load(file))
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        # not in the cache yet (or unreadable file): built again
+        pass
+
+    program = build_program(source)
+    os.makedirs(cache_directory, exist_ok=True)
+    # written in a temporary file first, so that a process never reads a file being written by an other one
+    descriptor, path_tmp = tempfile.mkstemp(dir=cache_directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(encode_program(program), file)
+        os.replace(path_tmp, path_cache)
+    except OSError:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+    return program
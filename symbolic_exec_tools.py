@@ -1,373 +1,307 @@
 from constraint import *
-from process_cfg_tools import get_all_var, type_node, is_boolean_expression_node
-import re
-from contextlib import contextmanager
-import threading
-import _thread
-
-
-class TimeoutException(Exception):
-    def __init__(self, msg=''):
-        self.msg = msg
-
-
-@contextmanager
-def time_limit(seconds, msg=''):
-    timer = threading.Timer(seconds, lambda: _thread.interrupt_main())
-    timer.start()
-    try:
-        yield
-    except KeyboardInterrupt:
-        raise TimeoutException("Timed out for operation {}".format(msg))
-    finally:
-        # if the action ends in specified time, timer is canceled
-        timer.cancel()
-
-
-def generate_value_from_node(graph, target):
-    path = path_to_node(target, graph)
-    detailed_path = detailed_steps_path(path, graph)
-    predicate = path_predicate(detailed_path, graph)
-    solution = solve_path_predicate(predicate)
-    if solution is not None:
-        return clean_solution(solution)
+from process_cfg_tools import is_boolean_expression_node, IndexedCfg, get_indexed_cfg, LIMIT_FOR_INFINITE_LOOP
+from interval_analysis import get_interval_analysis
+import integer_solver
+from integer_solver import UNKNOWN
+from predicates import PathPredicate, is_satisfied, get_variables, eliminate_equalities, complete, freeze, \
+    split_independent, canonicalize
+import heapq
+from collections import deque
+
+# solver used for path predicates:
+# 'native': integer_solver (propagation on intervals and branching, on unbounded domains: any integer value)
+# 'constraint': python-constraint, every value of range(-50, 50) is tried for each variable (finding none there does
+# not prove there is none: the result is then UNKNOWN)
+SOLVER_BACKEND = 'native'
+BACKENDS = ('native', 'constraint')
+# solutions of the groups of constraints already solved {(backend, constraints, variables): solution or None}
+_solved_groups = {}
+# the solutions are forgotten when there are more
+LIMIT_SOLVED_GROUPS = 10000
+# time given to the solver for a predicate, when no Budget is given (see integer_solver.Budget)
+LIMIT_SECONDS = 15
+# maximal number of paths extended by a search of path to a node (see PathSearch)
+LIMIT_SEARCH = 1000
+# the paths searched are forgotten when there are more
+LIMIT_SEARCHED_PATHS = 100000
+
+
+def generate_value_from_node(graph, target, cache=None):
+    """
+    :param target: a node of the graph
+    :param cache: dic of the predicates already solved (see solve_constraints)
+    :return: dic {variable: value} of values reaching the node by the shortest feasible path
+    (see PathSearch), {} if none was found
+    """
+    result = get_path_search(graph).find_path(target, cache)
+    if result is not None:
+        return result[1]
     else:
         return {}
 
 
-def generate_value_from_path(graph, target_path):
-    target_path.reverse()
-    detailed_path = detailed_steps_path(target_path, graph)
-    predicate = path_predicate(detailed_path, graph)
-    solution = solve_path_predicate(predicate)
-    if solution is not None:
-        return clean_solution(solution)
-    else:
-        return None
-
-
-def clean_solution(solution):
-    # {'x1': 0, 'x2': 0}
-    key_values_solution = []
-
-    variables = [key[0] for key in solution.keys()]
-
-    smaller_for_var = {var: '100' for var in variables}
-
-    for key in solution.keys():
-        try:
-            smaller = int(smaller_for_var[key[0]])
-            if int(key[1]) < smaller:
-                smaller_for_var[key[0]] = key[1]
-        except ValueError:
-            continue
-
-    for key in solution:
-        if key[1] == smaller_for_var[key[0]]:
-            key_values_solution.append(key)
-    cleaned_solution = {key[0]: solution[key] for key in key_values_solution}
-    return cleaned_solution
-
-
-def is_assign_predicate(step):
-    if ' = ' in step:
-        return True
-    else:
-        return False
-
-
-def is_bool_predicate(step):
-    return not is_assign_predicate(step)
-
-
-def split(txt, separators):
+def generate_value_from_path(graph, target_path, cache=None):
     """
-    Split a string using a list of separators
-    :param txt: a string
-    :param separators: a list of separators
-    :return: the list of string, split
+    :param target_path: a path of the graph, in the order of execution [1, 2, 4, 5]
+    :param cache: dic of the predicates already solved (see solve_constraints)
+    :return: dic {variable: value} of values taking the path, or None (also if none was found within the limits)
     """
-    default_sep = separators[0]
+    solution = solve_predicate(PathPredicate(graph, target_path), cache=cache)
+    return solution if solution is not UNKNOWN else None
 
-    # skip seps[0] because that's the default separator
-    for sep in separators[1:]:
-        txt = txt.replace(sep, default_sep)
-    return [i.strip() for i in txt.split(default_sep)]
-
-
-def str_represents_number(test_string):
-    try:
-        float(test_string)
-        return True
-    except ValueError:
-        return False
 
-
-def get_variable_from_assign_predicate(step):
+def solve_predicate(predicate, backend=None, cache=None, budget=None):
     """
-    'x2 = 1'
-    'x3 = 1 - x2'
-    :param step:
-    :return:
+    :param predicate: a PathPredicate
+    :param backend: solver to use (see BACKENDS), SOLVER_BACKEND by default
+    :param cache: dic of the predicates already solved (see solve_constraints)
+    :param budget: an integer_solver.Budget (see solve_constraints)
+    :return: dic {variable: value} of the values to give to the program, None if there are none, or UNKNOWN if
+    none was found within the limits
     """
-    operators = ['+', '-', '*']
-
-    # add first var (before the assign)
-    result = [step.split(' = ')[0].replace(' ', '')]
-
-    maybe_vars = split(step.split(' = ')[1].replace(' ', ''), operators)
-
-    for potential_var in maybe_vars:
-        if not str_represents_number(potential_var):
-            result.append(potential_var)
-
-    return result
-
-
-def get_variable_from_bool_predicate(step):
-    # (x1 <= 0)
-    # not ((x1 <= 0))
-    comparators = ['==', '<=', '<', '>', '>=', '!=']
-    separator = '=='
-    step = step.replace('(', '').replace(')', '').replace('not', '')
-    for comparator in comparators:
-        if comparator in step:
-            separator = comparator
-    # TODO works only on bool value such as x1 == 2 or x1 <= 3!!!!!
-    return step.split(separator)[0].replace(' ', '')
-
-
-def get_next_occurrence_variable(predicate_path, variable):
-    for step in predicate_path:
-        if variable in step:
-            index_var = step.index(variable)
-            return step[index_var:index_var + 2]
+    solution = solve_constraints(predicate.constraints, predicate.get_variables(), backend, cache, budget)
+    if solution is None or solution is UNKNOWN:
+        return solution
+    return predicate.get_inputs(solution)
 
 
-def get_variables_from_predicate(predicate_path):
-    variables = []
-    for step in predicate_path:
-        if is_assign_predicate(step):
-            variables.extend(get_variable_from_assign_predicate(step))
-        elif is_bool_predicate(step):
-            variables.append(get_variable_from_bool_predicate(step))
-    return variables
-
-
-def atoi(text):
-    return int(text) if text.isdigit() else text
-
-
-def natural_keys(text):
+def solve_constraints(constraints, variables, backend=None, cache=None, budget=None):
     """
-    Util made in order to sort a list of string + number following the numbers.
-    list.sort(key=natural_keys) : sorts in human order
-    source
-    http://nedbatchelder.com/blog/200712/human_sorting.html
+    The variables defined by an equality are eliminated first (see predicates.eliminate_equalities): only the
+    other ones are given to the solver, and the values of the eliminated ones are computed from its solution
+    :param constraints: list of constraints (see predicates)
+    :param variables: list of the variables of the constraints, in the order they are given to the solver
+    :param backend: solver to use (see BACKENDS), SOLVER_BACKEND by default
+    :param cache: if given, dic {(backend, canonical form of the constraints left): solution or None} where the
+    result is looked for, and kept (predicates of different paths often are the same once reduced); an UNKNOWN
+    result is not kept
+    :param budget: an integer_solver.Budget, shared by every group of constraints solved (by default, LIMIT_SECONDS
+    seconds)
+    :return: a solution {variable: value}, None if there is none, or UNKNOWN if none was found within the limits
     """
-    return [atoi(c) for c in re.split('(\d+)', text)]
+    if backend is None:
+        backend = SOLVER_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError("Unknown solver backend: " + str(backend))
+    if budget is None:
+        budget = integer_solver.Budget(LIMIT_SECONDS)
+
+    constraints, definitions = eliminate_equalities(constraints)
+    variables = get_variables(('and', constraints), [variable for variable in variables if variable not in definitions])
+    if cache is not None:
+        canonical, names = canonicalize(constraints, variables)
+        key = (backend, canonical)
+        # read once: another thread may change the cache meanwhile
+        result = cache.get(key, cache)
+        if result is cache:
+            result = _solve_groups(constraints, variables, backend, budget)
+            if result is not None and result is not UNKNOWN:
+                result = {names[variable]: value for variable, value in result.items()}
+            if result is not UNKNOWN:
+                cache[key] = result
+        if result is None or result is UNKNOWN:
+            return result
+        solution = {variable: result[name] for variable, name in names.items()}
+    else:
+        solution = _solve_groups(constraints, variables, backend, budget)
+        if solution is None or solution is UNKNOWN:
+            return solution
+    return complete(solution, definitions)
+
+
+def _solve_groups(constraints, variables, backend, budget):
+    solution = {}
+    # groups sharing no variable are solved separately: one without solution is enough to prove there is none
+    for constraints_group, variables_group in split_independent(constraints, variables):
+        solution_group = solve_group(constraints_group, variables_group, backend, budget)
+        if solution_group is None:
+            return None
+        if solution_group is UNKNOWN or solution is UNKNOWN:
+            solution = UNKNOWN
+        else:
+            solution.update(solution_group)
+    return solution
 
 
-def order_var(set_variables):
+def solve_group(constraints, variables, backend, budget=None):
     """
-    From a set of variables + number step ('x1', 'x4', 'y1', 'y6'), organize by variable name ('x', 'y'
-    and for each variable order the set
-    :param set_variables: a set of variables + steps {'x1', 'x4', 'y1'}
-    :return: a dictionary {variable: order variable } {'x': ['x1', 'x3', 'x4']}
+    Solve constraints with a backend; the solution is kept, for the same group of constraints found again in
+    the predicate of another path (unless it is UNKNOWN)
+    :param budget: an integer_solver.Budget
+    :return: a solution {variable: value}, None if there is none, or UNKNOWN if none was found within the limits
     """
-    dic_res = {}
-    for var in set_variables:
-        name_var = var[0]  # 'x'
-        if name_var not in dic_res.keys():
-            dic_res[name_var] = [var]
+    key = (backend, tuple(freeze(constraint) for constraint in constraints), tuple(variables))
+    # read once: another thread may clear the solutions meanwhile
+    solution = _solved_groups.get(key, _solved_groups)
+    if solution is _solved_groups:
+        if backend == 'native':
+            solution = integer_solver.solve(constraints, variables, budget=budget)
         else:
-            dic_res[name_var].append(var)
-    # in each value of dic, we order variable by order x1=>x2=>x4
-    for value in dic_res.values():
-        value.sort(key=natural_keys)
-    return dic_res
+            solution = solve_constraints_with_constraint(constraints, variables, budget)
+        if solution is not UNKNOWN:
+            if len(_solved_groups) >= LIMIT_SOLVED_GROUPS:
+                _solved_groups.clear()
+            _solved_groups[key] = solution
+    return dict(solution) if isinstance(solution, dict) else solution
 
 
-def organization_in_couple(dic_organization_var):
+def solve_constraints_with_constraint(constraints, variables, budget=None):
     """
-    make couple of variable
-    :param dic_organization_var: a dic of variable: variable + step ordered
-    :return: a list of couples [['x1', 'x2'], ['y1', 'y2']]
+    Solve constraints (see predicates) with python-constraint, each value of range(-50, 50) being tried
+    :param constraints: list of constraints
+    :param variables: list of the variables of the constraints
+    :param budget: an integer_solver.Budget, one step being spent per constraint checked (by default, LIMIT_SECONDS
+    seconds)
+    :return: a solution {variable: value}, None if a constraint without variables is false, or UNKNOWN if none
+    was found (values out of range(-50, 50) are not tried) or if the budget got exhausted
     """
-    # input: a dic {'x':['x1', ...], 'y' : ['y3', 'y5', ...]}
-
-    result = []
-    for key, value in dic_organization_var.items():
-        for i in range(len(value) - 1):
-            result.append([value[i], value[i+1]])
-
-    # output a list of couple [('x1', 'x3'), ('y1', 'y4')] to set equal
-    return result
+    if budget is None:
+        budget = integer_solver.Budget(LIMIT_SECONDS)
 
+    def check(constraint, names, values):
+        if not budget.spend():
+            raise integer_solver.BudgetExhausted()
+        return is_satisfied(constraint, dict(zip(names, values)))
 
-def check_auto_reference(predicate_path):
-    list_auto_references = []
-    for step in predicate_path:
-        if not is_bool_predicate(step):
-            variables = get_variable_from_assign_predicate(step)
-            # assume that variables are ordered and variables[0] is the variable that is being assigned.
-            array_type_var = [var[0] for var in variables]
-            # if first variable (the one that is assigned) is inside
-            # the rest of variable, variables are auto assigned
-            if variables[0][0] in array_type_var[1:]:
-                for referenced_variable in variables[1:]:
-                    if variables[0][0] in referenced_variable:
-                        list_auto_references.append([variables[0], referenced_variable])
-    return list_auto_references
-
-
-def couples_equals(predicate_path_reversed, couples_variables):
-    couple_auto_ref = check_auto_reference(predicate_path_reversed)
-    couple_auto_ref2 = couple_auto_ref.copy()
-    for couple in couple_auto_ref2:
-        couple.reverse()
-    couple_to_stick_together = [couple for couple in couples_variables if couple not in couple_auto_ref]
-    if couple_auto_ref2 is not None:
-        couple_to_stick_together = [couple for couple in couple_to_stick_together if couple not in couple_auto_ref2]
-    return couple_to_stick_together
-
-
-def solve_path_predicate(predicate_path):
-    """
-    :param predicate_path:
-    :return:
-    """
     problem = Problem()
-
-    predicate_path.reverse()
-
-    variables = set(get_variables_from_predicate(predicate_path))
-
-    dic_ordered_variables = order_var(variables)
-    couples_variables = organization_in_couple(dic_ordered_variables)
-
-    # if only one variable, we add an useless and arbitrary variable in order to be able to write
-    # functioning lambda functions. indeed, python constraint api seems to be written in python 2.x
-    # and calling solution over a constraint defined with only one variable returns an error 'TypeError'
-    # which seems to come from dic.keys() which returned a list in py 2.x. With python3.x, d.keys()
-    # returns a dict_keys.
-    if len(variables) == 1:
-        variables.add('pp')
-
-    for var in variables:
-        problem.addVariable(var, range(-50, 50))
-
-    str_add_cs = 'problem.addConstraint(lambda ' + ','.join(variables) + ':'
-
-    # equality between all variables following themselves (x1 == x2 , x3 == x4),
-    # except for variables that are assigned (assign : 'x2 = - x1' -> x2 !=x1)
-    couples_to_stick_together = couples_equals(predicate_path, couples_variables)
-    for couple_var in couples_to_stick_together:
-        to_add = couple_var[0] + '==' + couple_var[1]
-        exec(str_add_cs + to_add + ')')
-
-    # ['(x2 == 1)', 'x2 = 0-x1', '(x1 <= 0)']
-    for step in predicate_path:
-        if is_assign_predicate(step):
-            step = step.replace('=', '==')
-
-        exec(str_add_cs + step + ')')
+    for variable in variables:
+        problem.addVariable(variable, range(-50, 50))
+    for constraint in constraints:
+        variables_constraint = get_variables(constraint)
+        if len(variables_constraint) == 0:
+            if not is_satisfied(constraint, {}):
+                return None
+            continue
+        problem.addConstraint(FunctionConstraint(
+            lambda *values, constraint=constraint, names=variables_constraint: check(constraint, names, values)
+        ), variables_constraint)
+    if not variables:
+        # python-constraint finds no solution to a problem without variables
+        return {}
 
     try:
-        with time_limit(15, ''):
-            solution = problem.getSolution()
-    except TimeoutException:
-        solution = None
-
-    return solution
-
-
-def path_predicate(detailed_steps, graph):
-    variables = list(set(get_all_var(graph)))
-    order = list(detailed_steps.keys())
-
-    order.sort()
-
-    # we do not consider last step (not relevant)
-    order.pop()
-
-    result_path_predicate = []
-
-    for step in order:
-        if isinstance(detailed_steps[step], dict):
-            # assign. For ex: {'x': 'x-1'}
-            var = list(detailed_steps[step].keys())[0]
-            value = detailed_steps[step][var]
-            # todo: here, in value, replace any symbol operation (+, -, *) that is not spaced out by a space
-            # process value (eg replace each occurrence of variable 'x' by its value at step 'x8')
-            for variable in variables:
-                if variable in value:
-                    value = value.replace(variable, variable + str(step-1))
-            # value_processed = value
-            result_path_predicate.append(
-                var + str(step) + ' = ' + value
-            )
-        elif isinstance(detailed_steps[step], list):
-            # boolean expression and its  [[[('<=', ["x", 0])]], False]
-            bool_expr_str = transform_bool_expr_to_str(detailed_steps[step][0])
-            if not detailed_steps[step][1]:
-                bool_expr_str = 'not (' + bool_expr_str + ')'
-
-            for variable in variables:
-                if variable in bool_expr_str:
-                    bool_expr_str = bool_expr_str.replace(variable, variable + str(step))
+        solution = problem.getSolution()
+    except integer_solver.BudgetExhausted:
+        solution = UNKNOWN
 
-            result_path_predicate.append(
-                bool_expr_str
-            )
+    return solution if solution is not None else UNKNOWN
 
-    return result_path_predicate
 
-
-def transform_bool_expr_to_str(boolean_expression):
+class PathSearch(object):
     """
-    From a structured boolean expression (from CFG graph) returns its equivalent in str
-    :param boolean_expression: eg [[('<=', ['x', 0]), ('>', ['y', 2])], [('<=', ['x', 0]), ('>', ['y', 2])]]
-    :return: str (boolean expression)
+    Best-first search (A*) of the shortest feasible path from step 1 to a node: paths are extended one step at
+    a time, shortest (length + distance left to the node) first, and a path no value can take is not extended.
+    Each decision is checked by solving the predicate of the path, unless the values found for the shorter path
+    already take it. Paths found feasible (with their values) or infeasible are kept for the next searches.
     """
-    and_str_list = []
-    for and_expr in boolean_expression:
-        or_str_list = []
-        for or_expr in and_expr:
-            or_str = str(or_expr[1][0]) + ' ' + or_expr[0] + ' ' + str(or_expr[1][1])
-            or_str_list.append(or_str)
-        full_or_str = " or ".join(or_str_list)
-        and_str = '(' + full_or_str + ')'
-        and_str_list.append(and_str)
-    full_and_str = " and ".join(and_str_list)
-    return full_and_str
-
-
-def detailed_steps_path(path, graph):
-    result = {}
-    for index, step in enumerate(path):
-        if type_node(graph[step]) == 'assign':
-            result[step] = graph[step][1]
-        elif is_boolean_expression_node(graph[step]):
-            result[step] = [graph[step][1]]
-            if graph[step][-1][0] == path[index - 1]:
-                result[step].append(True)
-            elif graph[step][-1][1] == path[index - 1]:
-                result[step].append(False)
-    return result
-
-
-def path_to_node(node_key, graph):
-    path_result = [node_key]
-    current_node = node_key
+    def __init__(self, graph, backend=None):
+        """
+        :param graph: a CFG graph
+        :param backend: solver to use (see BACKENDS), SOLVER_BACKEND by default
+        """
+        self.graph = get_indexed_cfg(graph)
+        self.backend = backend
+        # branches that no value can take, whatever the path before (see interval_analysis)
+        self.intervals = get_interval_analysis(self.graph)
+        # {path (tuple): values taking the path}, and set of paths no value can take
+        self.feasible = {}
+        self.infeasible = set()
+        # {node: {step: length of the shortest path from the step to the node}}
+        self.distances = {}
+
+    def get_distances(self, target):
+        """
+        :return: dic {step: length of the shortest path from the step to the target}, for the steps which can reach it
+        """
+        if target not in self.distances:
+            distances = {target: 0}
+            queue = deque([target])
+            while queue:
+                node = queue.popleft()
+                for previous in self.graph.predecessors.get(node, []):
+                    if previous not in distances and self.intervals.is_feasible_edge(previous, node):
+                        distances[previous] = distances[node] + 1
+                        queue.append(previous)
+            self.distances[target] = distances
+        return self.distances[target]
+
+    def get_values(self, path, values, cache=None, budget=None):
+        """
+        :param path: a path (tuple) from step 1
+        :param values: values taking the path without its last step
+        :param budget: an integer_solver.Budget for the solver (see solve_constraints)
+        :return: values taking the path, or None if none were found (the path is only kept as infeasible when the
+        solver proved there are none, not when it was stopped)
+        """
+        if path in self.infeasible:
+            return None
+        if path not in self.feasible:
+            if len(self.feasible) + len(self.infeasible) >= LIMIT_SEARCHED_PATHS:
+                self.feasible.clear()
+                self.infeasible.clear()
+            predicate = PathPredicate(self.graph, path)
+            if not all(name in values for name in predicate.inputs) or not predicate.is_satisfied(values):
+                values = solve_predicate(predicate, self.backend, cache, budget)
+                if values is UNKNOWN:
+                    return None
+                if values is None:
+                    self.infeasible.add(path)
+                    return None
+            self.feasible[path] = values
+        return self.feasible[path]
+
+    def find_path(self, target, cache=None, budget=None):
+        """
+        :param target: a node of the graph
+        :param cache: dic of the predicates already solved (see solve_constraints)
+        :param budget: if given, an integer_solver.Budget shared by every predicate solved: the search stops once
+        it is exhausted (by default, each predicate has LIMIT_SECONDS seconds)
+        :return: couple (shortest feasible path [1, 2, 4, 5] to the target, dic {variable: value} taking it),
+        or None if none was found (within LIMIT_SEARCH paths extended, and paths of LIMIT_FOR_INFINITE_LOOP steps)
+        """
+        distances = self.get_distances(target)
+        if 1 not in distances:
+            return None
+        # (length of the path + distance left, order, path, values taking the path)
+        heap = [(distances[1], 0, (1,), {})]
+        order = 1
+        extended = 0
+        while heap and extended < LIMIT_SEARCH and (budget is None or not budget.exhausted):
+            _, _, path, values = heapq.heappop(heap)
+            if path[-1] == target:
+                # every input of the path must have a value, even if no decision reads it
+                values = self.get_values(path, values, cache, budget)
+                return (list(path), values) if values is not None else None
+            extended += 1
+            if len(path) > LIMIT_FOR_INFINITE_LOOP:
+                continue
+            node = path[-1]
+            for following in self.graph.successors[node]:
+                if following not in distances or not self.intervals.is_feasible_edge(node, following):
+                    continue
+                following_path = path + (following,)
+                following_values = values
+                # only a decision can make the path infeasible
+                if is_boolean_expression_node(self.graph[node]):
+                    following_values = self.get_values(following_path, values, cache, budget)
+                    if following_values is None:
+                        continue
+                heapq.heappush(heap, (len(following_path) + distances[following], order, following_path,
+                                      following_values))
+                order += 1
+        return None
 
-    previous_nodes = get_father_for_node(current_node, graph)
-    while previous_nodes:
-        choice_to_get_up = [node for node in previous_nodes if node not in path_result][0]
-        path_result.append(choice_to_get_up)
-        previous_nodes = get_father_for_node(choice_to_get_up, graph)
 
-    return path_result
+def get_path_search(graph):
+    """
+    :param graph: a CFG graph
+    :return: the PathSearch of the graph, with SOLVER_BACKEND; for an IndexedCfg, it is kept with the indexes, so
+    that the paths already searched are known by the next searches
+    """
+    graph = get_indexed_cfg(graph)
+    if getattr(graph, 'path_search', None) is None or graph.path_search.backend != SOLVER_BACKEND:
+        graph.path_search = PathSearch(graph, SOLVER_BACKEND)
+    return graph.path_search
 
 
 def get_father_for_node(node_key, graph):
@@ -377,6 +311,9 @@ def get_father_for_node(node_key, graph):
     :param graph:
     :return:
     """
+    if isinstance(graph, IndexedCfg):
+        return list(graph.predecessors.get(node_key, []))
+
     result = []
     for key, value in graph.items():
         if node_key in value[-1]:
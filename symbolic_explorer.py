@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Depth first symbolic execution of a CFG graph.
+
+The predicate of the current path is kept on a stack (see PathPredicate.push and pop): going one step further adds
+the constraints of a step to the predicate of its parent, going back removes them. Each time a decision is taken,
+the values found for the parent path are tried first; the solver is only called when they do not take the branch.
+A branch no value can take is cut with all the paths below it, instead of being found impossible once per path.
+"""
+
+from predicates import PathPredicate
+from process_cfg_tools import get_indexed_cfg, is_boolean_expression_node
+from symbolic_exec_tools import solve_predicate, UNKNOWN
+
+
+class SymbolicExplorer(object):
+    """
+    Explore the paths of a CFG graph from the start step, together with values taking them
+    """
+    def __init__(self, graph, backend=None, cache=None, budget=None):
+        """
+        :param graph: a CFG graph
+        :param backend: solver to use (see symbolic_exec_tools.BACKENDS)
+        :param cache: dic of the predicates already solved (see symbolic_exec_tools.solve_constraints)
+        :param budget: if given, an integer_solver.Budget shared by every predicate solved: once it is exhausted,
+        the paths needing the solver are cut as unknown (by default, each predicate has its own time, see
+        symbolic_exec_tools.LIMIT_SECONDS)
+        """
+        self.graph = get_indexed_cfg(graph)
+        self.backend = backend
+        self.cache = cache
+        self.budget = budget
+        # prefixes of paths no value can take, found by the last exploration
+        self.infeasible_prefixes = []
+        # prefixes of paths cut because the solver was stopped before it found values (see integer_solver.UNKNOWN)
+        self.unknown_prefixes = []
+        # number of calls to the solver during the last exploration
+        self.solver_calls = 0
+
+    def get_values(self, predicate, values):
+        """
+        :param predicate: the predicate of the current path
+        :param values: dic {variable: value} taking the parent path
+        :return: values taking the current path (values if they do), None if there are none, or UNKNOWN if the
+        solver was stopped
+        """
+        if all(name in values for name in predicate.inputs) and predicate.is_satisfied(values):
+            return values
+        self.solver_calls += 1
+        return solve_predicate(predicate, self.backend, self.cache, self.budget)
+
+    def push(self, predicate, following, values):
+        """
+        Add a step to the path of the predicate, if a value can take it
+        :param predicate: the predicate of the current path
+        :param following: a following step of the last step of the path
+        :param values: dic {variable: value} taking the current path
+        :return: values taking the path with the new step, or None (the step is then not added, and the path is
+        added to infeasible_prefixes or unknown_prefixes)
+        """
+        step = predicate.path[-1]
+        predicate.push(following)
+        # only a decision can make the path infeasible, an assignment may read a variable without value yet
+        if is_boolean_expression_node(self.graph[step]) or any(name not in values for name in predicate.inputs):
+            values = self.get_values(predicate, values)
+            if values is None or values is UNKNOWN:
+                prefixes = self.infeasible_prefixes if values is None else self.unknown_prefixes
+                prefixes.append(list(predicate.path))
+                predicate.pop()
+                return None
+        return values
+
+    def explore(self, k, start=1, prefix=None):
+        """
+        Paths are generated in the same order as process_cfg_tools.iter_k_paths, infeasible ones being left out
+        (the prefixes cut are added to infeasible_prefixes, or to unknown_prefixes when the solver was stopped)
+        :param k: maximal length of the paths
+        :param start: first step of the paths
+        :param prefix: if given, only the paths starting with these steps [1, 2] are explored (from prefix[0])
+        :return: a generator of couples (path [1, 2, 4, 5, 0], dic {variable: value} of values taking the path)
+        """
+        self.infeasible_prefixes = []
+        self.unknown_prefixes = []
+        self.solver_calls = 0
+        if k <= 0:
+            return
+        successors = self.graph.successors
+        prefix = list(prefix) if prefix is not None else [start]
+        predicate = PathPredicate(self.graph, prefix[:1])
+        values = {}
+        for following in prefix[1:]:
+            values = self.push(predicate, following, values)
+            if values is None:
+                return
+        # values taking the path up to each step
+        values_stack = [values]
+        # iterators on the following nodes of each step of the current path
+        stack = [iter(successors[prefix[-1]]) if prefix[-1] != 0 and len(prefix) < k else iter(())]
+        while stack:
+            following = next(stack[-1], None)
+            if following is None:
+                path = predicate.path
+                if len(path) == k or path[-1] == 0:
+                    yield list(path), dict(values_stack[-1])
+                stack.pop()
+                values_stack.pop()
+                if predicate.frames:
+                    predicate.pop()
+                continue
+
+            values = self.push(predicate, following, values_stack[-1])
+            if values is None:
+                continue
+            values_stack.append(values)
+            if following == 0 or len(predicate.path) == k:
+                stack.append(iter(()))
+            else:
+                stack.append(iter(successors[following]))
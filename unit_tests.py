@@ -1,9 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import gzip
+import json
 import unittest
 
 from ast_to_cfg import AstToCfgConverter
-from ast_tree import GeneratorAstTree
+from ast_tree import GeneratorAstTree, Node
+from analysis_coverage import record_traces, all_affectations, all_definitions, all_i_loops, CoverageState, \
+    calc_coverage_state, calc_coverage_state_parallel, iter_test_file, save_coverage_state, load_coverage_state, \
+    get_graph_hash
+import analysis_coverage
+import os
+import tempfile
+from cfg_compiler import CompiledCfg, bool_expression_source
+import batch_interpreter
+import my_parser
+import program_cache
+import dataflow
+import interval_analysis
+import integer_solver
+import predicates
+import symbolic_exec_tools
+from symbolic_explorer import SymbolicExplorer
+import concolic
+import generator
 from process_cfg_tools import *
 from symbolic_exec_tools import *
 
@@ -37,7 +57,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # test simple while loop
         while_tree = GeneratorAstTree.basic_while_tree()
         parser = AstToCfgConverter(while_tree)
-        result = parser.treat_while_node(while_tree)
+        result = parser.treat_node(while_tree)
         expected = {
             1: ['while', [[('<', ['x', 5])]], [2, 3]],
             2: ['assign', {'x': 'x+1'}, [1]],
@@ -47,7 +67,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # test tree with sequence inside
         while_tree_seq = GeneratorAstTree.while_tree_with_seq()
         parser2 = AstToCfgConverter(while_tree_seq)
-        result2 = parser2.treat_while_node(while_tree_seq)
+        result2 = parser2.treat_node(while_tree_seq)
 
         expected2 = {
             1: ["while", [[('<', ['x', 5])]], [2, 4]],
@@ -60,7 +80,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # test while with if inside
         while_with_if = GeneratorAstTree.while_with_if()
         parser3 = AstToCfgConverter(while_with_if)
-        result3 = parser3.treat_while_node(while_with_if)
+        result3 = parser3.treat_node(while_with_if)
 
         expected3 = {
             1: ['while', [[('<', ['x', 5])]], [2, 5]],
@@ -76,7 +96,7 @@ class TestAstToCfgMethods(unittest.TestCase):
     def test_treat_seq_node(self):
         prog_tree = GeneratorAstTree.prog_tree()
         parser = AstToCfgConverter(prog_tree)
-        result = parser.treat_seq_node(prog_tree)
+        result = parser.treat_node(prog_tree)
         expected = {
             1: ['if', [[('<=', ["x", 0])]], [2, 3]],
             2: ['assign', {'x': '0-x'}, [4]],
@@ -98,7 +118,7 @@ class TestAstToCfgMethods(unittest.TestCase):
             5: ['assign', {'x': 'x+1'}, [4]]
         }
         parser = AstToCfgConverter(seq_tree)
-        result = parser.treat_seq_node(seq_tree)
+        result = parser.treat_node(seq_tree)
 
         self.assertEqual(result, expected)
 
@@ -106,7 +126,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # basic if tree
         basic_if_tree = GeneratorAstTree.basic_if()
         parser_for_basic = AstToCfgConverter(basic_if_tree)
-        result_for_basic = parser_for_basic.treat_if_node(basic_if_tree)
+        result_for_basic = parser_for_basic.treat_node(basic_if_tree)
         expected_basic = {
             1: ['if', [[('==', ["x", 1])]], [2, 3]],
             2: ['assign', {'x': '1'}, [4]],
@@ -117,7 +137,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # if with sequence inside
         if_tree_with_seq = GeneratorAstTree.if_nested_seq()
         parser = AstToCfgConverter(if_tree_with_seq)
-        result = parser.treat_if_node(if_tree_with_seq)
+        result = parser.treat_node(if_tree_with_seq)
         expected = {
             1: ['if', [[('==', ["x", 1])]], [2, 3]],
             2: ['assign', {'x': '1'}, [5]],
@@ -129,7 +149,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # if with nested while (right)
         if_with_while_right = GeneratorAstTree.if_with_while_right_part()
         parser_for_if_while_right = AstToCfgConverter(if_with_while_right)
-        result_for_if_while_right = parser_for_if_while_right.treat_if_node(if_with_while_right)
+        result_for_if_while_right = parser_for_if_while_right.treat_node(if_with_while_right)
 
         expected_for_if_while = {
             1: ['if', [[('<', ['x', 5])]], [2, 3]],
@@ -143,7 +163,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # if with nested while (left)
         if_with_while_left = GeneratorAstTree.if_with_while_left_part()
         parser_for_if_while_left = AstToCfgConverter(if_with_while_left)
-        result_for_if_while_left = parser_for_if_while_left.treat_if_node(if_with_while_left)
+        result_for_if_while_left = parser_for_if_while_left.treat_node(if_with_while_left)
 
         expected_for_if_while_left = {
             1: ['if', [[('<', ['x', 5])]], [2, 4]],
@@ -156,7 +176,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # if with two nested while (left and right)
         if_with_two_while = GeneratorAstTree.if_with_two_while()
         parser_for_if_two_while = AstToCfgConverter(if_with_two_while)
-        result_for_if_two_while = parser_for_if_two_while.treat_if_node(if_with_two_while)
+        result_for_if_two_while = parser_for_if_two_while.treat_node(if_with_two_while)
 
         expected_for_if_two_while = {
             1: ['if', [[('<', ['x', 5])]], [2, 4]],
@@ -171,7 +191,7 @@ class TestAstToCfgMethods(unittest.TestCase):
         # if with nested if
         if_with_if = GeneratorAstTree.if_with_if()
         parser_for_if_if = AstToCfgConverter(if_with_if)
-        result_for_if_if = parser_for_if_if.treat_if_node(if_with_if)
+        result_for_if_if = parser_for_if_if.treat_node(if_with_if)
         expected_for_if_within_if = {
             1: ['if', [[('<', ['x', 5])]], [2, 3]],
             2: ['assign', {'x': '1'}, [6]],
@@ -247,6 +267,44 @@ class TestAstToCfgMethods(unittest.TestCase):
 
         self.assertEqual(result_fact, expected_fact)
 
+    def test_get_cfg_graph_nested(self):
+        # while directly inside a while, and if inside the body of an if
+        tree = my_parser.parse_text(
+            "while x < 3 do { while y < 2 do y := y + 1 end; if y = 2 then { y := 0; x := x + 1 } else y := 1 }; z := x"
+        )
+        expected = {
+            1: ['while', [[('<', ['x', 3])]], [2, 8]],
+            2: ['while', [[('<', ['y', 2])]], [3, 4]],
+            3: ['assign', {'y': 'y+1'}, [2]],
+            4: ['if', [[('==', ['y', 2])]], [5, 7]],
+            5: ['assign', {'y': '0'}, [6]],
+            6: ['assign', {'x': 'x+1'}, [1]],
+            7: ['assign', {'y': '1'}, [1]],
+            8: ['assign', {'z': 'x'}, [0]]
+        }
+        self.assertEqual(AstToCfgConverter(tree).get_cfg_graph(), expected)
+
+        # a deeply nested program is converted without recursion
+        node = GeneratorAstTree.basic_if()
+        for i in range(5000):
+            if_node = GeneratorAstTree.basic_if()
+            if_node.children[2] = node
+            node = if_node
+        tree = Node("sequence")
+        tree.add_child(node)
+        graph = AstToCfgConverter(tree).get_cfg_graph()
+        self.assertEqual(len(graph), 2 * 5001 + 1)
+        self.assertEqual(graph[1], ['if', [[('==', ['x', 1])]], [2, 3]])
+        self.assertEqual(graph[2], ['assign', {'x': '1'}, [0]])
+        self.assertEqual(graph[2 * 5001 + 1], ['assign', {'x': 'x+1'}, [0]])
+
+        # and so is a long expression
+        tree = my_parser.parse_text("x := " + " + ".join(["y"] * 5000) + " * 2")
+        expression = AstToCfgConverter(tree).get_cfg_graph()[1][1]['x']
+        self.assertEqual(len(expression), 4 * 5000 - 1)
+        self.assertTrue(expression.startswith('(' * 4998 + 'y+y)+y)'))
+        self.assertTrue(expression.endswith(')+(y*2)'))
+
 
 class TestProcessCfgMethods(unittest.TestCase):
     def test_get_children(self):
@@ -397,6 +455,67 @@ class TestProcessCfgMethods(unittest.TestCase):
         result = get_all_k_paths_brute(graph_fact, 2)
         self.assertEqual(result, [[1, 2]])
 
+    def test_iter_k_paths(self):
+        graph_prog = {
+            1: ['if', [[('<=', ["x", 0])]], [2, 3]],
+            2: ['assign', {'x': '0-x'}, [4]],
+            3: ['assign', {'x': '1-x'}, [4]],
+            4: ['if', [[('==', ["x", 1])]], [5, 6]],
+            5: ['assign', {'x': '1'}, [0]],
+            6: ['assign', {'x': 'x+1'}, [0]]
+        }
+        self.assertEqual(list(iter_k_paths(graph_prog, 10)),
+                         [[1, 2, 4, 5, 0], [1, 2, 4, 6, 0], [1, 3, 4, 5, 0], [1, 3, 4, 6, 0]])
+        self.assertEqual(list(iter_k_paths(graph_prog, 3)), [[1, 2, 4], [1, 3, 4]])
+        self.assertEqual(list(iter_k_paths(graph_prog, 1)), [[1]])
+        self.assertEqual(count_k_paths(graph_prog, 10), 4)
+
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        self.assertEqual(get_all_k_paths(graph_fact, 6),
+                         [[1, 2, 3, 4, 2, 3], [1, 2, 3, 4, 2, 0], [1, 2, 0]])
+        for k in range(1, 30):
+            self.assertEqual(count_k_paths(graph_fact, k), len(get_all_k_paths(graph_fact, k)))
+
+        # a long sequence of if: 2 ** 20 paths, counted without being enumerated
+        graph_ifs = {}
+        for index in range(20):
+            graph_ifs[2 * index + 1] = ['if', [[('<', ['x', index])]], [2 * index + 2, 2 * index + 3]]
+            graph_ifs[2 * index + 2] = ['assign', {'x': 'x+1'}, [2 * index + 3]]
+        graph_ifs[41] = ['skip', [0]]
+        self.assertEqual(count_k_paths(graph_ifs, 100), 2 ** 20)
+        self.assertEqual(next(iter_k_paths(graph_ifs, 100))[:4], [1, 2, 3, 4])
+
+    def test_path_trie(self):
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        trie = PathTrie([(1, 2, 0), (1, 2, 3, 4, 2, 3)])
+        self.assertTrue(trie.add([1, 2, 3, 4, 2, 0]))
+        self.assertFalse(trie.add([1, 2, 0]))
+        self.assertEqual(len(trie), 3)
+        self.assertTrue([1, 2, 0] in trie)
+        self.assertFalse([1, 2] in trie)
+
+        # every path of length at most 6 was taken, not every path of length at most 8
+        self.assertEqual(list(trie.iter_uncovered(graph_fact, 6)), [])
+        self.assertEqual(list(trie.iter_uncovered(graph_fact, 8)), [[1, 2, 3, 4, 2, 3, 4, 2]])
+        self.assertEqual(trie.count_uncovered(graph_fact, 8), 1)
+        all_paths = get_all_k_paths(graph_fact, 8)
+        self.assertEqual(list(PathTrie().iter_uncovered(graph_fact, 8)), all_paths)
+
+        # uncovered paths are the targets that are not in the trie, in the same order
+        trie = PathTrie(all_paths[::2])
+        self.assertEqual(list(trie.iter_uncovered(graph_fact, 8)), all_paths[1::2])
+        self.assertEqual(trie.count_uncovered(graph_fact, 8), len(all_paths[1::2]))
+
     def test_get_all_paths(self):
         graph_prog = {
             1: ['if', [[('<=', ["x", 0])]], [2, 3]],
@@ -445,7 +564,105 @@ class TestProcessCfgMethods(unittest.TestCase):
         expected = [4]
         self.assertEqual(fathers, expected)
 
-    def test_path_to_node(self):
+    def test_indexed_cfg(self):
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        indexed = IndexedCfg(graph_fact)
+        self.assertEqual(indexed, graph_fact)
+        self.assertIs(get_indexed_cfg(indexed), indexed)
+        self.assertEqual(indexed.successors, {1: [2], 2: [3, 0], 3: [4], 4: [2]})
+        self.assertEqual(indexed.predecessors, {2: [1, 4], 3: [2], 0: [2], 4: [3]})
+        self.assertEqual(indexed.nodes_by_type, {'assign': [1, 3, 4], 'if': [], 'while': [2], 'skip': []})
+        self.assertEqual(indexed.decision_nodes, [2])
+        self.assertEqual(indexed.definitions, {'n': [1, 3], 'x': [4]})
+
+        # functions give the same result on the indexed graph
+        graph_complex = AstToCfgConverter(GeneratorAstTree.complex_sequence()).get_cfg_graph()
+        for graph in (graph_fact, graph_complex):
+            indexed = IndexedCfg(graph)
+            self.assertEqual(get_all_var(indexed), get_all_var(graph))
+            self.assertEqual(get_all_def(indexed), get_all_def(graph))
+            self.assertEqual(get_all_conditions_from_graph(indexed), get_all_conditions_from_graph(graph))
+            for variable in set(get_all_var(graph)):
+                self.assertEqual(get_definition_for_variable(indexed, variable),
+                                 get_definition_for_variable(graph, variable))
+                self.assertEqual(get_utilization_for_variable(indexed, variable),
+                                 get_utilization_for_variable(graph, variable))
+            for node in list(graph) + [0]:
+                self.assertEqual(get_father_for_node(node, indexed), get_father_for_node(node, graph))
+                self.assertEqual(get_children(node, indexed), get_children(node, graph))
+
+    def test_reachability(self):
+        graph_fact = IndexedCfg({
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        })
+        self.assertEqual(graph_fact.get_reachable_nodes(1), [0, 2, 3, 4])
+        self.assertEqual(graph_fact.get_reachable_nodes(3), [0, 2, 3, 4])
+        self.assertEqual(graph_fact.get_reachable_nodes(0), [])
+        self.assertTrue(graph_fact.is_reachable(4, 4))
+        self.assertFalse(graph_fact.is_reachable(1, 1))
+        self.assertFalse(graph_fact.is_reachable(2, 1))
+        self.assertEqual(get_accessible_definition(graph_fact, 1, 'n'), [3])
+        self.assertEqual(get_accessible_utilization(graph_fact, 4, 'x'), [2])
+
+        # a long chain of loops, each loop reaching the following ones
+        graph_loops = {}
+        for i in range(1, 2001, 2):
+            graph_loops[i] = ['while', [[('<', ['x', i])]], [i + 1, i + 2]]
+            graph_loops[i + 1] = ['assign', {'x': 'x+1'}, [i]]
+        graph_loops[2001] = ['assign', {'y': 'x'}, [0]]
+        indexed = IndexedCfg(graph_loops)
+        self.assertEqual(indexed.get_reachable_nodes(1), [0] + list(range(1, 2002)))
+        self.assertEqual(indexed.get_reachable_nodes(1999), [0] + list(range(1999, 2002)))
+        self.assertEqual(get_children(5, indexed), get_children(5, graph_loops))
+
+    def test_solve_constraints(self):
+        # both backends give a solution, only the native one finds values out of range(-50, 50)
+        constraints = [integer_solver.parse_constraint(text) for text in ['x1 <= 0', 'x2 == 0 - x1', 'x2 == 1']]
+        for backend in BACKENDS:
+            self.assertEqual(solve_constraints(constraints, ['x1', 'x2'], backend), {'x1': -1, 'x2': 1})
+        constraints = [integer_solver.parse_constraint('x1 > 1000')]
+        self.assertEqual(solve_constraints(constraints, ['x1'], 'native'), {'x1': 1001})
+        # out of the values tried by python-constraint: not found, but not proved to be infeasible
+        self.assertIs(solve_constraints(constraints, ['x1'], 'constraint'), integer_solver.UNKNOWN)
+        self.assertRaises(ValueError, solve_constraints, constraints, ['x1'], 'other')
+
+    def test_path_search(self):
+        graph = {
+            1: ['assign', {'n': '0'}, [2]],
+            2: ['while', [[('<', ['n', 'x'])]], [3, 4]],
+            3: ['assign', {'n': 'n+1'}, [2]],
+            4: ['if', [[('==', ['n', 3])]], [5, 0]],
+            5: ['skip', [0]]
+        }
+        # the shortest path [1, 2, 4, 5] can not reach step 5: the loop has to be done 3 times
+        search = PathSearch(graph)
+        self.assertEqual(search.find_path(5), ([1, 2, 3, 2, 3, 2, 3, 2, 4, 5], {'x': 3}))
+        self.assertIn((1, 2, 4, 5), search.infeasible)
+        self.assertEqual(generate_value_from_node(graph, 5), {'x': 3})
+        self.assertEqual(search.find_path(0), ([1, 2, 4, 0], {'x': 0}))
+        # no values for the path reaching the node (its last step is not a decision): no path is found
+        search = PathSearch({1: ['assign', {'y': 'x'}, [2]], 2: ['skip', [0]]})
+        search.infeasible.add((1, 2))
+        self.assertIsNone(search.find_path(2))
+
+        # step 3 is unreachable (see interval_analysis)
+        graph = {
+            1: ['assign', {'x': '1'}, [2]],
+            2: ['if', [[('>', ['x', 2])]], [3, 0]],
+            3: ['skip', [0]]
+        }
+        self.assertIsNone(PathSearch(graph).find_path(3))
+        self.assertEqual(generate_value_from_node(graph, 3), {})
+
+    def test_generate_value(self):
         graph_prog = {
             1: ['if', [[('<=', ["x", 0])]], [2, 3]],
             2: ['assign', {'x': '0-x'}, [4]],
@@ -454,25 +671,157 @@ class TestProcessCfgMethods(unittest.TestCase):
             5: ['assign', {'x': '1'}, [0]],
             6: ['assign', {'x': 'x+1'}, [0]]
         }
-        result = path_to_node(6, graph_prog)
-        expected = [6, 4, 2, 1]
-        self.assertEqual(result, expected)
 
-        result = path_to_node(3, graph_prog)
-        expected = [3, 1]
-        self.assertEqual(result, expected)
+        result = generate_value_from_node(graph_prog, 5)
+        # print(result)
+        self.assertTrue(result['x'] == -1)
+
+        result = generate_value_from_node(graph_prog, 6)
+        self.assertTrue(result['x'] != -1)
+
 
+class TestAnalysisCoverageMethods(unittest.TestCase):
+    def assertSameState(self, state, other):
+        # private attributes are computed from the graph only
+        self.assertEqual({key: value for key, value in vars(state).items() if not key.startswith('_')},
+                         {key: value for key, value in vars(other).items() if not key.startswith('_')})
+
+    def test_record_traces(self):
         graph_fact = {
             1: ['assign', {'n': '1'}, [2]],
             2: ['while', [[('>=', ['x', 1])]], [3, 0]],
             3: ['assign', {'n': 'n*x'}, [4]],
             4: ['assign', {'x': 'x-1'}, [2]]
         }
-        result = path_to_node(4, graph_fact)
-        expected = [4, 3, 2, 1]
+        values = [{'x': 2}, {'x': 0}]
+        traces = record_traces(graph_fact, values)
+        # test values are left untouched
+        self.assertEqual(values, [{'x': 2}, {'x': 0}])
+        self.assertEqual(traces[0], ([1, 2, 3, 4, 2, 3, 4, 2, 0], {2: [False]}))
+        self.assertEqual(traces[1], ([1, 2, 0], {2: [False]}))
+
+    def test_coverage_state(self):
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        state = calc_coverage_state(graph_fact, [{'x': 2}, {'x': 0}])
+        self.assertEqual(state.nb_tests, 2)
+        self.assertEqual(state.visits, {1: 2, 2: 4, 3: 2, 4: 2, 0: 2})
+        self.assertEqual(state.decisions, {(2, 3), (2, 0)})
+        self.assertEqual(state.conditions, {(2, 0, False)})
+        self.assertEqual(state.k_paths, {(1, 2, 3, 4), (1, 2, 0)})
+        self.assertEqual(state.loops, {3: 2})
+        self.assertEqual(state.du_pairs, {(1, 'n', 3), (3, 'n', 3), (4, 'x', 2), (4, 'x', 3), (4, 'x', 4)})
+        self.assertTrue(all_affectations(state, graph_fact, False))
+        self.assertTrue(all_definitions(state, graph_fact, False))
+        self.assertFalse(all_i_loops(state, graph_fact, 1, False))
+        self.assertFalse(all_affectations(calc_coverage_state(graph_fact, [{'x': 0}]), graph_fact, False))
+
+        # merging the states of two shards gives the state of all tests
+        merged = calc_coverage_state(graph_fact, [{'x': 2}]).merge(calc_coverage_state(graph_fact, [{'x': 0}]))
+        self.assertSameState(merged, state)
+
+        values = [{'x': x} for x in range(-2, 5)]
+        parallel = calc_coverage_state_parallel(graph_fact, values, 2)
+        self.assertSameState(parallel, calc_coverage_state(graph_fact, values))
+        self.assertTrue(all_i_loops(parallel, graph_fact, 1, False))
+
+    def test_streaming_coverage(self):
+        graph_if = {
+            1: ['if', [[('<=', ['x', 0])]], [2, 3]],
+            2: ['assign', {'y': 'x'}, [4]],
+            3: ['assign', {'y': '0-x'}, [4]],
+            4: ['assign', {'x': 'y*2'}, [0]]
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as file:
+            file.write("x:-1,y:2\nx:0\n\nx:1\n")
+        try:
+            values = iter_test_file(file.name)
+            self.assertEqual(next(values), {'x': -1, 'y': 2})
+            self.assertEqual(list(values), [{'x': 0}, {'x': 1}])
+        finally:
+            os.remove(file.name)
+
+        # an infinite generator of test values: processing stops once every criterion is covered
+        def endless_values():
+            x = -3
+            while True:
+                yield {'x': x}
+                x = x + 1 if x < 3 else -3
+
+        state = calc_coverage_state(graph_if, endless_values(), stop_when_covered=True)
+        self.assertEqual(state.nb_tests, analysis_coverage.CHECK_INTERVAL)
+        self.assertTrue(all(analysis_coverage.run_criteria(state, graph_if, False)))
+
+        # the objectives checked while tests are processed agree with run_criteria, test after test
+        graph_loop = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 5]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]],
+            5: ['if', [[('==', ['n', 2]), ('<', ['x', 0])]], [6, 0]],
+            6: ['skip', [0]]
+        }
+        for graph in (graph_if, graph_loop):
+            objectives = analysis_coverage.CoverageObjectives(graph)
+            state = analysis_coverage.CoverageState(graph)
+            for x in [3, 0, -2, 1, 2, -1, 5]:
+                path, info_cond = record_traces(graph, [{'x': x}])[0]
+                state.add_trace(path, info_cond)
+                self.assertEqual(objectives.is_covered(state), all(analysis_coverage.run_criteria(state, graph, False)))
+
+    def test_save_load_coverage_state(self):
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        graph_other = dict(graph_fact)
+        graph_other[1] = ['assign', {'n': '2'}, [2]]
+        self.assertEqual(get_graph_hash(graph_fact), get_graph_hash(dict(reversed(list(graph_fact.items())))))
+        self.assertNotEqual(get_graph_hash(graph_fact), get_graph_hash(graph_other))
+
+        state = calc_coverage_state(graph_fact, [{'x': 2}, {'x': 0}])
+        file_state = tempfile.NamedTemporaryFile(suffix='.cov', delete=False)
+        file_state.close()
+        try:
+            save_coverage_state(state, file_state.name)
+            loaded = load_coverage_state(file_state.name, graph_fact)
+            self.assertSameState(loaded, state)
+            with self.assertRaises(ValueError):
+                load_coverage_state(file_state.name, graph_other)
+
+            # extending a loaded state gives the state of all tests
+            extended = calc_coverage_state(graph_fact, [{'x': 3}], state=loaded)
+            self.assertSameState(extended, calc_coverage_state(graph_fact, [{'x': 2}, {'x': 0}, {'x': 3}]))
+
+            # a state written before the format had a version (def-use coverage in 'def_use')
+            with gzip.open(file_state.name, 'rt', encoding='utf-8') as file:
+                data = json.load(file)
+            del data['version'], data['du_pairs'], data['du_paths']
+            data['def_use'] = []
+            with gzip.open(file_state.name, 'wt', encoding='utf-8') as file:
+                json.dump(data, file)
+            with self.assertRaisesRegex(ValueError, 'format version 1'):
+                load_coverage_state(file_state.name, graph_fact)
+        finally:
+            os.remove(file_state.name)
+
+        with self.assertRaises(ValueError):
+            state.merge(calc_coverage_state(graph_other, [{'x': 0}]))
+
+
+class TestCfgCompiler(unittest.TestCase):
+    def test_bool_expression_source(self):
+        result = bool_expression_source([[('<=', ['x', 0]), ('>', ['y', 2])], [('==', ['y', 3])]])
+        expected = "((v['x'] <= 0) or (v['y'] > 2)) and ((v['y'] == 3))"
         self.assertEqual(result, expected)
 
-    def test_detailed_steps_path(self):
+    def test_process_value_test(self):
         graph_prog = {
             1: ['if', [[('<=', ["x", 0])]], [2, 3]],
             2: ['assign', {'x': '0-x'}, [4]],
@@ -481,43 +830,459 @@ class TestProcessCfgMethods(unittest.TestCase):
             5: ['assign', {'x': '1'}, [0]],
             6: ['assign', {'x': 'x+1'}, [0]]
         }
-        result = detailed_steps_path(path_to_node(3, graph_prog), graph_prog)
-        expected = {
-            1: [[[('<=', ["x", 0])]], False],
-            3: {'x': '1-x'}
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1]), ('==', ['n', 0])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
         }
-        self.assertEqual(result, expected)
+        for graph in (graph_prog, graph_fact):
+            compiled = CompiledCfg(graph)
+            for x in range(-3, 6):
+                expected = process_value_test(graph, {'x': x}, info_conditions=True)
+                result = compiled.process_value_test({'x': x}, info_conditions=True)
+                self.assertEqual(result, expected)
 
-        result = detailed_steps_path(path_to_node(5, graph_prog), graph_prog)
-        expected = {
-            1: [[[('<=', ["x", 0])]], True],
-            2: {'x': '0-x'},
-            4: [[[('==', ["x", 1])]], True],
-            5: {'x': '1'}
-        }
-        self.assertEqual(result, expected)
+        graph_loop = {1: ['while', [[('>=', ['x', 1])]], [2, 0]], 2: ['skip', [1]]}
+        self.assertRaises(ValueError, CompiledCfg(graph_loop).process_value_test, {'x': 1})
 
+
+@unittest.skipIf(batch_interpreter.np is None, "numpy is not installed")
+class TestBatchInterpreter(unittest.TestCase):
+    def test_process_values_tests(self):
         graph_fact = {
             1: ['assign', {'n': '1'}, [2]],
             2: ['while', [[('>=', ['x', 1])]], [3, 0]],
             3: ['assign', {'n': 'n*x'}, [4]],
             4: ['assign', {'x': 'x-1'}, [2]]
         }
-        result = detailed_steps_path(path_to_node(3, graph_fact), graph_fact)
-        expected = {
-            1: {'n': '1'},
-            2: [[[('>=', ['x', 1])]], True],
-            3: {'n': 'n*x'}
+        graph_if = {
+            1: ['if', [[('<=', ['x', 0]), ('>', ['y', 2])], [('!=', ['y', 'x'])]], [2, 3]],
+            2: ['assign', {'y': 'x*x*x'}, [3]],
+            3: ['skip', [0]]
         }
-        self.assertEqual(result, expected)
+        values = [{'x': x, 'y': y} for x in range(-3, 6) for y in range(-1, 4)]
+        # 30! and (10**7)**3 do not fit in 64 bits integers
+        values_fact = values + [{'x': 30, 'y': 0}]
+        values_if = values + [{'x': -10 ** 7, 'y': 3}, {'x': 2 ** 70, 'y': 1}]
+        for graph, values in ((graph_fact, values_fact), (graph_if, values_if)):
+            expected = [process_value_test(graph, value.copy(), info_conditions=True) for value in values]
+            result = batch_interpreter.BatchCfg(graph).process_values_tests(values, info_conditions=True)
+            self.assertEqual(result, expected)
+
+        graph_loop = {1: ['while', [[('>=', ['x', 1])]], [2, 0]], 2: ['skip', [1]]}
+        self.assertRaises(ValueError, batch_interpreter.BatchCfg(graph_loop).process_values_tests, [{'x': 1}])
+
+        # only the looping row raises, once the traces of the previous rows are yielded
+        values = [{'x': 0}, {'x': -1}, {'x': 1}, {'x': 0}]
+        for batch in (False, True):
+            traces = analysis_coverage.iter_traces(graph_loop, values, batch)
+            self.assertEqual([next(traces), next(traces)], [([1, 0], {1: [False]})] * 2)
+            self.assertRaises(ValueError, next, traces)
+
+
+class TestParserMethods(unittest.TestCase):
+    def test_tokenize(self):
+        tokens = my_parser.tokenize(["if ( X <= 0 )", "then ( X := -X )"])
+        self.assertEqual(tokens[:4], [['keyword', 'if', 1], ['separator', '(', 1], ['identifier', 'x', 1],
+                                      ['comparator', '<=', 1]])
+        self.assertEqual(tokens[-4:], [['keyword', ':=', 2], ['operator', '-', 2], ['identifier', 'x', 2],
+                                       ['separator', ')', 2]])
+        with self.assertRaises(SyntaxError):
+            my_parser.tokenize_line("x := y % 2")
+
+    def test_parse_sources(self):
+        for name in ("prog_1", "fact"):
+            tree = my_parser.parse("sources_txt/" + name + ".txt")
+            expected_tree = GeneratorAstTree.get_ast_from_name(name)
+            self.assertEqual(AstToCfgConverter(tree).get_cfg_graph(), AstToCfgConverter(expected_tree).get_cfg_graph())
+
+    def test_parse_text(self):
+        tree = my_parser.parse_text("y := -(x - 2) * 3 + 1; z := -4")
+        self.assertEqual(AstToCfgConverter.treat_assign_node(tree.children[0]), {'y': '((0-(x-2))*3)+1'})
+        self.assertEqual(tree.children[1].children[1].data, -4)
+
+        # conditions are put in CNF form
+        tree = my_parser.parse_text("if not (x < 1 or y = 3 and z > 0) then x := 1 else x := 2")
+        condition = AstToCfgConverter.treat_composed_boolean_expr(tree.children[0].children[0])
+        self.assertEqual(condition, [[('>=', ['x', 1])], [('!=', ['y', 3]), ('<=', ['z', 0])]])
+
+        # a condition between parentheses can start with not
+        tree = my_parser.parse_text("if (not x < 1 and y = 3) then (x := 1) else (x := 2)")
+        condition = AstToCfgConverter.treat_composed_boolean_expr(tree.children[0].children[0])
+        self.assertEqual(condition, [[('>=', ['x', 1])], [('==', ['y', 3])]])
+
+        tree = my_parser.parse_text("while (x + 1) * 2 < y do { x := x + 1 }")
+        self.assertEqual(AstToCfgConverter.treat_condition(tree.children[0].children[0]), ['<', ['(x+1)*2', 'y']])
+
+        with self.assertRaises(SyntaxError):
+            my_parser.parse_text("if x < 1 then x := 1")
+        with self.assertRaises(SyntaxError):
+            my_parser.parse_text("while x < 1 x := x + 1")
+
+    def test_parse_large(self):
+        # long chains of 'and' / 'or', and deeply nested statements, are parsed without recursion
+        size = 3000
+        conjunction = " and ".join("x%d < %d" % (index, index) for index in range(size))
+        disjunction = " or ".join("x%d < %d" % (index, index) for index in range(size))
+        tree = my_parser.parse_text("if " + conjunction + " then x := 1 else x := 2; if " + disjunction +
+                                    " then x := 1 else x := 2\n" + "if x < 1 then " * size + "x := 1" +
+                                    " else x := 2" * size + "; while x < 1 do { " * size + "x := 1" + " }" * size)
+        self.assertEqual(len(tree.children), 4)
+        self.assertEqual(len(tree.children[0].children[0].children), size)
+        self.assertEqual(len(tree.children[1].children[0].children), size)
+        graph = AstToCfgConverter(tree).get_cfg_graph()
+        self.assertEqual(len(graph), 3 * size + 8)
+        self.assertEqual(len(graph[1][1]), size)
+        self.assertEqual(graph[4][1], [[('<', ['x%d' % index, index]) for index in range(size)]])
+
+
+class TestProgramCache(unittest.TestCase):
+    def test_load_program(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_directory = os.path.join(directory, 'cache')
+            path_program = os.path.join(directory, 'fact.txt')
+            with open("sources_txt/fact.txt") as file:
+                source = file.read()
+            with open(path_program, 'w') as file:
+                file.write(source)
+
+            program = program_cache.load_program(path_program, cache_directory)
+            self.assertEqual(program['cfg'], program_cache.build_program(source)['cfg'])
+            self.assertEqual(program['metadata']['variables'], ['n', 'x'])
+            self.assertEqual(program['metadata']['graph_hash'], get_graph_hash(program['cfg']))
+            self.assertEqual(len(os.listdir(cache_directory)), 1)
+
+            # the second time, the program is read from the cache
+            original_build_program = program_cache.build_program
+            program_cache.build_program = None
+            try:
+                cached_program = program_cache.load_program(path_program, cache_directory)
+            finally:
+                program_cache.build_program = original_build_program
+            self.assertEqual(cached_program['cfg'], program['cfg'])
+            self.assertIsInstance(cached_program['cfg'], IndexedCfg)
+            self.assertEqual(cached_program['metadata'], program['metadata'])
+            self.assertEqual(AstToCfgConverter(cached_program['ast']).get_cfg_graph(), program['cfg'])
+
+            # the cache only holds json: an unreadable file is ignored, and written again
+            path_cache = os.path.join(cache_directory, os.listdir(cache_directory)[0])
+            self.assertTrue(path_cache.endswith('.json'))
+            with open(path_cache, 'wb') as file:
+                file.write(b'\x80\x04not json')
+            self.assertEqual(program_cache.load_program(path_program, cache_directory)['cfg'], program['cfg'])
+            with open(path_cache) as file:
+                self.assertEqual(program_cache.decode_program(json.load(file))['cfg'], program['cfg'])
+
+            # a modified program is parsed again
+            with open(path_program, 'a') as file:
+                file.write("x := n\n")
+            self.assertNotEqual(program_cache.load_program(path_program, cache_directory)['cfg'], program['cfg'])
+            self.assertEqual(len(os.listdir(cache_directory)), 2)
+
+        # a deeply nested tree is written and read without recursion
+        tree = my_parser.parse_text("if x < 1 then " * 3000 + "x := 1" + " else x := 2" * 3000)
+        nodes = json.loads(json.dumps(program_cache.encode_tree(tree)))
+        self.assertEqual(AstToCfgConverter(program_cache.decode_tree(nodes)).get_cfg_graph(),
+                         AstToCfgConverter(tree).get_cfg_graph())
+
+
+class TestDataflow(unittest.TestCase):
+    def test_used_and_defined_variables(self):
+        self.assertEqual(dataflow.get_used_variables(['assign', {'x': 'x+y*x'}, [0]]), ['x', 'y'])
+        self.assertEqual(dataflow.get_used_variables(['if', [[('<=', ['x', 0]), ('>', ['z', 'y'])]], [2, 3]]),
+                         ['x', 'z', 'y'])
+        self.assertEqual(dataflow.get_defined_variables(['assign', {'x': '1'}, [0]]), ['x'])
+        self.assertEqual(dataflow.get_defined_variables(['skip', [0]]), [])
+
+    def test_def_use(self):
+        graph_prog = {
+            1: ['if', [[('<=', ["x", 0])]], [2, 3]],
+            2: ['assign', {'x': '0-x'}, [4]],
+            3: ['assign', {'x': '1-x'}, [4]],
+            4: ['if', [[('==', ["x", 1])]], [5, 6]],
+            5: ['assign', {'x': '1'}, [0]],
+            6: ['assign', {'x': 'x+1'}, [0]]
+        }
+        def_use = dataflow.DefUse(graph_prog)
+        self.assertEqual(def_use.get_du_pairs(), [(2, 'x', 4), (2, 'x', 6), (3, 'x', 4), (3, 'x', 6)])
+        self.assertEqual(def_use.use_def[(4, 'x')], [2, 3])
+        # x is used at step 1 before any definition
+        self.assertEqual(def_use.use_def[(1, 'x')], [])
+        self.assertEqual(def_use.def_use[(5, 'x')], [])
+        self.assertEqual(def_use.get_du_paths(2, 'x', 6), [(2, 4, 6)])
+
+        # a redefinition kills the previous one
+        graph_kill = {
+            1: ['assign', {'x': '1'}, [2]],
+            2: ['assign', {'x': '2'}, [3]],
+            3: ['if', [[('>', ['x', 0])]], [0, 0]]
+        }
+        self.assertEqual(dataflow.DefUse(graph_kill).get_du_pairs(), [(2, 'x', 3)])
 
-    def test_transform_bool_expr_to_str(self):
-        result = transform_bool_expr_to_str([[('<=', ['x', 0]), ('>', ['y', 2])], [('<=', ['x', 0]), ('>', ['y', 2])]])
-        expected = '(x <= 0 or y > 2) and (x <= 0 or y > 2)'
-        self.assertEqual(result, expected)
+    def test_def_use_loop(self):
+        graph_fact = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        def_use = dataflow.get_def_use(get_indexed_cfg(graph_fact))
+        self.assertEqual(def_use.get_du_pairs(), [(1, 'n', 3), (3, 'n', 3), (4, 'x', 2), (4, 'x', 3), (4, 'x', 4)])
+        self.assertEqual(def_use.get_du_paths(3, 'n', 3), [(3, 4, 2, 3)])
+        self.assertEqual(def_use.get_du_paths(4, 'x', 4), [(4, 2, 3, 4)])
+
+        pairs, du_paths = def_use.get_covered([1, 2, 3, 4, 2, 3, 4, 2, 0])
+        self.assertEqual(pairs, set(def_use.get_du_pairs()))
+        self.assertEqual(du_paths, set(def_use.get_all_du_paths()))
+        pairs, du_paths = def_use.get_covered([1, 2, 0])
+        self.assertEqual(pairs, set())
+
+
+class TestIntervalAnalysis(unittest.TestCase):
+    def test_evaluate_and_refine(self):
+        state = {'x': (1, 5), 'y': (-2, 3)}
+        self.assertEqual(interval_analysis.evaluate('x+y', state), (-1, 8))
+        self.assertEqual(interval_analysis.evaluate('(0-x)*y', state), (-15, 10))
+        self.assertEqual(interval_analysis.evaluate('z', state), interval_analysis.TOP)
+        self.assertEqual(interval_analysis.evaluate(-3, state), (-3, -3))
+
+        self.assertEqual(interval_analysis.refine_comparison(state, ('<', ['x', 3])), {'x': (1, 2), 'y': (-2, 3)})
+        self.assertEqual(interval_analysis.refine_comparison(state, ('<', ['x', 3]), False),
+                         {'x': (3, 5), 'y': (-2, 3)})
+        self.assertEqual(interval_analysis.refine_comparison(state, ('>', ['x', 'y'])), state)
+        self.assertIsNone(interval_analysis.refine_comparison(state, ('==', ['x', 0])))
+        # (x <= 1 or y >= 3) and (x != 1)
+        condition = [[('<=', ['x', 1]), ('>=', ['y', 3])], [('!=', ['x', 1])]]
+        self.assertEqual(interval_analysis.refine_bool_expression(state, condition), {'x': (2, 5), 'y': (-2, 3)})
+
+    def test_unreachable_nodes(self):
+        graph = {
+            1: ['assign', {'n': '0'}, [2]],
+            2: ['while', [[('<', ['n', 10])]], [3, 4]],
+            3: ['assign', {'n': 'n+1'}, [2]],
+            4: ['if', [[('<', ['n', 5])]], [5, 6]],
+            5: ['assign', {'y': '1'}, [0]],
+            6: ['assign', {'y': '2'}, [0]]
+        }
+        analysis = interval_analysis.IntervalAnalysis(graph)
+        self.assertEqual(analysis.get_interval(2, 'n'), (0, 10))
+        self.assertEqual(analysis.get_interval(4, 'n'), (10, 10))
+        self.assertEqual(analysis.get_unreachable_nodes(), [5])
+        self.assertEqual(analysis.get_infeasible_decisions(), [(4, 5)])
+
+        # the infeasible decision is not required by the criteria
+        state = calc_coverage_state(graph, [{}, {}])
+        self.assertTrue(all_affectations(state, graph, False))
+        self.assertTrue(analysis_coverage.all_decisions(state, graph, False))
+
+    def test_reachable_nodes(self):
+        graph_prog = {
+            1: ['if', [[('<=', ["x", 0])]], [2, 3]],
+            2: ['assign', {'x': '0-x'}, [4]],
+            3: ['assign', {'x': '1-x'}, [4]],
+            4: ['if', [[('==', ["x", 1])]], [5, 6]],
+            5: ['assign', {'x': '1'}, [0]],
+            6: ['assign', {'x': 'x+1'}, [0]]
+        }
+        analysis = interval_analysis.get_interval_analysis(get_indexed_cfg(graph_prog))
+        self.assertEqual(analysis.get_unreachable_nodes(), [])
+        self.assertEqual(analysis.get_interval(2, 'x'), (-interval_analysis.INFINITY, 0))
+        self.assertEqual(analysis.get_interval(5, 'x'), (1, 1))
+        # x > 0 at step 3 gives x <= 0 at step 4: x == 1 is false
+        self.assertFalse(analysis.is_feasible_path([1, 3, 4, 5]))
+        self.assertTrue(analysis.is_feasible_path([1, 3, 4, 6, 0]))
+        self.assertFalse(analysis.is_feasible_path([1, 4]))
+
+
+class TestIntegerSolver(unittest.TestCase):
+    def test_parse_constraint(self):
+        self.assertEqual(integer_solver.parse_constraint('x2 = 0-x1'),
+                         ('cmp', '==', ('var', 'x2'), ('-', ('const', 0), ('var', 'x1'))))
+        self.assertEqual(integer_solver.parse_constraint('not ((x1 <= 0) and (y1 != 2))'),
+                         ('or', [('cmp', '>', ('var', 'x1'), ('const', 0)),
+                                 ('cmp', '==', ('var', 'y1'), ('const', 2))]))
+
+    def test_solve(self):
+        self.assertEqual(integer_solver.solve(['(x1 <= 0)', 'x2 = 0-x1', '(x2 == 1)']), {'x1': -1, 'x2': 1})
+        self.assertIsNone(integer_solver.solve(['not ((x1 <= 0))', 'x3 = 1-x1', '(x3 == 1)']))
+        self.assertEqual(integer_solver.solve(['(x1 <= 0 or y1 > 2) and (x1 > 5)', 'not (y1 < 10 and y1 > 3)']),
+                         {'x1': 6, 'y1': 10})
+        # products, and values far from 0
+        self.assertEqual(integer_solver.solve(['x * x == 49', 'x < 0']), {'x': -7})
+        self.assertEqual(integer_solver.solve(['x * y == 12', 'x > y', 'y > 1']), {'x': 6, 'y': 2})
+        # domains are not bounded: solutions beyond 2 ** 31 are found
+        self.assertEqual(integer_solver.solve(['x > 3000000000']), {'x': 3000000001})
+        self.assertEqual(integer_solver.solve(['x * y == -6000000000', 'y < 0 - 3000000000']),
+                         {'x': 1, 'y': -6000000000})
+        graph = {1: ['if', [[('>', ['x', 3000000000])]], [2, 0]], 2: ['skip', [0]]}
+        self.assertEqual(generate_value_from_path(graph, [1, 2]), {'x': 3000000001})
+
+        # a chain of 20 assignments, as in the predicate of a loop
+        constraints = ['x0 >= 7'] + ['x%d = x%d + 3' % (index + 1, index) for index in range(20)]
+        constraints += ['x20 * 2 == y0', 'y0 > 200']
+        solution = integer_solver.solve(constraints)
+        self.assertEqual(solution['x0'], 41)
+        self.assertEqual(solution['y0'], 202)
+
+    def test_limit(self):
+        # no solution, which only the search can tell: it stops after the limit, without knowing it
+        self.assertIs(integer_solver.solve(['x * x + y * y == 3'], limit_nodes=100), integer_solver.UNKNOWN)
+        self.assertIsNone(integer_solver.solve(['x * x + y * y == 3', 'x < 5', 'x > -5', 'y < 5', 'y > -5']))
+
+        # a solution (19601, 13860) exists, but too far to be found: the result is not kept as if there was none
+        constraints = [integer_solver.parse_constraint(text) for text in ['x * x - 2 * y * y == 1', 'y > 2400']]
+        cache = {}
+        limit_nodes = integer_solver.LIMIT_NODES
+        integer_solver.LIMIT_NODES = 200
+        try:
+            self.assertIs(solve_constraints(constraints, ['x', 'y'], 'native', cache), integer_solver.UNKNOWN)
+        finally:
+            integer_solver.LIMIT_NODES = limit_nodes
+        self.assertEqual(cache, {})
+        self.assertFalse(any(key[1] == tuple(predicates.freeze(constraint) for constraint in constraints)
+                             for key in symbolic_exec_tools._solved_groups))
+
+    def test_budget(self):
+        # no solution (3 is not a sum of two squares), which only the search can tell
+        budget = integer_solver.Budget(steps=50)
+        self.assertIs(integer_solver.solve(['x * x + y * y == 3'], budget=budget), integer_solver.UNKNOWN)
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(budget.spent, 51)
+        budget = integer_solver.Budget(seconds=0)
+        self.assertIs(integer_solver.solve(['x > 2'], budget=budget), integer_solver.UNKNOWN)
+        self.assertTrue(integer_solver.Budget(seconds=60, steps=10).spend(10))
+
+        # a result found with an exhausted budget is not kept in the cache
+        constraints = [integer_solver.parse_constraint(text) for text in ['x * x == 961', 'x < 0']]
+        cache = {}
+        for backend in BACKENDS:
+            self.assertIs(solve_constraints(constraints, ['x'], backend, cache, integer_solver.Budget(steps=2)),
+                          integer_solver.UNKNOWN)
+        self.assertEqual(cache, {})
+        self.assertEqual(solve_constraints(constraints, ['x'], 'native', cache), {'x': -31})
+        self.assertEqual(solve_constraints(constraints, ['x'], 'constraint', cache), {'x': -31})
+        self.assertEqual(len(cache), 2)
+
+    def test_solve_in_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        graph = {
+            1: ['assign', {'n': '0'}, [2]],
+            2: ['while', [[('<', ['n', 'x'])]], [3, 4]],
+            3: ['assign', {'n': 'n+1'}, [2]],
+            4: ['if', [[('==', ['n', 'y'])]], [5, 0]],
+            5: ['skip', [0]]
+        }
+        paths = [[1] + [2, 3] * turns + [2, 4, 5] for turns in range(20)]
+        expected = [{'x': turns, 'y': turns} for turns in range(20)]
+        # solvings running at the same time do not stop each other
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(executor.map(lambda path: generate_value_from_path(graph, path), paths)), expected)
+
+
+class TestPredicates(unittest.TestCase):
+    graph_prog = {
+        1: ['if', [[('<=', ["x", 0])]], [2, 3]],
+        2: ['assign', {'x': '0-x'}, [4]],
+        3: ['assign', {'x': '1-x'}, [4]],
+        4: ['if', [[('==', ["x", 1])]], [5, 6]],
+        5: ['assign', {'x': '1'}, [0]],
+        6: ['assign', {'x': 'x+1'}, [0]]
+    }
 
     def test_path_predicate(self):
-        # todo: avec graph_fact
+        predicate = predicates.PathPredicate(self.graph_prog, [1, 2, 4, 5])
+        self.assertEqual(predicate.constraints, [
+            ('and', [('or', [('cmp', '<=', ('var', ('x', 0)), ('const', 0))])]),
+            ('cmp', '==', ('var', ('x', 1)), ('-', ('const', 0), ('var', ('x', 0)))),
+            ('and', [('or', [('cmp', '==', ('var', ('x', 1)), ('const', 1))])]),
+        ])
+        self.assertEqual(predicate.inputs, ['x'])
+        self.assertEqual(predicate.get_variables(), [('x', 0), ('x', 1)])
+        self.assertTrue(predicate.is_satisfied({'x': -1}))
+        self.assertFalse(predicate.is_satisfied({'x': 1}))
+        self.assertRaises(ValueError, predicates.PathPredicate, self.graph_prog, [1, 4])
+
+    def test_push_pop(self):
+        predicate = predicates.PathPredicate(self.graph_prog, [1, 2])
+        predicate.push(4)
+        predicate.push(5)
+        expected = predicates.PathPredicate(self.graph_prog, [1, 2, 4, 5])
+        self.assertEqual((predicate.path, predicate.constraints), (expected.path, expected.constraints))
+        predicate.pop()
+        predicate.pop()
+        predicate.pop()
+        predicate.push(3)
+        predicate.push(4)
+        expected = predicates.PathPredicate(self.graph_prog, [1, 3, 4])
+        self.assertEqual((predicate.path, predicate.constraints, predicate.versions, predicate.definitions),
+                         (expected.path, expected.constraints, expected.versions, expected.definitions))
+        self.assertRaises(ValueError, predicate.push, 2)
+
+    def test_negate(self):
+        constraint = predicates.get_condition([[('<=', ['x', 0]), ('>', ['y', 2])]], {'y': 1}, False)
+        self.assertEqual(constraint, ('or', [('and', [('cmp', '>', ('var', ('x', 0)), ('const', 0)),
+                                                      ('cmp', '<=', ('var', ('y', 1)), ('const', 2))])]))
+        self.assertTrue(predicates.is_satisfied(constraint, {('x', 0): 1, ('y', 1): 2}))
+        self.assertFalse(predicates.is_satisfied(constraint, {('x', 0): 1, ('y', 1): 3}))
+
+    def test_eliminate_equalities(self):
+        predicate = predicates.PathPredicate(self.graph_prog, [1, 2, 4, 5, 0])
+        constraints, definitions = predicates.eliminate_equalities(predicate.constraints)
+        # only the value given to the program is left
+        self.assertEqual(constraints, [('cmp', '<=', ('var', ('x', 0)), ('const', 0)),
+                                       ('cmp', '==', ('-', ('const', 0), ('var', ('x', 0))), ('const', 1))])
+        self.assertEqual(definitions, {('x', 1): ('-', ('const', 0), ('var', ('x', 0))), ('x', 2): ('const', 1)})
+        self.assertEqual(predicates.complete({('x', 0): -1}, definitions), {('x', 0): -1, ('x', 1): 1, ('x', 2): 1})
+
+        # x1 == 5 gives y0 == 3 by substitution, so y0 == 4 becomes a false comparison between constants
+        constraints = [integer_solver.parse_constraint('x1 == y0 + 2'), integer_solver.parse_constraint('x1 == 5'),
+                       integer_solver.parse_constraint('y0 == 4')]
+        self.assertEqual(predicates.eliminate_equalities(constraints)[0], [predicates.FALSE])
+
+    def test_split_independent(self):
+        constraints = [integer_solver.parse_constraint(text) for text in
+                       ['x0 > 2', 'y0 < x1', 'z0 == 3 or z0 == 4', 'x1 > y0 - 3', '1 > 2']]
+        groups = predicates.split_independent(constraints, [('x0'), ('y0'), ('z0'), ('w0')])
+        self.assertEqual([variables for _, variables in groups], [['x0'], ['y0', 'x1'], ['z0'], ['w0'], []])
+        self.assertEqual(groups[1][0], [constraints[1], constraints[3]])
+        self.assertEqual(groups[4][0], [constraints[4]])
+
+        # the conditions on x and on y of the program are independent
+        graph = {
+            1: ['if', [[('<=', ['x', 0])], [('>', ['y', 2])]], [2, 3]],
+            2: ['assign', {'x': 'x+y'}, [0]],
+            3: ['skip', [0]]
+        }
+        predicate = predicates.PathPredicate(graph, [1, 2])
+        groups = predicates.split_independent(predicate.constraints, predicate.get_variables())
+        self.assertEqual([variables for _, variables in groups], [[('x', 0)], [('y', 0)]])
+        self.assertEqual(solve_predicate(predicate), {'x': 0, 'y': 3})
+
+    def test_solve_predicate(self):
+        predicate = predicates.PathPredicate(self.graph_prog, [1, 2, 4, 5])
+        self.assertEqual(solve_predicate(predicate, 'native'), {'x': -1})
+        self.assertEqual(solve_predicate(predicate, 'constraint'), {'x': -1})
+        self.assertIsNone(solve_predicate(predicates.PathPredicate(self.graph_prog, [1, 3, 4, 5])))
+
+    def test_predicate_cache(self):
+        cache = {}
+        # the last assignment changes nothing to the predicate: it is solved once
+        self.assertEqual(generate_value_from_path(self.graph_prog, [1, 2, 4, 5], cache), {'x': -1})
+        self.assertEqual(generate_value_from_path(self.graph_prog, [1, 2, 4, 5, 0], cache), {'x': -1})
+        self.assertIsNone(generate_value_from_path(self.graph_prog, [1, 3, 4, 5], cache))
+        self.assertEqual(len(cache), 2)
+
+        # the same constraints on other variables, in another order
+        constraints = [integer_solver.parse_constraint(text) for text in ['y < 3', 'y * y == 16']]
+        self.assertEqual(solve_constraints(constraints, ['y'], 'native', cache), {'y': -4})
+        constraints = [integer_solver.parse_constraint(text) for text in ['z * z == 16', 'z < 3']]
+        self.assertEqual(solve_constraints(constraints, ['z'], 'native', cache), {'z': -4})
+        self.assertEqual(len(cache), 3)
+
+
+class TestSymbolicExplorer(unittest.TestCase):
+    def test_explore(self):
         graph_prog = {
             1: ['if', [[('<=', ["x", 0])]], [2, 3]],
             2: ['assign', {'x': '0-x'}, [4]],
@@ -526,29 +1291,60 @@ class TestProcessCfgMethods(unittest.TestCase):
             5: ['assign', {'x': '1'}, [0]],
             6: ['assign', {'x': 'x+1'}, [0]]
         }
+        explorer = SymbolicExplorer(graph_prog)
+        self.assertEqual(list(explorer.explore(10)), [([1, 2, 4, 5, 0], {'x': -1}), ([1, 2, 4, 6, 0], {'x': 0}),
+                                                     ([1, 3, 4, 6, 0], {'x': 1})])
+        self.assertEqual(explorer.infeasible_prefixes, [[1, 3, 4, 5]])
+        # [1, 2, 4, 6] and [1, 3, 4, 6] are taken by the values of their parent paths: no solving
+        self.assertEqual(explorer.solver_calls, 4)
+        self.assertEqual([path for path, _ in explorer.explore(3)], [[1, 2, 4], [1, 3, 4]])
+
+        # the budget is exhausted from the start: every path needing the solver is cut, without being infeasible
+        graph = {
+            1: ['if', [[('<=', ['x', 17])]], [2, 0]],
+            2: ['skip', [0]]
+        }
+        explorer = SymbolicExplorer(graph, budget=integer_solver.Budget(steps=0))
+        self.assertEqual(list(explorer.explore(10)), [])
+        self.assertEqual(explorer.unknown_prefixes, [[1, 2], [1, 0]])
+        self.assertEqual(explorer.infeasible_prefixes, [])
 
-        to_node_five = path_to_node(5, graph_prog)
-        detailed_path = detailed_steps_path(to_node_five, graph_prog)
-        result = path_predicate(detailed_path, graph_prog)
-        expected = ['(x1 <= 0)', 'x2 = 0-x1', '(x4 == 1)']
-        self.assertEqual(result, expected)
-
-        to_node_three = path_to_node(3, graph_prog)
-        detailed_path = detailed_steps_path(to_node_three, graph_prog)
-        result = path_predicate(detailed_path, graph_prog)
-        expected = ['not ((x1 <= 0))']
-        self.assertEqual(result, expected)
-
-    def test_solve_path_predicate(self):
-        data_input = ['(x1 <= 0)', 'x2 = 0-x1', '(x4 == 1)']
-        result = solve_path_predicate(data_input)
-        self.assertTrue(result['x1'] == -1)
-
-        data_input = ['not ((x1 <= 0))']
-        result = solve_path_predicate(data_input)
-        self.assertTrue(result['x1'] >= 0)
-
-    def test_generate_value(self):
+    def test_explore_loop(self):
+        graph = {
+            1: ['assign', {'n': '1'}, [2]],
+            2: ['while', [[('>=', ['x', 1])]], [3, 0]],
+            3: ['assign', {'n': 'n*x'}, [4]],
+            4: ['assign', {'x': 'x-1'}, [2]]
+        }
+        explorer = SymbolicExplorer(graph)
+        results = list(explorer.explore(9))
+        self.assertEqual(results, [([1, 2, 3, 4, 2, 3, 4, 2, 3], {'x': 3}), ([1, 2, 3, 4, 2, 3, 4, 2, 0], {'x': 2}),
+                                   ([1, 2, 3, 4, 2, 0], {'x': 1}), ([1, 2, 0], {'x': 0})])
+        self.assertEqual(explorer.infeasible_prefixes, [])
+
+    def test_explore_unknown(self):
+        # no value takes step 2 (3 is not a sum of two squares), which the solver can not tell within its limit
+        graph = {
+            1: ['if', [[('==', ['x*x+y*y', 3])]], [2, 0]],
+            2: ['skip', [0]]
+        }
+        limit_nodes = integer_solver.LIMIT_NODES
+        integer_solver.LIMIT_NODES = 100
+        try:
+            explorer = SymbolicExplorer(graph)
+            self.assertEqual(list(explorer.explore(5)), [([1, 0], {'x': 0, 'y': 0})])
+            search = PathSearch(graph)
+            self.assertIsNone(search.find_path(2))
+        finally:
+            integer_solver.LIMIT_NODES = limit_nodes
+        # the prefix is not known to be infeasible
+        self.assertEqual(explorer.infeasible_prefixes, [])
+        self.assertEqual(explorer.unknown_prefixes, [[1, 2]])
+        self.assertNotIn((1, 2), search.infeasible)
+
+
+class TestConcolic(unittest.TestCase):
+    def test_concolic_tests(self):
         graph_prog = {
             1: ['if', [[('<=', ["x", 0])]], [2, 3]],
             2: ['assign', {'x': '0-x'}, [4]],
@@ -557,13 +1353,55 @@ class TestProcessCfgMethods(unittest.TestCase):
             5: ['assign', {'x': '1'}, [0]],
             6: ['assign', {'x': 'x+1'}, [0]]
         }
-
-        result = generate_value_from_node(graph_prog, 5)
-        # print(result)
-        self.assertTrue(result['x'] == -1)
-
-        result = generate_value_from_node(graph_prog, 6)
-        self.assertTrue(result['x'] != -1)
+        # x == 1 at step 4 is never true after step 3: the run stops when no branch can be flipped
+        self.assertEqual(concolic.concolic_tests(graph_prog), [{'x': 0}, {'x': 1}, {'x': -1}])
+        self.assertEqual(concolic.concolic_tests(graph_prog, {'x': 5}, limit_runs=1), [{'x': 5}])
+
+    def test_concolic_loop(self):
+        graph = {
+            1: ['assign', {'n': '0'}, [2]],
+            2: ['while', [[('<', ['n', 'x'])]], [3, 4]],
+            3: ['assign', {'n': 'n+1'}, [2]],
+            4: ['if', [[('==', ['y', 'n*7'])]], [5, 0]],
+            5: ['skip', [0]]
+        }
+        # the less taken branches first: y == n*7 false, then true after a turn of the loop
+        self.assertEqual(concolic.concolic_tests(graph, limit_runs=5),
+                         [{'x': 0, 'y': 0}, {'x': 1, 'y': 0}, {'x': 0, 'y': 1}, {'x': 2, 'y': 0}, {'x': 1, 'y': 7}])
+
+
+class TestGenerator(unittest.TestCase):
+    graph_prog = {
+        1: ['if', [[('<=', ["x", 0])]], [2, 3]],
+        2: ['assign', {'x': '0-x'}, [4]],
+        3: ['assign', {'x': '1-x'}, [4]],
+        4: ['if', [[('==', ["x", 1])]], [5, 6]],
+        5: ['assign', {'x': '1'}, [0]],
+        6: ['assign', {'x': 'x+1'}, [0]]
+    }
+
+    def test_get_k_paths_prefixes(self):
+        self.assertEqual(generator.get_k_paths_prefixes(self.graph_prog, 10, 2), [[1, 2], [1, 3]])
+        self.assertEqual(generator.get_k_paths_prefixes(self.graph_prog, 10, 3), [[1, 2, 4, 5], [1, 2, 4, 6],
+                                                                                 [1, 3, 4, 5], [1, 3, 4, 6]])
+        self.assertEqual(generator.get_k_paths_prefixes(self.graph_prog, 2, 100), [[1, 2], [1, 3]])
+
+    def test_solve_objectives(self):
+        objectives = [('node', 5), ('k-paths', (1, 3))]
+        self.assertEqual(generator.solve_objectives(self.graph_prog, objectives, 10),
+                         ([(('node', 5), [{'x': -1}]), (('k-paths', (1, 3)), [{'x': 1}])], [[1, 3, 4, 5]], []))
+        # the time of the job is over: no objective is solved
+        self.assertEqual(generator.solve_objectives(self.graph_prog, objectives, 10, seconds=0), ([], [], []))
+
+    def test_generate_sets_tests_parallel(self):
+        with tempfile.TemporaryDirectory() as directory:
+            generator.generate_sets_tests(self.graph_prog, directory, 'sequential.txt')
+            generator.generate_sets_tests(self.graph_prog, directory, 'parallel.txt', jobs=2)
+            with open(os.path.join(directory, 'sequential.txt')) as file:
+                sequential = file.read()
+            with open(os.path.join(directory, 'parallel.txt')) as file:
+                self.assertEqual(file.read(), sequential)
+        self.assertEqual(sorted(sequential.split()), ['x:-1', 'x:0', 'x:1'])
 
 
 if __name__ == "__main__":